@@ -14,6 +14,10 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 # Import the Base and models
 from src.database import Base
 from src.auth.models import User, PasswordResetToken  # Import models to register them
+from src.chat.models import ChatSession, ChatMessage, LLMUsage
+from src.health.models import ReminderRun, HealthReading, HealthRollup, HealthAnomaly, HealthImport
+from src.tasks.models import Task
+from src.idempotency import IdempotencyKey
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
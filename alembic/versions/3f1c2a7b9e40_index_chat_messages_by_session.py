@@ -0,0 +1,29 @@
+"""Index chat messages by session
+
+Revision ID: 3f1c2a7b9e40
+Revises: d9497bd8803c
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7b9e40'
+down_revision: Union[str, None] = 'd9497bd8803c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves history loads and the max(id) lookups behind the chat ETags
+    op.create_index('ix_chat_messages_session_id_id', 'chat_messages', ['session_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_session_id_id', table_name='chat_messages')
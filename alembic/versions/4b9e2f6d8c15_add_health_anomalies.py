@@ -0,0 +1,42 @@
+"""Add health anomalies
+
+Revision ID: 4b9e2f6d8c15
+Revises: e7b3d91c4a26
+Create Date: 2026-10-19 17:20:37.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b9e2f6d8c15'
+down_revision: Union[str, None] = 'e7b3d91c4a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('health_anomalies',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.SmallInteger(), nullable=False),
+    sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('detector', sa.String(length=16), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'metric', 'ts', 'detector')
+    )
+    op.create_index('ix_health_anomalies_user_id_ts', 'health_anomalies', ['user_id', 'ts'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_health_anomalies_user_id_ts', table_name='health_anomalies')
+    op.drop_table('health_anomalies')
@@ -0,0 +1,46 @@
+"""Add tasks
+
+Revision ID: 6c2f8b1d4e93
+Revises: 9d5a3c7e1b84
+Create Date: 2026-10-19 21:14:07.302518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c2f8b1d4e93'
+down_revision: Union[str, None] = '9d5a3c7e1b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('category', sa.String(length=32), nullable=False),
+    sa.Column('deadline', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed', sa.Boolean(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tasks_user_id_completed_deadline', 'tasks', ['user_id', 'completed', 'deadline', 'id'], unique=False)
+    op.create_index('ix_tasks_open_deadline', 'tasks', ['deadline'], unique=False,
+                    postgresql_where=sa.text('NOT completed'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_open_deadline', table_name='tasks', postgresql_where=sa.text('NOT completed'))
+    op.drop_index('ix_tasks_user_id_completed_deadline', table_name='tasks')
+    op.drop_table('tasks')
@@ -0,0 +1,47 @@
+"""Add reminder runs and user time zones
+
+Revision ID: 8a4d6e2c1f57
+Revises: 3f1c2a7b9e40
+Create Date: 2026-10-19 11:40:03.529174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4d6e2c1f57'
+down_revision: Union[str, None] = '3f1c2a7b9e40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('timezone', sa.String(), nullable=True))
+    op.add_column('users', sa.Column('last_reminded_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_users_timezone_id', 'users', ['timezone', 'id'], unique=False)
+    op.create_table('reminder_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_key', sa.String(length=16), nullable=False),
+    sa.Column('last_user_id', sa.Integer(), nullable=False),
+    sa.Column('batches', sa.Integer(), nullable=False),
+    sa.Column('users', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_key')
+    )
+    op.create_index(op.f('ix_reminder_runs_id'), 'reminder_runs', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reminder_runs_id'), table_name='reminder_runs')
+    op.drop_table('reminder_runs')
+    op.drop_index('ix_users_timezone_id', table_name='users')
+    op.drop_column('users', 'last_reminded_at')
+    op.drop_column('users', 'timezone')
@@ -0,0 +1,53 @@
+"""Add health imports
+
+Revision ID: 9d5a3c7e1b84
+Revises: 4b9e2f6d8c15
+Create Date: 2026-10-19 19:02:44.615730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d5a3c7e1b84'
+down_revision: Union[str, None] = '4b9e2f6d8c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('health_imports',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('format', sa.String(length=16), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('records', sa.Integer(), nullable=False),
+    sa.Column('bytes_read', sa.BigInteger(), nullable=False),
+    sa.Column('total_bytes', sa.BigInteger(), nullable=True),
+    sa.Column('accepted', sa.Integer(), nullable=False),
+    sa.Column('duplicates', sa.Integer(), nullable=False),
+    sa.Column('rejected', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_health_imports_id'), 'health_imports', ['id'], unique=False)
+    op.create_index(op.f('ix_health_imports_user_id'), 'health_imports', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_health_imports_user_id'), table_name='health_imports')
+    op.drop_index(op.f('ix_health_imports_id'), table_name='health_imports')
+    op.drop_table('health_imports')
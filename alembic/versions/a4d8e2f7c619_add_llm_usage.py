@@ -0,0 +1,40 @@
+"""Add LLM token usage
+
+Revision ID: a4d8e2f7c619
+Revises: f1a6c3e8b207
+Create Date: 2026-10-20 03:26:18.550372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8e2f7c619'
+down_revision: Union[str, None] = 'f1a6c3e8b207'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('prompt_tokens', sa.Integer(), nullable=True))
+    op.add_column('chat_messages', sa.Column('completion_tokens', sa.Integer(), nullable=True))
+    op.create_table('llm_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('llm_usage')
+    op.drop_column('chat_messages', 'completion_tokens')
+    op.drop_column('chat_messages', 'prompt_tokens')
@@ -0,0 +1,71 @@
+"""Add task reminder schedule
+
+Revision ID: b3e7a9c2d518
+Revises: 6c2f8b1d4e93
+Create Date: 2026-10-19 23:41:52.118406
+
+"""
+from typing import Sequence, Union
+
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e7a9c2d518'
+down_revision: Union[str, None] = '6c2f8b1d4e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('next_fire_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('tasks', sa.Column('fire_lease_until', sa.DateTime(timezone=True), nullable=True))
+    op.drop_index('ix_tasks_open_deadline', table_name='tasks', postgresql_where=sa.text('NOT completed'))
+    op.create_index('ix_tasks_next_fire_at', 'tasks', ['next_fire_at'], unique=False,
+                    postgresql_where=sa.text('next_fire_at IS NOT NULL'),
+                    sqlite_where=sa.text('next_fire_at IS NOT NULL'))
+    backfill_next_fire_at()
+
+
+def backfill_next_fire_at() -> None:
+    """Schedule reminders for open tasks created before this revision, as
+    tasks.scheduler.next_fire_at would: TASK_REMINDER_LEAD before the
+    deadline, or at once if that has already passed."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(sa.text(
+            "UPDATE tasks SET next_fire_at = GREATEST(deadline - make_interval(secs => :lead), now()) "
+            "WHERE NOT completed AND deadline > now()"
+        ).bindparams(lead=settings.task_reminder_lead))
+        return
+    # SQLite stores datetimes as text, so the arithmetic is done here
+    tasks = sa.table('tasks', sa.column('id', sa.Integer), sa.column('completed', sa.Boolean),
+                     sa.column('deadline', sa.DateTime(timezone=True)),
+                     sa.column('next_fire_at', sa.DateTime(timezone=True)))
+    now = datetime.now(timezone.utc)
+    lead = timedelta(seconds=settings.task_reminder_lead)
+    rows = bind.execute(
+        sa.select(tasks.c.id, tasks.c.deadline).where(tasks.c.completed == False, tasks.c.deadline.isnot(None))
+    ).all()
+    for task_id, deadline in rows:
+        deadline = deadline if deadline.tzinfo else deadline.replace(tzinfo=timezone.utc)
+        if deadline > now:
+            bind.execute(
+                tasks.update().where(tasks.c.id == task_id).values(next_fire_at=max(deadline - lead, now))
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_next_fire_at', table_name='tasks', postgresql_where=sa.text('next_fire_at IS NOT NULL'),
+                  sqlite_where=sa.text('next_fire_at IS NOT NULL'))
+    op.create_index('ix_tasks_open_deadline', 'tasks', ['deadline'], unique=False,
+                    postgresql_where=sa.text('NOT completed'))
+    op.drop_column('tasks', 'fire_lease_until')
+    op.drop_column('tasks', 'next_fire_at')
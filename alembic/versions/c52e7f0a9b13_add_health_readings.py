@@ -0,0 +1,35 @@
+"""Add health readings
+
+Revision ID: c52e7f0a9b13
+Revises: 8a4d6e2c1f57
+Create Date: 2026-10-19 13:05:51.730466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52e7f0a9b13'
+down_revision: Union[str, None] = '8a4d6e2c1f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('health_readings',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.SmallInteger(), nullable=False),
+    sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('value', sa.Float(precision=24), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'metric', 'ts')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('health_readings')
@@ -0,0 +1,40 @@
+"""Add health rollups
+
+Revision ID: e7b3d91c4a26
+Revises: c52e7f0a9b13
+Create Date: 2026-10-19 15:42:10.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3d91c4a26'
+down_revision: Union[str, None] = 'c52e7f0a9b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('health_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.SmallInteger(), nullable=False),
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=False),
+    sa.Column('max', sa.Float(), nullable=False),
+    sa.Column('sketch', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'metric', 'resolution', 'bucket')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('health_rollups')
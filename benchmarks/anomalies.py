@@ -0,0 +1,171 @@
+"""Anomaly detection throughput on one core against a time budget.
+
+Generates minute-level heart-rate series (daily cycle, noise, gaps) for
+--users users over --days days, one detection batch at a time so memory
+stays bounded, injects a spike and a level shift into every tenth user, and
+runs the detectors over the whole series to report their throughput, the
+NumPy heap peak, how many injected anomalies were found and how many flags
+fell on clean users.
+
+It then stores --days of minute readings for --db-users users and every
+anomaly metric in a scratch SQLite file (unless DATABASE_URL is set), and
+times ``scan_users`` as the hourly ``detect_anomalies_task`` runs it,
+database reads included. That time, scaled to --users users and spread over
+the health queue's processes, is the hourly scan's cost; the run fails if it
+exceeds --budget:
+
+    python -m benchmarks.anomalies --users 10000 --days 30 --db-users 20 --budget 120
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from .common import use_scratch_database
+
+use_scratch_database()
+
+# Single core: keep BLAS and friends from spreading work over threads
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+import numpy as np  # noqa: E402
+
+from src.database import SessionLocal, engine  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.health.anomalies import STEP, detect, scan_users  # noqa: E402
+from src.health.ingest import METRICS  # noqa: E402
+from src.health.models import HealthAnomaly, HealthReading  # noqa: E402
+
+from .ingest import create_user  # noqa: E402
+
+SPIKE = 45.0  # bpm added for one minute
+SHIFT = 20.0  # bpm added for the rest of the series
+
+
+def make_batch(rng, users: int, minutes: int, first_user: int):
+    """Series for a batch of users, and the (row, minute, kind) injected."""
+    t = np.arange(minutes)
+    phase = rng.uniform(0, 2 * np.pi, (users, 1))
+    x = 68 + 10 * np.sin(2 * np.pi * t / 1440 + phase) + rng.normal(0, 5, (users, minutes))
+    x[rng.random((users, minutes)) < 0.1] = np.nan
+    injected = []
+    for row in range(users):
+        if (first_user + row) % 10:
+            continue
+        spike, shift = rng.integers(600, minutes - 600, 2)
+        x[row, spike] = np.nan_to_num(x[row, spike], nan=68) + SPIKE
+        x[row, shift:] += SHIFT
+        injected += [(row, int(spike), "spike"), (row, int(shift), "shift")]
+    return x, injected
+
+
+def run_in_memory(args) -> dict:
+    rng = np.random.default_rng(11)
+    minutes = args.days * 1440
+    batch = settings.anomaly_batch_size
+    found = {"spike": 0, "shift": 0}
+    injected_total = false_flags = clean_users = 0
+    detect_seconds = 0.0
+
+    tracemalloc.start()
+    for first in range(0, args.users, batch):
+        users = min(batch, args.users - first)
+        x, injected = make_batch(rng, users, minutes, first)
+        start = time.perf_counter()
+        flags = detect(x)
+        detect_seconds += time.perf_counter() - start
+
+        injected_total += len(injected)
+        for row, minute, kind in injected:
+            # A spike must be flagged at its minute; a shift within the changepoint window
+            tolerance = 0 if kind == "spike" else settings.anomaly_changepoint_window
+            near = (flags.row == row) & (np.abs(flags.col - minute) <= tolerance)
+            found[kind] += bool(near.any())
+        clean = np.array([(first + row) % 10 != 0 for row in range(users)])
+        clean_users += int(clean.sum())
+        false_flags += int(clean[flags.row].sum())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    points = args.users * minutes
+    return {
+        "users": args.users,
+        "points": points,
+        "batch_size": batch,
+        "detect_seconds": round(detect_seconds, 1),
+        "points_per_second": round(points / detect_seconds),
+        "heap_peak_mb": round(peak / 2 ** 20, 1),
+        "spikes_found": f"{found['spike']}/{injected_total // 2}",
+        "shifts_found": f"{found['shift']}/{injected_total // 2}",
+        "false_flags_per_clean_user": round(false_flags / max(clean_users, 1), 3),
+    }
+
+
+def run_database(args) -> dict:
+    rng = np.random.default_rng(12)
+    minutes = args.days * 1440
+    end = (time.time() // STEP) * STEP
+    start = end - minutes * STEP
+    x, injected = make_batch(rng, args.db_users, minutes, first_user=0)
+    # A spike the hourly scan must find, inside its lookback
+    spike = minutes - 90
+    spiked = sorted({row for row, _, _ in injected})
+    x[spiked, spike] = np.nan_to_num(x[spiked, spike], nan=68) + SPIKE
+    user_ids = [create_user() for _ in range(args.db_users)]
+    with engine.begin() as conn:
+        for name in settings.anomaly_metrics:
+            code = METRICS[name].code
+            for row, user_id in enumerate(user_ids):
+                cols = np.flatnonzero(~np.isnan(x[row]))
+                conn.execute(HealthReading.__table__.insert(), [
+                    {"user_id": user_id, "metric": code, "ts": ts, "value": value}
+                    for ts, value in zip(
+                        (start + cols * STEP).astype("datetime64[s]").tolist(), x[row, cols].round(1).tolist()
+                    )
+                ])
+
+    since = end - settings.anomaly_lookback_hours * 3600
+    db = SessionLocal()
+    try:
+        began = time.perf_counter()
+        stored = scan_users(db, user_ids, end, since)
+        seconds = time.perf_counter() - began
+        found = db.query(HealthAnomaly.user_id).filter(
+            HealthAnomaly.metric == METRICS["heart_rate"].code,
+            HealthAnomaly.ts == datetime.fromtimestamp(start + spike * STEP, timezone.utc),
+        ).distinct().count()
+    finally:
+        db.close()
+    processes = settings.celery_queue_concurrency["health"]
+    projected = seconds / args.db_users * args.users / processes
+    return {
+        "database": engine.dialect.name,
+        "users": args.db_users,
+        "metrics": len(settings.anomaly_metrics),
+        "scan_seconds": round(seconds, 2),
+        "anomalies_stored": stored,
+        "spikes_found": f"{found}/{len(spiked)}",
+        "projected_seconds": round(projected, 1),  # --users users on the health queue
+        "within_budget": projected <= args.budget,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--budget", type=float, default=120.0, help="seconds allowed for the hourly scan")
+    parser.add_argument("--db-users", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {"in_memory": run_in_memory(args), "database": run_database(args)}
+    print(json.dumps(results, indent=2))
+    if not results["database"]["within_budget"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
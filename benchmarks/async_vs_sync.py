@@ -0,0 +1,96 @@
+"""Throughput of the sync (threadpool) vs async (AsyncSession) database stacks.
+
+Serves the same session-list query through a ``def`` endpoint on ``get_db``
+and an ``async def`` endpoint on ``get_async_db`` and drives both at several
+concurrency levels:
+
+    python -m benchmarks.async_vs_sync --requests 2000 --concurrency 1 10 50 100
+
+Uses a scratch SQLite file unless DATABASE_URL is set; point it at a local
+Postgres for numbers that reflect production network round-trips.
+"""
+import argparse
+import asyncio
+import json
+
+from .common import drive, use_scratch_database
+
+use_scratch_database()
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from src.database import Base, SessionLocal, engine, get_async_db, get_db  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.chat import async_crud, crud  # noqa: E402
+from src.chat.models import ChatMessage, ChatSession  # noqa: E402
+
+
+def seed(sessions: int, messages_per_session: int) -> int:
+    """Create one user with chat history and return its id."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for i in range(sessions):
+            chat = ChatSession(user_id=user.id, title=f"Session {i}")
+            db.add(chat)
+            db.flush()
+            db.add_all(
+                ChatMessage(session_id=chat.id, content="Message " * 20, is_user_message=j % 2 == 0)
+                for j in range(messages_per_session)
+            )
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sync/{user_id}")
+    def list_sync(user_id: int, db: Session = Depends(get_db)):
+        sessions = crud.get_user_sessions(db, user_id)
+        return [{"id": s.id, "title": s.title} for s in sessions]
+
+    @app.get("/async/{user_id}")
+    async def list_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+        sessions = await async_crud.get_user_sessions(db, user_id)
+        return [{"id": s.id, "title": s.title} for s in sessions]
+
+    return app
+
+
+async def run(args) -> dict:
+    user_id = seed(args.sessions, args.messages)
+    transport = httpx.ASGITransport(app=build_app())
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for stack in ("sync", "async"):
+            for concurrency in args.concurrency:
+                async def call():
+                    response = await client.get(f"/{stack}/{user_id}")
+                    response.raise_for_status()
+
+                await drive(call, min(50, args.requests), concurrency)  # warm up pools
+                results[f"{stack}@{concurrency}"] = await drive(call, args.requests, concurrency)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Helpers shared by the benchmark scripts."""
+import math
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+
+def use_scratch_database() -> str:
+    """Point DATABASE_URL at a throwaway SQLite file unless one is already set.
+
+    Must run before anything from ``src`` is imported.
+    """
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="anamny-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return os.environ["DATABASE_URL"]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Throughput and latency percentiles (ms) for one benchmark run."""
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def drive(call: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> Dict[str, float]:
+    """Run ``call`` ``requests`` times with ``concurrency`` calls in flight."""
+    import asyncio
+
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
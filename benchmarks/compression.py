@@ -0,0 +1,80 @@
+"""CPU cost vs bytes saved for each response encoding and level.
+
+Compresses a chat-history body (the JSON of a long session) with gzip, brotli
+and zstd at several levels and reports time, ratio and throughput:
+
+    python -m benchmarks.compression --messages 5000
+
+Use it to pick GZIP_LEVEL, BROTLI_QUALITY and ZSTD_LEVEL; in production the
+``http_compression_*`` metrics give the same trade-off per route.
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime, timezone
+
+from .common import percentile
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 6, 11], "zstd": [1, 3, 9, 19]}
+
+
+def history_body(messages: int) -> bytes:
+    """JSON of a session history with ``messages`` alternating messages."""
+    from src.responses import FastJSONResponse
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"id": i, "session_id": 1, "is_user_message": i % 2 == 0, "created_at": now,
+         "content": f"Question {i} about my blood pressure readings this week?" if i % 2 == 0
+         else f"Answer {i}: readings around 120/80 are considered normal. " * 8,
+         "ai_model": None if i % 2 == 0 else "gemini-1.5-flash",
+         "processing_time": None if i % 2 == 0 else 900 + i % 300}
+        for i in range(messages)
+    ]
+    return FastJSONResponse({"session": {"id": 1, "title": "Long session"}, "messages": rows}).body
+
+
+def compressor(encoding: str, level: int):
+    if encoding == "gzip":
+        return lambda data: zlib.compress(data, level, wbits=31)
+    if encoding == "br":
+        import brotli
+
+        return lambda data: brotli.compress(data, quality=level)
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compress
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    body = history_body(args.messages)
+    results = {"original_bytes": len(body)}
+    for encoding, levels in LEVELS.items():
+        for level in levels:
+            try:
+                compress = compressor(encoding, level)
+            except ImportError:
+                continue
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                out = compress(body)
+                samples.append(time.perf_counter() - start)
+            p50 = percentile(samples, 50)
+            results[f"{encoding}-{level}"] = {
+                "bytes": len(out),
+                "ratio": round(len(body) / len(out), 2),
+                "p50_ms": round(p50 * 1000, 2),
+                "mb_per_s": round(len(body) / p50 / 1e6, 1),
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Export-file import throughput and memory, with a crash and resume.
+
+Writes a CSV and a zipped Apple Health export of --rows readings each (the
+XML also carries records of types that are not imported), then imports them
+in-process as ``import_health_file_task`` would. Each file is imported at
+several sizes, then again under tracemalloc to show that the Python heap
+peak does not grow with the file, and the largest is cut short after a few
+batches and resumed; the run fails if the resumed import stored anything
+twice or missed a reading:
+
+    python -m benchmarks.imports --rows 100000 1000000
+
+Uses a scratch SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+from .common import use_scratch_database
+
+use_scratch_database()
+
+from src.database import SessionLocal  # noqa: E402
+from src.health import imports  # noqa: E402
+from src.health.models import HealthImport  # noqa: E402
+
+from .ingest import create_user  # noqa: E402
+
+# (metric, Apple type, Apple unit, factor to the app's unit, low, high in the Apple unit)
+SERIES = [("heart_rate", "HKQuantityTypeIdentifierHeartRate", "count/min", 1.0, 55, 140),
+          ("steps", "HKQuantityTypeIdentifierStepCount", "count", 1.0, 0, 40),
+          ("glucose", "HKQuantityTypeIdentifierBloodGlucose", "mg/dL", 1 / 18.0156, 80, 160)]
+
+
+class Crash(Exception):
+    pass
+
+
+def rows(count: int):
+    rng = random.Random(5)
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        metric, apple_type, unit, factor, low, high = SERIES[i % len(SERIES)]
+        ts = start + timedelta(seconds=20 * (i // len(SERIES)))
+        yield metric, apple_type, unit, factor, ts, rng.uniform(low, high)
+
+
+def write_csv(path: str, count: int) -> None:
+    with open(path, "w") as f:
+        f.write("metric,ts,value\n")
+        for metric, _, _, factor, ts, value in rows(count):
+            f.write(f"{metric},{ts.timestamp():.0f},{value * factor:.2f}\n")
+
+
+def write_apple_zip(path: str, count: int) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("apple_health_export/export.xml", "w") as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_US">\n'
+                    b' <Me HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexNotSet"/>\n')
+            for i, (_, apple_type, unit, _, ts, value) in enumerate(rows(count)):
+                date = ts.strftime("%Y-%m-%d %H:%M:%S +0000")
+                f.write(
+                    f' <Record type="{apple_type}" sourceName="Watch" unit="{unit}" creationDate="{date}" '
+                    f'startDate="{date}" endDate="{date}" value="{value:.1f}">\n'
+                    f'  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n'
+                    f' </Record>\n'.encode()
+                )
+                if i % 10 == 0:
+                    f.write(f' <Record type="HKQuantityTypeIdentifierActiveEnergyBurned" unit="kcal" '
+                            f'startDate="{date}" endDate="{date}" value="1.2"/>\n'.encode())
+            f.write(b"</HealthData>\n")
+
+
+def new_import(path: str) -> int:
+    db = SessionLocal()
+    try:
+        health_import = HealthImport(user_id=create_user(), filename=os.path.basename(path), path=path,
+                                     size=os.path.getsize(path), status="pending", records=0, bytes_read=0,
+                                     accepted=0, duplicates=0, rejected=0, skipped=0)
+        db.add(health_import)
+        db.commit()
+        return health_import.id
+    finally:
+        db.close()
+
+
+def run(import_id: int, crash_after: int = 0) -> HealthImport:
+    store_batch = imports._store_batch
+    batches = 0
+
+    def crashing_store_batch(*args):
+        nonlocal batches
+        batches += 1
+        if batches > crash_after:
+            raise Crash()
+        store_batch(*args)
+
+    if crash_after:
+        imports._store_batch = crashing_store_batch
+    db = SessionLocal()
+    try:
+        return imports.run_import(db, import_id, time.time())
+    finally:
+        imports._store_batch = store_batch
+        db.expunge_all()
+        db.close()
+
+
+def measure(kind: str, count: int, directory: str) -> dict:
+    path = os.path.join(directory, f"{kind}-{count}.{'csv' if kind == 'csv' else 'zip'}")
+    (write_csv if kind == "csv" else write_apple_zip)(path, count)
+    size = os.path.getsize(path)
+    # Completed imports delete their file
+    shutil.copy(path, path + ".copy")
+
+    start = time.perf_counter()
+    result = run(new_import(path))
+    seconds = time.perf_counter() - start
+    # Again for another user under tracemalloc, which slows everything down
+    tracemalloc.start()
+    run(new_import(path + ".copy"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": count,
+        "file_mb": round(size / 2 ** 20, 1),
+        "status": result.status,
+        "accepted": result.accepted,
+        "skipped": result.skipped,
+        "rows_per_second": round(count / seconds),
+        "heap_peak_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def crash_and_resume(kind: str, count: int, directory: str, crash_after: int) -> dict:
+    path = os.path.join(directory, f"resume-{kind}-{count}.{'csv' if kind == 'csv' else 'zip'}")
+    (write_csv if kind == "csv" else write_apple_zip)(path, count)
+    import_id = new_import(path)
+    try:
+        run(import_id, crash_after)
+    except Crash:
+        pass
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(HealthImport, import_id).records
+    finally:
+        db.close()
+    result = run(import_id)
+    return {
+        "rows": count,
+        "checkpoint_at_crash": checkpoint,
+        "status": result.status,
+        "accepted": result.accepted,
+        "duplicates": result.duplicates,
+        "ok": result.status == "completed" and result.accepted == count and result.duplicates == 0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--crash-after", type=int, default=5, help="batches stored before the crash")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="anamny-imports-")
+    results = {}
+    for kind in ("csv", "apple_health"):
+        results[kind] = [measure(kind, count, directory) for count in args.rows]
+        results[f"{kind}_resume"] = crash_and_resume(kind, max(args.rows), directory, args.crash_after)
+    print(json.dumps(results, indent=2))
+    if not all(results[f"{kind}_resume"]["ok"] for kind in ("csv", "apple_health")):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
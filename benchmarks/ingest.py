@@ -0,0 +1,106 @@
+"""Health-reading ingestion throughput in rows per second.
+
+Generates wearable-style batches (heart rate, steps, glucose every few
+seconds) and measures validation alone, ingestion of new readings and
+re-ingestion of the same batches (all duplicates) at several batch sizes:
+
+    python -m benchmarks.ingest --rows 200000 --batch-size 1000 5000 10000
+
+Uses a scratch SQLite file unless DATABASE_URL is set; on PostgreSQL,
+batches of HEALTH_COPY_MIN_ROWS or more go through COPY.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import use_scratch_database
+
+use_scratch_database()
+
+import numpy as np  # noqa: E402
+
+from src.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.health.ingest import ingest_readings, validate_readings  # noqa: E402
+from src.health.schemas import ReadingsBatch  # noqa: E402
+
+SERIES = [("heart_rate", 55, 140), ("steps", 0, 40), ("glucose", 4, 9)]
+
+
+def make_batches(rows: int, batch_size: int, start: float) -> list:
+    rng = np.random.default_rng(7)
+    batches = []
+    per_series = batch_size // len(SERIES)
+    t = start
+    for _ in range(max(1, rows // batch_size)):
+        metric, ts, value = [], [], []
+        for name, low, high in SERIES:
+            metric += [name] * per_series
+            ts += (t + 5 * np.arange(per_series)).tolist()
+            value += rng.uniform(low, high, per_series).round(1).tolist()
+        t += 5 * per_series
+        batches.append(ReadingsBatch(metric=metric, ts=ts, value=value))
+    return batches
+
+
+def create_user() -> int:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(email=f"ingest{time.time_ns()}@example.com", username=f"ingest{time.time_ns()}",
+                    hashed_password="x")
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+async def ingest_all(user_id: int, batches: list, now: float) -> tuple[float, int, int]:
+    accepted = duplicates = 0
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for batch in batches:
+            result, _ = await ingest_readings(db, user_id, batch, now)
+            accepted += result["accepted"]
+            duplicates += result["duplicates"]
+    return time.perf_counter() - start, accepted, duplicates
+
+
+async def run(args) -> dict:
+    now = time.time()
+    results = {"database": engine.dialect.name}
+    for batch_size in args.batch_size:
+        user_id = create_user()
+        batches = make_batches(args.rows, batch_size, start=now - 30 * 86400)
+        rows = sum(len(b.ts) for b in batches)
+
+        start = time.perf_counter()
+        for batch in batches:
+            validate_readings(batch.metric, batch.ts, batch.value, now)
+        validate_seconds = time.perf_counter() - start
+
+        new_seconds, accepted, _ = await ingest_all(user_id, batches, now)
+        dup_seconds, _, duplicates = await ingest_all(user_id, batches, now)
+        results[f"batch_{batch_size}"] = {
+            "rows": rows,
+            "validate_rows_per_s": round(rows / validate_seconds),
+            "insert_rows_per_s": round(rows / new_seconds),
+            "duplicate_rows_per_s": round(rows / dup_seconds),
+            "accepted": accepted,
+            "duplicates_on_resend": duplicates,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1000, 5000, 10000])
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
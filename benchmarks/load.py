@@ -0,0 +1,239 @@
+"""Mixed-workload load test of the API with an offline fake model.
+
+Seeds users with chat history, then drives a weighted mix of login, session
+list, session history, profile and chat-message requests and reports
+throughput and p50/p95/p99 latency per scenario as JSON:
+
+    python -m benchmarks.load --users 50 --requests 2000 --concurrency 50 \\
+        --output load.json
+    python -m benchmarks.load --baseline load.json --max-regression 10
+
+The app runs in-process on a scratch SQLite file unless DATABASE_URL is set
+(e.g. a local Postgres). ``--url`` targets an already running server instead;
+it must share DATABASE_URL so the seeded users exist. The model is replaced
+by the fake one (LLM_PROVIDER=fake); tune it with FAKE_LLM_LATENCY_MS,
+FAKE_LLM_LATENCY_SIGMA and FAKE_LLM_FAILURE_RATE. With ``--baseline`` the
+exit status is 1 if any scenario's p95 or throughput regressed by more than
+``--max-regression`` percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from .common import summarize, use_scratch_database
+
+use_scratch_database()
+os.environ.setdefault("LLM_PROVIDER", "fake")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from src.database import Base, SessionLocal, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.auth.utils import create_access_token, get_password_hash  # noqa: E402
+from src.chat.models import ChatMessage, ChatSession  # noqa: E402
+
+PASSWORD = "load-test-password"
+
+# Relative weights of each scenario in the mix
+DEFAULT_MIX = {"sessions": 40, "history": 30, "profile": 15, "message": 10, "login": 5}
+
+USER_PROMPTS = [
+    "I have had a headache for three days, what could it be?",
+    "My blood pressure was 140/90 this morning, is that high?",
+    "What should I eat to lower my cholesterol?",
+    "I feel tired all the time even after sleeping eight hours.",
+]
+
+
+def seed(users: int, sessions: int, messages: int) -> List[Dict]:
+    """Create users with chat history in bulk and return their credentials.
+
+    All users share one password hash so seeding doesn't spend minutes in bcrypt.
+    """
+    Base.metadata.create_all(bind=engine)
+    hashed_password = get_password_hash(PASSWORD)
+    run = int(time.time())
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"email": f"load{run}-{i}@example.com", "username": f"load{run}-{i}",
+             "hashed_password": hashed_password, "is_active": True}
+            for i in range(users)
+        ])
+        rows = db.execute(
+            select(User.id, User.email).where(User.email.like(f"load{run}-%"))
+        ).all()
+        db.execute(insert(ChatSession), [
+            {"user_id": user_id, "title": f"Session {j}", "is_active": True}
+            for user_id, _ in rows for j in range(sessions)
+        ])
+        session_rows = db.execute(
+            select(ChatSession.id, ChatSession.user_id)
+            .where(ChatSession.user_id.in_([user_id for user_id, _ in rows]))
+        ).all()
+        for start in range(0, len(session_rows), 500):
+            db.execute(insert(ChatMessage), [
+                {"session_id": session_id, "is_user_message": k % 2 == 0,
+                 "content": random.choice(USER_PROMPTS) if k % 2 == 0 else "General information. " * 30}
+                for session_id, _ in session_rows[start:start + 500] for k in range(messages)
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+    by_user = defaultdict(list)
+    for session_id, user_id in session_rows:
+        by_user[user_id].append(session_id)
+    return [
+        {"email": email, "sessions": by_user[user_id],
+         "headers": {"Authorization": f"Bearer {create_access_token({'sub': email})}"}}
+        for user_id, email in rows
+    ]
+
+
+def scenarios(client: httpx.AsyncClient) -> Dict:
+    """One coroutine function per scenario, each taking a seeded user."""
+
+    async def login(user):
+        return await client.post("/auth/login", json={"email": user["email"], "password": PASSWORD})
+
+    async def sessions(user):
+        return await client.get("/chat/sessions", headers=user["headers"])
+
+    async def history(user):
+        session_id = random.choice(user["sessions"])
+        return await client.get(f"/chat/sessions/{session_id}", headers=user["headers"])
+
+    async def profile(user):
+        return await client.get("/auth/profile", headers=user["headers"])
+
+    async def message(user):
+        body = {"message": random.choice(USER_PROMPTS), "session_id": random.choice(user["sessions"])}
+        return await client.post("/chat/message", json=body, headers=user["headers"])
+
+    return {"login": login, "sessions": sessions, "history": history, "profile": profile, "message": message}
+
+
+async def drive_mix(client, users, mix: Dict[str, int], requests: int, concurrency: int) -> Dict:
+    """Run ``requests`` calls drawn from ``mix`` with ``concurrency`` in flight."""
+    calls = scenarios(client)
+    names = list(mix)
+    plan = iter(random.choices(names, weights=[mix[n] for n in names], k=requests))
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def worker():
+        for name in plan:
+            start = time.perf_counter()
+            try:
+                response = await calls[name](random.choice(users))
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies[name].append(time.perf_counter() - start)
+            if failed:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name, samples in sorted(latencies.items()):
+        results[name] = {**summarize(samples, elapsed), "errors": errors[name]}
+    everything = [s for samples in latencies.values() for s in samples]
+    results["overall"] = {**summarize(everything, elapsed), "errors": sum(errors.values())}
+    return results
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Scenarios whose p95 or throughput got worse than the allowed percentage."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + max_regression / 100):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - max_regression / 100):
+            regressions.append(
+                f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+    return regressions
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """``sessions=40,message=10`` -> {"sessions": 40, "message": 10}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+async def run(args) -> Dict:
+    users = seed(args.users, args.sessions, args.messages)
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        from src.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://load"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+        await drive_mix(client, users, args.mix, min(50, args.requests), args.concurrency)  # warm up
+        results = await drive_mix(client, users, args.mix, args.requests, args.concurrency)
+    return {
+        "config": {
+            "database": engine.dialect.name, "target": args.url or "in-process",
+            "users": args.users, "requests": args.requests, "concurrency": args.concurrency,
+            "mix": args.mix, "fake_llm_latency_ms": float(os.environ.get("FAKE_LLM_LATENCY_MS", 800)),
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=5, help="sessions per user")
+    parser.add_argument("--messages", type=int, default=20, help="messages per session")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="percent")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline["results"], args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Email throughput: one SMTP connection per message vs the pooled sender.
+
+Starts a local aiosmtpd sink (``pip install .[bench]``) and sends the same
+templated messages through fastapi-mail's ``FastMail.send_message``, which
+connects and logs in for every message, and through ``mailer.send_batch``
+over pooled connections:
+
+    python -m benchmarks.mail --messages 1000 --pool-size 1 4
+
+``--latency-ms`` adds a delay to the sink's connection greeting to stand in
+for the TCP/TLS round trips of a remote server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("MAIL_FROM", "bench@example.com")
+os.environ.setdefault("MAIL_SERVER", "127.0.0.1")
+os.environ.setdefault("MAIL_PORT", "8025")
+os.environ.setdefault("MAIL_STARTTLS", "false")
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from aiosmtpd.smtp import SMTP  # noqa: E402
+
+from src.config import settings  # noqa: E402
+from src.mailer import Email, SMTPPool, mail_config, send_batch  # noqa: E402
+
+
+class Sink:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += len(envelope.rcpt_tos)
+        return "250 OK"
+
+
+class SlowGreetingSMTP(SMTP):
+    latency = 0.0
+
+    async def _handle_client(self):
+        await asyncio.sleep(self.latency)
+        await super()._handle_client()
+
+
+class SlowController(Controller):
+    def factory(self):
+        return SlowGreetingSMTP(self.handler)
+
+
+def emails(count: int):
+    return [
+        Email(to=f"user{i}@example.com", subject="Reset your password", template="password_reset.html",
+              context={"app_name": settings.name, "reset_url": "http://localhost:3000/reset-password?token=x"})
+        for i in range(count)
+    ]
+
+
+async def per_message(batch) -> None:
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+
+    mail = FastMail(mail_config())
+    for email in batch:
+        message = MessageSchema(recipients=[email.to], subject=email.subject,
+                                template_body=email.context, subtype=MessageType.html)
+        await mail.send_message(message, template_name=email.template)
+
+
+async def run(args) -> dict:
+    sink = Sink()
+    SlowGreetingSMTP.latency = args.latency_ms / 1000
+    controller = SlowController(sink, hostname=settings.mail_server, port=settings.mail_port)
+    controller.start()
+    results = {"messages": args.messages, "greeting_latency_ms": args.latency_ms}
+    try:
+        batch = emails(args.messages)
+        start = time.perf_counter()
+        await per_message(batch)
+        elapsed = time.perf_counter() - start
+        results["connection_per_message"] = {"seconds": round(elapsed, 2),
+                                             "messages_per_s": round(args.messages / elapsed, 1)}
+        for size in args.pool_size:
+            pool = SMTPPool(mail_config(), size)
+            start = time.perf_counter()
+            outcome = await send_batch(batch, pool)
+            elapsed = time.perf_counter() - start
+            await pool.close()
+            results[f"pooled_{size}"] = {"seconds": round(elapsed, 2), "sent": len(outcome.sent),
+                                         "messages_per_s": round(args.messages / elapsed, 1)}
+    finally:
+        controller.stop()
+    results["received_by_sink"] = sink.received
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
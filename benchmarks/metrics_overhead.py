@@ -0,0 +1,71 @@
+"""Per-request cost of the Prometheus instrumentation.
+
+Serves the same endpoints with and without MetricsMiddleware and reports the
+latency difference, for a no-op route and for one that runs a SQL statement
+(which also exercises the engine's query events):
+
+    python -m benchmarks.metrics_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import json
+
+from .common import drive, use_scratch_database
+
+use_scratch_database()
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from src.database import get_db  # noqa: E402
+from src.metrics import MetricsMiddleware  # noqa: E402
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/db")
+    def db_query(db: Session = Depends(get_db)):
+        return {"value": db.execute(text("SELECT 1")).scalar()}
+
+    return app
+
+
+async def run(args) -> dict:
+    results = {}
+    for path in ("/ping", "/db"):
+        for instrumented in (False, True):
+            transport = httpx.ASGITransport(app=build_app(instrumented))
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def call():
+                    (await client.get(path)).raise_for_status()
+
+                await drive(call, min(200, args.requests), args.concurrency)  # warm up
+                summary = await drive(call, args.requests, args.concurrency)
+            results[f"{path} {'instrumented' if instrumented else 'bare'}"] = summary
+        bare = results[f"{path} bare"]
+        instrumented_run = results[f"{path} instrumented"]
+        results[f"{path} overhead_us_p50"] = round(
+            (instrumented_run["p50_ms"] - bare["p50_ms"]) * 1000, 1
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Daily reminder fan-out over a large user table, with a crash and resume.
+
+Seeds synthetic users spread over time zones, then runs all 24 hourly
+reminder runs of one day in-process. Each dispatched group is claimed
+immediately (as the batch tasks would), and the first run crashes after a
+few groups and is resumed. Batches are also delivered again, both after a
+successful send and after a failed one whose claim was released. Reports
+throughput and the Python heap peak during fan-out, and fails if any user
+was reminded twice or not at all:
+
+    python -m benchmarks.reminders --users 1000000
+
+Uses a scratch SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from .common import use_scratch_database
+
+use_scratch_database()
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from src.database import Base, SessionLocal, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.health import reminders  # noqa: E402
+
+TIMEZONES = [None, "UTC", "Europe/London", "Europe/Berlin", "Europe/Moscow", "Asia/Almaty", "Asia/Kolkata",
+             "Asia/Kathmandu", "Asia/Shanghai", "Asia/Tokyo", "Australia/Sydney", "Pacific/Auckland",
+             "America/Sao_Paulo", "America/New_York", "America/Chicago", "America/Denver",
+             "America/Los_Angeles", "Pacific/Honolulu", "Africa/Lagos", "Asia/Dubai"]
+
+
+class Crash(Exception):
+    pass
+
+
+def seed(users: int, chunk: int = 10000) -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.count(User.id))).scalar()
+        for start in range(existing, users, chunk):
+            conn.execute(insert(User), [
+                {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x",
+                 "is_active": True, "timezone": rng.choice(TIMEZONES)}
+                for i in range(start, min(users, start + chunk))
+            ])
+
+
+def run(users: int, crash_after: int = 3) -> dict:
+    start = time.perf_counter()
+    seed(users)
+    seed_seconds = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.max(User.id))).scalar()
+    # One counter per user id, allocated before measuring
+    reminded = bytearray(max_id + 1)
+    day = datetime(2025, 6, 11, tzinfo=timezone.utc)
+    dispatched_groups = 0
+
+    def dispatch(batches):
+        nonlocal dispatched_groups
+        claim_db = SessionLocal()
+        try:
+            for i, ids in enumerate(batches):
+                if i == 1:
+                    # The send failed: the task releases its claim and the
+                    # batch is delivered again
+                    claimed = reminders.claim_reminders(claim_db, ids)
+                    reminders.release_reminders(claim_db, [user.id for user in claimed])
+                for user in reminders.claim_reminders(claim_db, ids):
+                    reminded[user.id] += 1
+                if i == 0:
+                    # Delivered twice (a worker died before acknowledging it)
+                    for user in reminders.claim_reminders(claim_db, ids):
+                        reminded[user.id] += 1
+                claim_db.expunge_all()
+        finally:
+            claim_db.close()
+        dispatched_groups += 1
+        # The dispatcher dies after queueing this group but before its checkpoint
+        if dispatched_groups == crash_after:
+            raise Crash()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for hour in range(24):
+            key = reminders.run_key(day + timedelta(hours=hour))
+            try:
+                reminders.fan_out(db, key, dispatch)
+            except Crash:
+                db.rollback()
+                reminders.fan_out(db, key, dispatch)
+    finally:
+        db.close()
+    fan_out_seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "users": max_id,
+        "batch_size": settings.reminder_batch_size,
+        "group_size": settings.reminder_group_size,
+        "seed_seconds": round(seed_seconds, 1),
+        "fan_out_seconds": round(fan_out_seconds, 1),
+        "users_per_second": round(max_id / fan_out_seconds),
+        "heap_peak_mb": round(peak / 2 ** 20, 1),
+        "resumed_runs": dispatched_groups >= crash_after,
+        "reminded_twice": sum(1 for count in reminded if count > 1),
+        "missed": max_id - sum(1 for count in reminded if count == 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--crash-after", type=int, default=3, help="groups before the first run crashes")
+    args = parser.parse_args()
+
+    results = run(args.users, args.crash_after)
+    print(json.dumps(results, indent=2))
+    if results["reminded_twice"] or results["missed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Embedding throughput and per-user index search latency.
+
+Embeds --messages synthetic chat messages for one user with the local
+embedder, appends them to the user's index in batches as
+``embed_messages_task`` would, then times searches against the memory-mapped
+index. Each query is a stored message with a few words dropped, so its
+nearest neighbour should be the original:
+
+    python -m benchmarks.retrieval --messages 10000 100000
+
+Writes the indexes to a scratch directory.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("EMBEDDING_INDEX_DIR", tempfile.mkdtemp(prefix="anamny-embeddings-"))
+
+from src.chat.embeddings import append, get_embedder, load, search  # noqa: E402
+
+from .common import percentile  # noqa: E402
+
+SUBJECTS = ["knee", "back", "head", "stomach", "chest", "throat", "skin", "eyes", "sleep", "blood sugar",
+            "blood pressure", "heart rate", "ankle", "shoulder", "ear", "tooth"]
+SYMPTOMS = ["pain", "swelling", "itching", "burning", "stiffness", "numbness", "fever", "rash", "cramps",
+            "dizziness", "fatigue", "nausea", "cough", "insomnia", "palpitations", "bleeding"]
+CONTEXTS = ["after running", "in the morning", "at night", "after meals", "when I stand up", "at work",
+            "since last week", "for three days", "after the new medication", "when it is cold"]
+
+
+def messages(count: int) -> list:
+    rng = random.Random(2)
+    return [
+        f"I have {rng.choice(SYMPTOMS)} and {rng.choice(SYMPTOMS)} in my {rng.choice(SUBJECTS)} "
+        f"{rng.choice(CONTEXTS)}, also {rng.choice(SYMPTOMS)} {rng.choice(CONTEXTS)}, note {i}"
+        for i in range(count)
+    ]
+
+
+def measure(count: int, queries: int, k: int, batch: int) -> dict:
+    user_id = count  # one index per size
+    texts = messages(count)
+    embedder = get_embedder()
+
+    start = time.perf_counter()
+    for offset in range(0, count, batch):
+        chunk = texts[offset:offset + batch]
+        append(user_id, range(offset, offset + len(chunk)), embedder.embed(chunk))
+    embed_seconds = time.perf_counter() - start
+
+    rng = random.Random(9)
+    latencies, hits = [], 0
+    for _ in range(queries):
+        target = rng.randrange(count)
+        words = texts[target].split()
+        query = " ".join(w for w in words if rng.random() > 0.2)
+        start = time.perf_counter()
+        results = search(user_id, embedder.embed([query])[0], k)
+        latencies.append(time.perf_counter() - start)
+        hits += bool(results) and results[0][0] == target
+    return {
+        "messages": count,
+        "index_mb": round(load(user_id).nbytes / 2 ** 20, 1),
+        "embed_per_second": round(count / embed_seconds),
+        "search_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "search_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "top1_is_original": round(hits / queries, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=100, help="messages per append")
+    args = parser.parse_args()
+    print(json.dumps([measure(count, args.queries, args.k, args.batch) for count in args.messages], indent=2))
+
+
+if __name__ == "__main__":
+    main()
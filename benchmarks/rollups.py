@@ -0,0 +1,122 @@
+"""Rollup maintenance cost and series query latency by resolution.
+
+Ingests a month of 5-second heart-rate readings for one user in batches,
+running the rollup update for each batch as the Celery task would, then
+sends one late batch for an hour last week and checks that only its hour and
+day were rewritten. Finally times GET /health/series over the month at
+daily, hourly and raw resolution and compares the sketch percentiles with
+exact ones:
+
+    python -m benchmarks.rollups --days 30
+
+Uses a scratch SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import use_scratch_database
+
+use_scratch_database()
+
+import numpy as np  # noqa: E402
+
+from src.database import AsyncSessionLocal, SessionLocal  # noqa: E402
+from src.health.ingest import ingest_readings  # noqa: E402
+from src.health.rollups import DAY, HOUR, series, update_rollups  # noqa: E402
+from src.health.schemas import ReadingsBatch  # noqa: E402
+
+from .ingest import create_user  # noqa: E402
+
+PERCENTILES = [50, 90, 99]
+
+
+async def ingest(user_id: int, ts: np.ndarray, values: np.ndarray, batch_size: int, now: float) -> tuple:
+    windows = []
+    async with AsyncSessionLocal() as db:
+        for start in range(0, len(ts), batch_size):
+            batch = ReadingsBatch(
+                metric=["heart_rate"] * len(ts[start:start + batch_size]),
+                ts=ts[start:start + batch_size].tolist(),
+                value=values[start:start + batch_size].tolist(),
+            )
+            _, window = await ingest_readings(db, user_id, batch, now)
+            windows.append(window)
+    return windows
+
+
+def roll_up(user_id: int, windows: list) -> tuple[float, int]:
+    rewritten = 0
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for window in windows:
+            rewritten += sum(update_rollups(db, user_id, window["hours"]).values())
+    finally:
+        db.close()
+    return time.perf_counter() - start, rewritten
+
+
+def query(user_id: int, start: float, end: float, step: int, repeat: int = 5) -> tuple[float, dict]:
+    db = SessionLocal()
+    try:
+        began = time.perf_counter()
+        for _ in range(repeat):
+            result = series(db, user_id, "heart_rate", start, end, step, PERCENTILES)
+        return (time.perf_counter() - began) / repeat, result
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=720, help="readings per batch (720 = one hour)")
+    args = parser.parse_args()
+
+    now = time.time()
+    end = (now // DAY) * DAY
+    begin = end - args.days * DAY
+    rng = np.random.default_rng(3)
+    ts = np.arange(begin, end, 5.0)
+    daily_cycle = 12 * np.sin(2 * np.pi * ts / DAY)
+    values = np.clip(70 + daily_cycle + rng.normal(0, 8, len(ts)), 35, 200).round(1)
+
+    # Hold back one hour from last week and send it after everything else
+    late = (ts >= end - 7 * DAY) & (ts < end - 7 * DAY + HOUR)
+    user_id = create_user()
+    windows = asyncio.run(ingest(user_id, ts[~late], values[~late], args.batch_size, now))
+    update_seconds, rewritten = roll_up(user_id, windows)
+    late_windows = asyncio.run(ingest(user_id, ts[late], values[late], args.batch_size, now))
+    late_seconds, late_rewritten = roll_up(user_id, late_windows)
+
+    results = {
+        "readings": len(ts),
+        "batches": len(windows),
+        "rollup_ms_per_batch": round(update_seconds / len(windows) * 1000, 2),
+        "buckets_rewritten": rewritten,
+        "late_batch_buckets_rewritten": late_rewritten,
+        "late_batch_rollup_ms": round(late_seconds * 1000, 2),
+    }
+    for label, step in (("day", DAY), ("hour_6h_steps", 6 * HOUR), ("raw_30m_steps", 1800)):
+        seconds, result = query(user_id, begin, end, step)
+        # Exact percentiles of each step, to measure the sketch error
+        keys = ((ts - begin) // step).astype(np.int64)
+        errors = []
+        for point in result["points"]:
+            chunk = values[keys == int((point["ts"] - begin) // step)]
+            exact = np.percentile(chunk, PERCENTILES)
+            errors.append(np.abs(np.array(list(point["percentiles"].values())) - exact).max())
+        results[label] = {
+            "resolution": result["resolution"],
+            "points": len(result["points"]),
+            "query_ms": round(seconds * 1000, 2),
+            "max_percentile_error": round(float(max(errors)), 2),
+            "counts_match": sum(p["count"] for p in result["points"]) == len(ts),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Model-routing classifier cost and tier mix on a synthetic chat corpus.
+
+Builds --messages messages from first messages describing symptoms and
+short follow-ups, classifies each one as ``send_message_to_ai`` would and
+reports the time per message and the share of messages per tier:
+
+    python -m benchmarks.routing --messages 100000
+"""
+import argparse
+import json
+import random
+import time
+from collections import Counter
+
+from src.chat.routing import classify
+
+OPENERS = [
+    "I have had a fever of 38.5 C for 3 days, with a cough and a headache",
+    "My blood pressure was 150/95 this morning and I feel dizzy",
+    "I get a sharp pain in my lower back after sitting at work all day",
+    "Sudden chest pain when I climb stairs, it goes away after rest",
+    "My child has a rash on her arms and is very tired, no fever",
+    "I take 500mg metformin twice a day and my glucose is still 9 mmol in the morning",
+    "I have been sleeping badly for weeks",
+    "Is it normal to feel anxious before exams?",
+]
+FOLLOW_UPS = [
+    "thanks!", "ok, which doctor?", "how long should I wait?", "got it", "what tests exactly?",
+    "and if it gets worse?", "can I still exercise?", "it also itches and is swollen now",
+]
+
+
+def corpus(count: int) -> list:
+    rng = random.Random(1)
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.3:
+            messages.append((rng.choice(OPENERS), False))
+        else:
+            messages.append((rng.choice(FOLLOW_UPS), True))
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    messages = corpus(args.messages)
+    tiers = Counter()
+    start = time.perf_counter()
+    for message, follow_up in messages:
+        tiers[classify(message, follow_up)[0]] += 1
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "messages": args.messages,
+        "us_per_message": round(elapsed / args.messages * 1e6, 2),
+        "tier_share": {tier: round(count / args.messages, 3) for tier, count in sorted(tiers.items())},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Task reminder fire lag and exactly-once firing with several schedulers.
+
+Seeds --backlog tasks with reminders far in the future and --due tasks whose
+reminders come due over the next --spread seconds, then runs --replicas
+schedulers side by side (threads, each with its own session, as separate
+scheduler workers would) until they are all due. The run fails if any
+reminder fired twice or not at all:
+
+    python -m benchmarks.scheduler --due 20000 --spread 20 --replicas 3
+
+Uses a scratch SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from .common import percentile, use_scratch_database
+
+use_scratch_database()
+
+from sqlalchemy import insert  # noqa: E402
+
+from src.config import settings  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+from src.tasks.models import Task  # noqa: E402
+from src.tasks.scheduler import Scheduler  # noqa: E402
+
+from .ingest import create_user  # noqa: E402
+
+CHUNK = 50_000
+
+
+def seed(user_id: int, count: int, start: float, spread: float) -> dict:
+    rng = random.Random(3)
+    fire_times = {}
+    for offset in range(0, count, CHUNK):
+        rows = []
+        for _ in range(min(CHUNK, count - offset)):
+            fire_at = datetime.fromtimestamp(start + rng.uniform(0, spread), timezone.utc)
+            rows.append({"user_id": user_id, "title": "Take medication", "category": "medication",
+                         "deadline": fire_at + timedelta(seconds=settings.task_reminder_lead),
+                         "completed": False, "next_fire_at": fire_at})
+        with engine.begin() as conn:
+            ids = conn.execute(insert(Task).returning(Task.id, Task.next_fire_at), rows).all()
+        fire_times.update((task_id, fire_at.replace(tzinfo=timezone.utc).timestamp()) for task_id, fire_at in ids)
+    return fire_times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--due", type=int, default=20_000, help="reminders coming due during the run")
+    parser.add_argument("--backlog", type=int, default=1_000_000, help="reminders due in the next year")
+    parser.add_argument("--spread", type=float, default=20.0, help="seconds over which reminders come due")
+    parser.add_argument("--replicas", type=int, default=3)
+    args = parser.parse_args()
+
+    settings.task_scheduler_poll_seconds = 1.0
+    user_id = create_user()
+    now = time.time()
+    seed(user_id, args.backlog, now + 86400, 365 * 86400)
+    start = time.time() + 2
+    fire_times = seed(user_id, args.due, start, args.spread)
+
+    fired = []
+    lags = []
+    lock = threading.Lock()
+
+    def dispatch(task_ids):
+        at = time.time()
+        with lock:
+            fired.extend(task_ids)
+            lags.extend(at - fire_times[task_id] for task_id in task_ids)
+
+    def replica():
+        db = SessionLocal()
+        try:
+            Scheduler(db, dispatch).run(start + args.spread + 2 - time.time())
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=replica) for _ in range(args.replicas)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = {
+        "due": args.due,
+        "backlog": args.backlog,
+        "replicas": args.replicas,
+        "fired": len(fired),
+        "fired_twice": len(fired) - len(set(fired)),
+        "missed": len(set(fire_times) - set(fired)),
+        "lag_p50_ms": round(percentile(lags, 50) * 1000, 1),
+        "lag_p99_ms": round(percentile(lags, 99) * 1000, 1),
+        "lag_max_ms": round(max(lags) * 1000, 1),
+    }
+    print(json.dumps(results, indent=2))
+    if results["fired_twice"] or results["missed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Loading and serializing a long chat history: ORM + Pydantic vs rows + orjson.
+
+Seeds one session with 5000 messages and builds the body of
+``GET /chat/sessions/{id}`` both ways, timing the query and the serialization
+separately:
+
+    python -m benchmarks.serialization --messages 5000 --repeat 20
+
+``orm_pydantic`` is the previous path: ORM objects, validated into
+SessionHistoryResponse, dumped and re-validated the way FastAPI handles a
+response_model, then encoded with the stdlib json module. ``rows_orjson``
+is the current one: projection rows rendered by FastJSONResponse.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from .common import percentile, use_scratch_database
+
+use_scratch_database()
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from src.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.chat import async_crud  # noqa: E402
+from src.chat.models import ChatMessage, ChatSession  # noqa: E402
+from src.chat.schemas import SessionHistoryResponse  # noqa: E402
+from src.responses import FastJSONResponse  # noqa: E402
+
+history_adapter = TypeAdapter(SessionHistoryResponse)
+
+
+def seed(messages: int) -> tuple[int, int]:
+    """Create a user with one long session; return (user_id, session_id)."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(email=f"ser{time.time_ns()}@example.com", username=f"ser{time.time_ns()}",
+                    hashed_password="x")
+        db.add(user)
+        db.flush()
+        chat = ChatSession(user_id=user.id, title="Long session")
+        db.add(chat)
+        db.flush()
+        db.execute(insert(ChatMessage), [
+            {"session_id": chat.id, "is_user_message": i % 2 == 0,
+             "content": "How is my blood pressure today?" if i % 2 == 0 else "General information. " * 40,
+             "ai_model": None if i % 2 == 0 else "gemini-1.5-flash",
+             "processing_time": None if i % 2 == 0 else 900}
+            for i in range(messages)
+        ])
+        db.commit()
+        return user.id, chat.id
+    finally:
+        db.close()
+
+
+async def orm_pydantic(user_id: int, session_id: int) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        session = await async_crud.get_session_by_id(db, session_id, user_id)
+        messages = await async_crud.get_session_messages(db, session_id, user_id)
+        loaded = time.perf_counter()
+        response = SessionHistoryResponse(session=session, messages=messages)
+        # What FastAPI does with a returned model and a response_model
+        content = history_adapter.dump_python(
+            history_adapter.validate_python(response.model_dump()), mode="json"
+        )
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    return loaded - start, time.perf_counter() - loaded, len(body)
+
+
+async def rows_orjson(user_id: int, session_id: int) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        session = await async_crud.get_session_row(db, session_id, user_id)
+        messages = await async_crud.get_session_message_rows(db, session_id)
+        session["message_count"] = len(messages)
+        loaded = time.perf_counter()
+        body = FastJSONResponse({"session": session, "messages": messages}).body
+    return loaded - start, time.perf_counter() - loaded, len(body)
+
+
+async def run(args) -> Dict:
+    user_id, session_id = seed(args.messages)
+    results = {"messages": args.messages}
+    for name, build in (("orm_pydantic", orm_pydantic), ("rows_orjson", rows_orjson)):
+        await build(user_id, session_id)  # warm up
+        load: List[float] = []
+        serialize: List[float] = []
+        for _ in range(args.repeat):
+            load_s, serialize_s, size = await build(user_id, session_id)
+            load.append(load_s)
+            serialize.append(serialize_s)
+        results[name] = {
+            "bytes": size,
+            "load_p50_ms": round(percentile(load, 50) * 1000, 2),
+            "serialize_p50_ms": round(percentile(serialize, 50) * 1000, 2),
+            "serialize_p95_ms": round(percentile(serialize, 95) * 1000, 2),
+            "total_p50_ms": round(percentile([a + b for a, b in zip(load, serialize)], 50) * 1000, 2),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
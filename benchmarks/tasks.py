@@ -0,0 +1,121 @@
+"""Task listing latency with millions of tasks in the table.
+
+Seeds --tasks tasks spread over --users users (deadlines within a year either
+side of now, a third of them completed), then times the "due in the next 24
+hours" listing and deep keyset pages of a user's open tasks, and prints the
+query plan, which should be a range scan of
+``ix_tasks_user_id_completed_deadline``:
+
+    python -m benchmarks.tasks --tasks 2000000 --users 20000
+
+Uses a scratch SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from .common import summarize, use_scratch_database
+
+use_scratch_database()
+
+from sqlalchemy import insert, select, text  # noqa: E402
+
+from src.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.tasks.crud import TaskCRUD  # noqa: E402
+from src.tasks.models import Task  # noqa: E402
+
+CHUNK = 50_000
+
+
+def seed(tasks: int, users: int, now: datetime) -> list:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    stamp = time.time_ns()
+    with engine.begin() as conn:
+        user_ids = list(conn.execute(
+            insert(User).returning(User.id),
+            [{"email": f"tasks{stamp}-{i}@example.com", "username": f"tasks{stamp}-{i}", "hashed_password": "x",
+              "is_active": True} for i in range(users)],
+        ).scalars())
+    year = 365 * 86400
+    for start in range(0, tasks, CHUNK):
+        rows = []
+        for _ in range(min(CHUNK, tasks - start)):
+            completed = rng.random() < 1 / 3
+            rows.append({
+                "user_id": rng.choice(user_ids),
+                "title": "Take medication",
+                "category": "medication",
+                "deadline": now + timedelta(seconds=rng.uniform(-year, year)),
+                "completed": completed,
+                "completed_at": now if completed else None,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Task.__table__), rows)
+    return user_ids
+
+
+def query_plan(user_id: int, now: datetime) -> list:
+    query = (
+        select(Task)
+        .where(Task.user_id == user_id, Task.completed == False,
+               Task.deadline >= now, Task.deadline < now + timedelta(hours=24))
+        .order_by(Task.deadline.asc().nulls_last(), Task.id)
+        .limit(51)
+    )
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    explain = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        return [" ".join(str(column) for column in row) for row in conn.execute(text(explain + str(compiled)))]
+
+
+async def time_queries(user_ids: list, now: datetime, samples: int, pages: int) -> dict:
+    rng = random.Random(11)
+    due, paging = [], []
+    async with AsyncSessionLocal() as db:
+        for _ in range(samples):
+            user_id = rng.choice(user_ids)
+            start = time.perf_counter()
+            await TaskCRUD.list_tasks(db, user_id, 50, due_after=now, due_before=now + timedelta(hours=24))
+            due.append(time.perf_counter() - start)
+
+            cursor = None
+            for _ in range(pages):
+                start = time.perf_counter()
+                _, cursor = await TaskCRUD.list_tasks(db, user_id, 10, cursor=cursor)
+                paging.append(time.perf_counter() - start)
+                if cursor is None:
+                    break
+    return {
+        "due_24h": summarize(due, sum(due)),
+        "keyset_pages": summarize(paging, sum(paging)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=500, help="users queried")
+    parser.add_argument("--pages", type=int, default=10, help="pages listed per user")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    user_ids = seed(args.tasks, args.users, now)
+    results = {
+        "tasks": args.tasks,
+        "users": args.users,
+        "seed_seconds": round(time.perf_counter() - start, 1),
+        "plan": query_plan(user_ids[0], now),
+        **asyncio.run(time_queries(user_ids, now, args.samples, args.pages)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
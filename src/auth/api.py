@@ -1,8 +1,10 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from ..profiling import ProfiledRoute
+from ..responses import cache_headers, etag_matches, make_etag, not_modified
 from .schemas import (
     UserCreate, UserResponse, LoginRequest, Token,
     PasswordResetRequest, PasswordResetConfirm, UserUpdate
@@ -16,12 +18,14 @@ from .dependencies import get_current_active_user
 from .models import User
 from ..config import settings
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=ProfiledRoute)
 
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+def register_user(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     """Register a new user."""
+    # Keep the new account's first reads on the primary
+    request.state.principal = user.email
     try:
         db_user = create_user(db=db, user=user)
         return db_user
@@ -58,9 +62,17 @@ def forgot_password(request: PasswordResetRequest, db: Session = Depends(get_db)
         # Don't reveal if email exists or not for security
         return {"message": "If the email exists, a password reset link has been sent"}
     
-    # TODO: Send email with reset link
-    # For now, we'll just return success (in production, send email)
-    print(f"Password reset token for {request.email}: {reset_token.token}")
+    from ..jobs import send_email_task
+
+    send_email_task.delay(
+        to=request.email,
+        subject="Reset your password",
+        template="password_reset.html",
+        context={
+            "app_name": settings.name,
+            "reset_url": f"{settings.password_reset_url}?token={reset_token.token}",
+        },
+    )
     
     return {"message": "If the email exists, a password reset link has been sent"}
 
@@ -78,8 +90,17 @@ def reset_user_password(request: PasswordResetConfirm, db: Session = Depends(get
 
 
 @router.get("/profile", response_model=UserResponse)
-def get_user_profile(current_user: User = Depends(get_current_active_user)):
+def get_user_profile(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
     """Get current user profile."""
+    # The user row is already loaded for authentication, so this costs no query
+    etag = make_etag("profile", current_user.id, current_user.updated_at or current_user.created_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     return current_user
 
 
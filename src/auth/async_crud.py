@@ -0,0 +1,144 @@
+"""AsyncSession counterparts of the functions in ``crud.py``.
+
+Password hashing is CPU-bound, so it runs on the threadpool instead of the loop.
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .models import User, PasswordResetToken
+from .schemas import UserCreate, UserUpdate
+from .utils import get_password_hash, generate_reset_token, create_reset_token_expires
+from ..metrics import password_logins_total
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Get user by email."""
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    """Get user by username."""
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Get user by ID."""
+    return await db.get(User, user_id)
+
+
+async def create_user(db: AsyncSession, user: UserCreate) -> User:
+    """Create a new user."""
+    if await get_user_by_email(db, user.email):
+        raise ValueError("Email already registered")
+    if await get_user_by_username(db, user.username):
+        raise ValueError("Username already taken")
+
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
+    db_user = User(
+        email=user.email,
+        username=user.username,
+        hashed_password=hashed_password
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def update_user_profile(db: AsyncSession, user_id: int, user_update: UserUpdate) -> Optional[User]:
+    """Update user profile."""
+    db_user = await get_user_by_id(db, user_id)
+    if not db_user:
+        return None
+
+    update_data = user_update.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_user, field, value)
+
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    """Authenticate user with email and password.
+
+    Hashes made with an outdated scheme or cost are rewritten on success.
+    """
+    from .utils import verify_and_update_password, identify_password_scheme
+
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+    verified, new_hash = await run_in_threadpool(
+        verify_and_update_password, password, user.hashed_password
+    )
+    if not verified:
+        return None
+
+    scheme = identify_password_scheme(user.hashed_password)
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    password_logins_total.labels(
+        scheme=scheme, status="rehashed" if new_hash else "current"
+    ).inc()
+    return user
+
+
+async def create_password_reset_token(db: AsyncSession, email: str) -> Optional[PasswordResetToken]:
+    """Create a password reset token."""
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+
+    # Invalidate any existing tokens for this email
+    await db.execute(
+        update(PasswordResetToken)
+        .where(and_(PasswordResetToken.email == email, PasswordResetToken.used == False))
+        .values(used=True)
+    )
+
+    db_token = PasswordResetToken(
+        email=email,
+        token=generate_reset_token(),
+        expires_at=create_reset_token_expires()
+    )
+    db.add(db_token)
+    await db.commit()
+    await db.refresh(db_token)
+    return db_token
+
+
+async def verify_reset_token(db: AsyncSession, token: str) -> Optional[PasswordResetToken]:
+    """Verify a password reset token."""
+    result = await db.execute(
+        select(PasswordResetToken).where(
+            PasswordResetToken.token == token,
+            PasswordResetToken.used == False,
+            PasswordResetToken.expires_at > datetime.utcnow()
+        )
+    )
+    return result.scalars().first()
+
+
+async def reset_password(db: AsyncSession, token: str, new_password: str) -> bool:
+    """Reset user password using reset token."""
+    db_token = await verify_reset_token(db, token)
+    if not db_token:
+        return False
+
+    user = await get_user_by_email(db, db_token.email)
+    if not user:
+        return False
+
+    user.hashed_password = await run_in_threadpool(get_password_hash, new_password)
+    db_token.used = True
+
+    await db.commit()
+    return True
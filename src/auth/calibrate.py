@@ -0,0 +1,117 @@
+"""Calibrate password hashing cost for the current host.
+
+Benchmarks increasing cost parameters and prints the settings for the most
+expensive one whose p99 hash time stays within the latency budget:
+
+    python -m src.auth.calibrate --scheme bcrypt --target-ms 250
+    python -m src.auth.calibrate --scheme argon2 --target-ms 250 --concurrency 4
+
+Run it on the deploy host (or one with the same CPU), ideally with the same
+concurrency the API uses, since parallel logins compete for cores.
+"""
+import argparse
+import math
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = range(8, 17)
+ARGON2_TIME_COSTS = range(1, 11)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure(hash_fn: Callable[[str], str], samples: int, concurrency: int) -> List[float]:
+    """Time ``samples`` hashes in milliseconds, running ``concurrency`` at once."""
+    password = secrets.token_urlsafe(12)
+    hash_fn(password)  # warm up backend loading before timing
+
+    def timed(_) -> float:
+        start = time.perf_counter()
+        hash_fn(password)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, range(samples)))
+
+
+def calibrate(
+    make_context: Callable[[int], CryptContext],
+    costs: range,
+    target_ms: float,
+    samples: int,
+    concurrency: int,
+) -> Tuple[Optional[int], List[Tuple[int, float, float]]]:
+    """Return the highest cost within budget and the (cost, p50, p99) table."""
+    chosen = None
+    table = []
+    for cost in costs:
+        context = make_context(cost)
+        timings = measure(context.hash, samples, concurrency)
+        p50, p99 = percentile(timings, 50), percentile(timings, 99)
+        table.append((cost, p50, p99))
+        if p99 > target_ms:
+            break
+        chosen = cost
+    return chosen, table
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="p99 budget for one hash")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--argon2-memory-cost", type=int, default=65536, help="KiB")
+    parser.add_argument("--argon2-parallelism", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.scheme == "bcrypt":
+        costs = BCRYPT_ROUNDS
+
+        def make_context(cost: int) -> CryptContext:
+            return CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=cost)
+    else:
+        costs = ARGON2_TIME_COSTS
+
+        def make_context(cost: int) -> CryptContext:
+            return CryptContext(
+                schemes=["argon2"],
+                argon2__default_rounds=cost,
+                argon2__memory_cost=args.argon2_memory_cost,
+                argon2__parallelism=args.argon2_parallelism,
+            )
+
+    chosen, table = calibrate(make_context, costs, args.target_ms, args.samples, args.concurrency)
+
+    print(f"{'cost':>6} {'p50 ms':>10} {'p99 ms':>10}")
+    for cost, p50, p99 in table:
+        print(f"{cost:>6} {p50:>10.1f} {p99:>10.1f}")
+    print()
+
+    if chosen is None:
+        print(f"No {args.scheme} cost fits a p99 of {args.target_ms:.0f} ms on this host.")
+        return 1
+
+    print("# Add to .env")
+    if args.scheme == "bcrypt":
+        print('PASSWORD_SCHEMES=["bcrypt"]')
+        print(f"BCRYPT_ROUNDS={chosen}")
+    else:
+        print('PASSWORD_SCHEMES=["argon2", "bcrypt"]')
+        print(f"ARGON2_TIME_COST={chosen}")
+        print(f"ARGON2_MEMORY_COST={args.argon2_memory_cost}")
+        print(f"ARGON2_PARALLELISM={args.argon2_parallelism}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,6 +6,7 @@ from sqlalchemy import and_
 from .models import User, PasswordResetToken
 from .schemas import UserCreate, UserUpdate
 from .utils import get_password_hash, generate_reset_token, create_reset_token_expires
+from ..metrics import password_logins_total
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
@@ -59,14 +60,27 @@ def update_user_profile(db: Session, user_id: int, user_update: UserUpdate) -> O
 
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    """Authenticate user with email and password."""
-    from .utils import verify_password
+    """Authenticate user with email and password.
+
+    Hashes made with an outdated scheme or cost are rewritten on success.
+    """
+    from .utils import verify_and_update_password, identify_password_scheme
     
     user = get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not verified:
         return None
+
+    scheme = identify_password_scheme(user.hashed_password)
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        db.refresh(user)
+    password_logins_total.labels(
+        scheme=scheme, status="rehashed" if new_hash else "current"
+    ).inc()
     return user
 
 
@@ -1,8 +1,8 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_read_db
 from .utils import verify_token
 from .crud import get_user_by_email
 from .models import User
@@ -11,10 +11,15 @@ security = HTTPBearer()
 
 
 def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> User:
-    """Get current authenticated user from JWT token."""
+    """Get current authenticated user from JWT token.
+
+    The user is loaded through a read session, so it may come from the replica
+    unless this principal wrote within the read-your-writes window.
+    """
     token = credentials.credentials
     email = verify_token(token)
     
@@ -25,6 +30,8 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Keys read-your-writes routing for every session in this request
+    request.state.principal = email
     user = get_user_by_email(db, email=email)
     if user is None:
         raise HTTPException(
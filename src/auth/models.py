@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,6 +7,10 @@ from ..database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset walks over the users of a set of time zones
+        Index("ix_users_timezone_id", "timezone", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -22,6 +26,10 @@ class User(Base):
     age = Column(Integer, nullable=True)
     gender = Column(String, nullable=True)  # 'male', 'female', 'other'
     blood_type = Column(String, nullable=True)  # 'A+', 'A-', 'B+', etc.
+    timezone = Column(String, nullable=True)  # IANA name, e.g. 'Europe/Berlin'; UTC if unset
+
+    # Daily reminders: set when a reminder is claimed, so it is sent only once
+    last_reminded_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
     chat_sessions = relationship("ChatSession", back_populates="user")
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, EmailStr
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import BaseModel, EmailStr, field_validator
 
 
 # User Schemas
@@ -18,6 +19,17 @@ class UserUpdate(BaseModel):
     age: Optional[int] = None
     gender: Optional[str] = None
     blood_type: Optional[str] = None
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError("Unknown time zone; use an IANA name such as 'Europe/Berlin'")
+        return value
 
 
 class UserResponse(UserBase):
@@ -29,6 +41,7 @@ class UserResponse(UserBase):
     age: Optional[int] = None
     gender: Optional[str] = None
     blood_type: Optional[str] = None
+    timezone: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
@@ -7,8 +7,41 @@ import secrets
 
 from ..config import settings
 
+
+def build_pwd_context(
+    schemes: Optional[List[str]] = None,
+    bcrypt_rounds: Optional[int] = None,
+    argon2_time_cost: Optional[int] = None,
+    argon2_memory_cost: Optional[int] = None,
+    argon2_parallelism: Optional[int] = None,
+) -> CryptContext:
+    """Build a password context that pins the configured cost of every scheme.
+
+    Min and max rounds equal the default, so ``needs_update`` flags hashes made
+    with any other cost and they are upgraded or downgraded on the next login.
+    """
+    schemes = schemes or settings.password_schemes
+    bcrypt_rounds = bcrypt_rounds or settings.bcrypt_rounds
+    argon2_time_cost = argon2_time_cost or settings.argon2_time_cost
+
+    options = {
+        "bcrypt__default_rounds": bcrypt_rounds,
+        "bcrypt__min_rounds": bcrypt_rounds,
+        "bcrypt__max_rounds": bcrypt_rounds,
+    }
+    if "argon2" in schemes:
+        options.update({
+            "argon2__default_rounds": argon2_time_cost,
+            "argon2__min_rounds": argon2_time_cost,
+            "argon2__max_rounds": argon2_time_cost,
+            "argon2__memory_cost": argon2_memory_cost or settings.argon2_memory_cost,
+            "argon2__parallelism": argon2_parallelism or settings.argon2_parallelism,
+        })
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = build_pwd_context()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -16,6 +49,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one is outdated."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def identify_password_scheme(hashed_password: str) -> str:
+    """Return the scheme name of a stored hash, or 'unknown'."""
+    return pwd_context.identify(hashed_password) or "unknown"
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
@@ -1,12 +1,45 @@
+import time
+
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import task_prerun, task_postrun, worker_init, worker_process_init
+from kombu import Queue
+from prometheus_client import start_http_server
+
 from .config import settings
+from .metrics import celery_task_duration_seconds, metrics_registry
+from .tracing import configure_tracing, connect_celery_tracing
+
+# Queues, each consumed by its own worker pool so a backlog of bulk jobs
+# never sits in front of interactive work:
+#   interactive - model calls a user is waiting on
+#   email       - outgoing mail
+#   health      - batch health-data processing and reminders
+#   scheduler   - the task-reminder scheduler, which holds its worker for a whole run
+QUEUES = ("interactive", "email", "health", "scheduler")
+
+TASK_ROUTES = {
+    "src.jobs.send_email_task": {"queue": "email"},
+    "src.jobs.send_bulk_email_task": {"queue": "email"},
+    "src.jobs.process_health_data_task": {"queue": "health"},
+    "src.jobs.daily_health_reminder_task": {"queue": "health"},
+    "src.jobs.send_reminder_batch_task": {"queue": "email"},
+    "src.jobs.scan_health_anomalies_task": {"queue": "health"},
+    "src.jobs.detect_anomalies_task": {"queue": "health"},
+    "src.jobs.import_health_file_task": {"queue": "health"},
+    "src.jobs.run_task_scheduler_task": {"queue": "scheduler"},
+    "src.jobs.send_task_reminders_task": {"queue": "email"},
+    "src.jobs.purge_idempotency_keys_task": {"queue": "health"},
+    "src.jobs.embed_messages_task": {"queue": "health"},
+    "src.jobs.backfill_embeddings_task": {"queue": "health"},
+}
 
 # Create Celery instance
 celery_app = Celery(
     "anamny",
-    broker=f"redis://redis:6379/0",
-    backend=f"redis://redis:6379/0",
-    include=["src.tasks"]
+    broker=settings.celery_broker_url,
+    backend=settings.celery_result_backend,
+    include=["src.jobs"]
 )
 
 # Celery configuration
@@ -16,10 +49,70 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    result_expires=3600,
+    result_expires=settings.celery_result_expires,
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue="health",  # unrouted tasks count as batch work
+    task_routes=TASK_ROUTES,
+    task_soft_time_limit=settings.celery_task_soft_time_limit,
+    task_time_limit=settings.celery_task_time_limit,
+    beat_schedule={
+        # Hourly: each run reminds the time zones where it is now the reminder hour
+        "daily-health-reminders": {
+            "task": "src.jobs.daily_health_reminder_task",
+            "schedule": crontab(minute=0),
+        },
+        "health-anomaly-scan": {
+            "task": "src.jobs.scan_health_anomalies_task",
+            "schedule": crontab(minute=15),
+        },
+        "embedding-backfill": {
+            "task": "src.jobs.backfill_embeddings_task",
+            "schedule": crontab(minute="*/10"),
+        },
+        "idempotency-key-purge": {
+            "task": "src.jobs.purge_idempotency_keys_task",
+            "schedule": crontab(minute=45),
+        },
+        # Back to back: each run fires the reminders due while it lasts
+        "task-reminder-scheduler": {
+            "task": "src.jobs.run_task_scheduler_task",
+            "schedule": settings.task_scheduler_run_seconds,
+        },
+    },
 )
 
 # Auto-discover tasks
 celery_app.autodiscover_tasks()
 
+# Task start times by task id, for the duration histogram
+_task_started = {}
+
+
+@task_prerun.connect
+def _record_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        celery_task_duration_seconds.labels(task=task.name, state=state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+@worker_init.connect
+def _start_metrics_server(**kwargs):
+    if settings.celery_metrics_port:
+        start_http_server(settings.celery_metrics_port, registry=metrics_registry())
+
+
+if settings.tracing_enabled:
+    connect_celery_tracing()
+
+    @worker_process_init.connect
+    def _start_tracing(**kwargs):
+        configure_tracing()
+
 # Your FastAPI app and other code below
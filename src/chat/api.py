@@ -1,37 +1,46 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..database import get_async_db, get_async_read_db
+from ..idempotency import do_not_replay
+from ..profiling import ProfiledRoute
+from ..responses import FastJSONResponse, cache_headers, etag_matches, make_etag, not_modified
 from ..auth.dependencies import get_current_active_user
 from ..auth.models import User
+from ..config import settings
 from .schemas import (
     ChatRequest, ChatResponse, SessionListResponse, SessionHistoryResponse,
-    ChatSessionCreate, ChatSessionResponse
+    ChatSessionCreate, ChatSessionResponse, UsageResponse
 )
-from .crud import (
-    send_message_to_ai, get_user_sessions, get_session_by_id, 
-    get_session_messages, create_chat_session, delete_session
+from .async_crud import (
+    send_message_to_ai, get_user_session_rows, get_session_row, get_session_message_rows,
+    get_sessions_version, get_session_version, create_chat_session, delete_session
 )
+from .usage import QuotaExceeded, get_usage_history, tokens_used_today
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter(prefix="/chat", tags=["chat"], route_class=ProfiledRoute)
 
 
 @router.post("/message", response_model=ChatResponse)
 async def send_chat_message(
     chat_request: ChatRequest,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Send a message to the AI assistant and get a response."""
     try:
-        user_message, ai_message, session = send_message_to_ai(
+        user_message, ai_message, session = await send_message_to_ai(
             db=db,
             user_id=current_user.id,
             message=chat_request.message,
             session_id=chat_request.session_id
         )
-        
+        if ai_message.ai_model == "error":
+            # The reply asks the user to try again; a retry must not replay it
+            do_not_replay(request)
+
         return ChatResponse(
             user_message=user_message,
             ai_message=ai_message,
@@ -42,6 +51,12 @@ async def send_chat_message(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -49,70 +64,96 @@ async def send_chat_message(
         )
 
 
+@router.get("/usage", response_model=UsageResponse)
+async def get_chat_usage(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Model token usage of the current user by day, and today's quota."""
+    used = await tokens_used_today(db, current_user.id)
+    quota = settings.llm_daily_token_quota or None
+    return UsageResponse(
+        tokens_today=used,
+        daily_quota=quota,
+        remaining_today=max(0, quota - used) if quota else None,
+        days=await get_usage_history(db, current_user.id, days),
+    )
+
+
 @router.get("/sessions", response_model=SessionListResponse)
 async def get_chat_sessions(
+    request: Request,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all chat sessions for the current user."""
-    sessions = get_user_sessions(db, current_user.id, skip, limit)
-    
-    # Add message count to each session
-    session_responses = []
-    for session in sessions:
-        session_dict = session.__dict__.copy()
-        session_dict['message_count'] = len(session.messages)
-        session_responses.append(ChatSessionResponse(**session_dict))
-    
-    return SessionListResponse(
-        sessions=session_responses,
-        total=len(sessions)
-    )
+    version = await get_sessions_version(db, current_user.id)
+    etag = make_etag("sessions", current_user.id, skip, limit, *version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    sessions = await get_user_session_rows(db, current_user.id, skip, limit)
+
+    # Rows already have the response shape; returning the response directly
+    # skips validating them again against SessionListResponse
+    return FastJSONResponse({"sessions": sessions, "total": len(sessions)}, headers=cache_headers(etag))
 
 
 @router.get("/sessions/{session_id}", response_model=SessionHistoryResponse)
 async def get_session_history(
     session_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get the full history of a specific chat session."""
-    session = get_session_by_id(db, session_id, current_user.id)
+    version = await get_session_version(db, session_id, current_user.id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+
+    # Answer unchanged polls before loading any messages
+    etag = make_etag("session", session_id, *version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    session = await get_session_row(db, session_id, current_user.id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
     
-    messages = get_session_messages(db, session_id, current_user.id)
-    
-    return SessionHistoryResponse(
-        session=session,
-        messages=messages
-    )
+    messages = await get_session_message_rows(db, session_id)
+    session["message_count"] = len(messages)
+
+    return FastJSONResponse({"session": session, "messages": messages}, headers=cache_headers(etag))
 
 
 @router.post("/sessions", response_model=ChatSessionResponse)
 async def create_new_session(
     session_data: ChatSessionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new chat session."""
-    session = create_chat_session(db, current_user.id, session_data)
+    session = await create_chat_session(db, current_user.id, session_data)
     return ChatSessionResponse(**session.__dict__, message_count=0)
 
 
 @router.delete("/sessions/{session_id}")
 async def delete_chat_session(
     session_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Delete a chat session."""
-    success = delete_session(db, session_id, current_user.id)
+    success = await delete_session(db, session_id, current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
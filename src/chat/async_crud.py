@@ -0,0 +1,348 @@
+"""AsyncSession counterparts of the functions in ``crud.py``.
+
+Lazy loading is not available on an AsyncSession, so everything a response
+needs (such as message counts) is fetched with explicit queries.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import anyio
+import anyio.to_thread
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .models import ChatSession, ChatMessage
+from .schemas import ChatSessionCreate
+from .crud import get_agent
+from .llm import track_llm_call
+from .routing import route
+from .usage import check_quota, record_usage
+from ..config import settings
+from ..health.async_crud import get_recent_anomalies
+from ..health.crud import describe_anomaly
+
+logger = logging.getLogger(__name__)
+
+
+async def create_chat_session(db: AsyncSession, user_id: int, session_data: ChatSessionCreate) -> ChatSession:
+    """Create a new chat session for a user."""
+    db_session = ChatSession(
+        user_id=user_id,
+        title=session_data.title
+    )
+    db.add(db_session)
+    await db.commit()
+    await db.refresh(db_session)
+    return db_session
+
+
+async def get_user_sessions(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 20) -> List[ChatSession]:
+    """Get all chat sessions for a user."""
+    result = await db.execute(
+        select(ChatSession).where(
+            ChatSession.user_id == user_id,
+            ChatSession.is_active == True
+        ).order_by(desc(ChatSession.updated_at)).offset(skip).limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def count_session_messages(db: AsyncSession, session_ids: List[int]) -> Dict[int, int]:
+    """Count messages for several sessions in a single grouped query."""
+    if not session_ids:
+        return {}
+    result = await db.execute(
+        select(ChatMessage.session_id, func.count(ChatMessage.id))
+        .where(ChatMessage.session_id.in_(session_ids))
+        .group_by(ChatMessage.session_id)
+    )
+    return dict(result.all())
+
+
+async def get_session_by_id(db: AsyncSession, session_id: int, user_id: int) -> Optional[ChatSession]:
+    """Get a specific session by ID for a user."""
+    result = await db.execute(
+        select(ChatSession).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id,
+            ChatSession.is_active == True
+        )
+    )
+    return result.scalars().first()
+
+
+async def get_session_messages(db: AsyncSession, session_id: int, user_id: int) -> List[ChatMessage]:
+    """Get all messages in a session."""
+    session = await get_session_by_id(db, session_id, user_id)
+    if not session:
+        return []
+
+    result = await db.execute(
+        select(ChatMessage).where(
+            ChatMessage.session_id == session_id
+        ).order_by(ChatMessage.created_at)
+    )
+    return list(result.scalars().all())
+
+
+# Projections for read endpoints: plain dicts straight from the rows, without
+# hydrating ORM objects, ready to be serialized as-is
+SESSION_COLUMNS = (
+    ChatSession.id, ChatSession.user_id, ChatSession.title,
+    ChatSession.created_at, ChatSession.updated_at, ChatSession.is_active,
+)
+MESSAGE_COLUMNS = (
+    ChatMessage.id, ChatMessage.session_id, ChatMessage.content, ChatMessage.is_user_message,
+    ChatMessage.created_at, ChatMessage.ai_model, ChatMessage.processing_time,
+    ChatMessage.prompt_tokens, ChatMessage.completion_tokens,
+)
+
+
+async def get_user_session_rows(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 20) -> List[dict]:
+    """Active sessions of a user as dicts, each with its message count."""
+    result = await db.execute(
+        select(*SESSION_COLUMNS).where(
+            ChatSession.user_id == user_id,
+            ChatSession.is_active == True
+        ).order_by(desc(ChatSession.updated_at)).offset(skip).limit(limit)
+    )
+    sessions = [dict(row) for row in result.mappings()]
+    counts = await count_session_messages(db, [session["id"] for session in sessions])
+    for session in sessions:
+        session["message_count"] = counts.get(session["id"], 0)
+    return sessions
+
+
+async def get_session_row(db: AsyncSession, session_id: int, user_id: int) -> Optional[dict]:
+    """A user's active session as a dict, or None."""
+    result = await db.execute(
+        select(*SESSION_COLUMNS).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id,
+            ChatSession.is_active == True
+        )
+    )
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def get_sessions_version(db: AsyncSession, user_id: int) -> tuple:
+    """(active session count, latest updated_at, latest message id) for a user.
+
+    Changes whenever the session list would; used as its ETag.
+    """
+    last_message_id = (
+        select(func.max(ChatMessage.id))
+        .join(ChatSession, ChatMessage.session_id == ChatSession.id)
+        .where(ChatSession.user_id == user_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(func.count(ChatSession.id), func.max(ChatSession.updated_at), last_message_id)
+        .where(ChatSession.user_id == user_id, ChatSession.is_active == True)
+    )
+    return tuple(result.one())
+
+
+async def get_session_version(db: AsyncSession, session_id: int, user_id: int) -> Optional[tuple]:
+    """(updated_at, latest message id) of a user's active session, or None.
+
+    Messages are append-only, so this changes whenever the history would.
+    """
+    last_message_id = (
+        select(func.max(ChatMessage.id))
+        .where(ChatMessage.session_id == session_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(ChatSession.updated_at, last_message_id).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id,
+            ChatSession.is_active == True
+        )
+    )
+    row = result.first()
+    return tuple(row) if row else None
+
+
+async def get_session_message_rows(db: AsyncSession, session_id: int) -> List[dict]:
+    """Messages of a session as dicts; the caller checks ownership."""
+    result = await db.execute(
+        select(*MESSAGE_COLUMNS).where(
+            ChatMessage.session_id == session_id
+        ).order_by(ChatMessage.created_at)
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def create_message(db: AsyncSession, session_id: int, content: str, is_user_message: bool,
+                         ai_model: Optional[str] = None, processing_time: Optional[int] = None,
+                         prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> ChatMessage:
+    """Create a new message in a session."""
+    db_message = ChatMessage(
+        session_id=session_id,
+        content=content,
+        is_user_message=is_user_message,
+        ai_model=ai_model,
+        processing_time=processing_time,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
+    )
+    db.add(db_message)
+    await db.commit()
+    await db.refresh(db_message)
+    return db_message
+
+
+async def get_relevant_messages(db: AsyncSession, user_id: int, message: str) -> List[dict]:
+    """The user's past messages most similar to ``message``, from any of
+    their active sessions, best first (see ``embeddings``)."""
+    if settings.retrieval_top_k <= 0:
+        return []
+    # numpy loads on first use
+    from .embeddings import get_embedder, search
+
+    def nearest():
+        return search(user_id, get_embedder().embed([message])[0], settings.retrieval_top_k)
+
+    hits = [message_id for message_id, score in await run_in_threadpool(nearest)
+            if score >= settings.retrieval_min_score]
+    if not hits:
+        return []
+    result = await db.execute(
+        select(ChatMessage.id, ChatMessage.content, ChatMessage.is_user_message, ChatMessage.created_at)
+        .join(ChatSession, ChatMessage.session_id == ChatSession.id)
+        .where(ChatMessage.id.in_(hits), ChatSession.user_id == user_id, ChatSession.is_active == True)
+    )
+    rows = {row["id"]: dict(row) for row in result.mappings()}
+    return [rows[message_id] for message_id in hits if message_id in rows]
+
+
+def _snippet(row: dict) -> str:
+    content = " ".join(row["content"].split())
+    if len(content) > settings.retrieval_snippet_chars:
+        content = content[:settings.retrieval_snippet_chars].rsplit(" ", 1)[0] + "..."
+    speaker = "patient" if row["is_user_message"] else "you"
+    return f"- ({row['created_at']:%Y-%m-%d}, {speaker}) {content}"
+
+
+# Publishes still in flight; the loop only keeps weak references to tasks
+_background_tasks: set = set()
+# Publishing gets its own thread, so a slow or unreachable broker never ties
+# up the threadpool requests run on; after a failure it pauses for a while
+_publish_limiter = anyio.CapacityLimiter(1)
+_publish_paused_until = 0.0
+
+
+async def _publish_embedding(message_ids: List[int]) -> None:
+    global _publish_paused_until
+    from ..jobs import embed_messages_task
+
+    if time.monotonic() < _publish_paused_until:
+        return
+    try:
+        await anyio.to_thread.run_sync(embed_messages_task.delay, message_ids, limiter=_publish_limiter)
+    except Exception:
+        # Retrieval just misses these messages; the reply stands
+        _publish_paused_until = time.monotonic() + settings.embedding_queue_pause
+        logger.warning("Embedding not queued for messages %s", message_ids, exc_info=True)
+
+
+def _queue_embedding(message_ids: List[int]) -> None:
+    """Queue the messages for embedding without holding up the reply."""
+    task = asyncio.get_running_loop().create_task(_publish_embedding(message_ids))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def send_message_to_ai(db: AsyncSession, user_id: int, message: str, session_id: Optional[int] = None) -> tuple[ChatMessage, ChatMessage, ChatSession]:
+    """
+    Send a message to the AI and get response.
+    Returns (user_message, ai_message, session).
+    Raises QuotaExceeded when the user has used up today's tokens.
+    """
+    if not message or not message.strip():
+        raise ValueError("Message cannot be empty")
+
+    tokens_used = await check_quota(db, user_id)
+
+    if session_id:
+        session = await get_session_by_id(db, session_id, user_id)
+        if not session:
+            raise ValueError("Session not found")
+    else:
+        title = message[:50] + "..." if len(message) > 50 else message
+        session = await create_chat_session(db, user_id, ChatSessionCreate(title=title))
+
+    # Pick the model before this message joins the session's history
+    model_route = route(message, follow_up=session_id is not None, tokens_used=tokens_used)
+    user_message = await create_message(db, session.id, message, True)
+
+    # Let the agent know about readings the anomaly scan flagged lately
+    anomalies = await get_recent_anomalies(db, user_id, datetime.now(timezone.utc) - timedelta(days=7), limit=5)
+    context_parts = []
+    if anomalies:
+        context_parts.append("Recent health readings flagged as unusual for this patient:\n" + "\n".join(
+            f"- {describe_anomaly(anomaly)}" for anomaly in anomalies
+        ))
+    # And about earlier messages on the same subject, from any session
+    relevant = await get_relevant_messages(db, user_id, message)
+    if relevant:
+        context_parts.append("Earlier messages from this patient's conversations that may be relevant:\n"
+                             + "\n".join(_snippet(row) for row in relevant))
+    context = "\n\n".join(context_parts) or None
+
+    start_time = time.time()
+    try:
+        agent = get_agent(context, model_route.model)
+
+        with track_llm_call(agent.model.id) as call:
+            response = await agent.arun(
+                message=message.strip(),
+                user_id=str(user_id),
+                session_id=f"session_{session.id}",
+            )
+            usage = call.record(response)
+        ai_response_text = response.content if hasattr(response, 'content') else str(response)
+        processing_time = int((time.time() - start_time) * 1000)  # milliseconds
+
+        # Committed together with the reply
+        await record_usage(db, user_id, usage)
+        ai_message = await create_message(
+            db, session.id, ai_response_text, False,
+            ai_model=agent.model.id, processing_time=processing_time, **usage
+        )
+
+        session.updated_at = ai_message.created_at
+        await db.commit()
+        await db.refresh(session)
+
+        _queue_embedding([user_message.id, ai_message.id])
+        return user_message, ai_message, session
+
+    except Exception:
+        logger.exception("Model call failed for session %s", session.id)
+        error_message = f"I apologize, but I'm experiencing technical difficulties right now. Please try again in a moment."
+        processing_time = int((time.time() - start_time) * 1000)
+
+        ai_message = await create_message(
+            db, session.id, error_message, False,
+            ai_model="error", processing_time=processing_time
+        )
+
+        return user_message, ai_message, session
+
+
+async def delete_session(db: AsyncSession, session_id: int, user_id: int) -> bool:
+    """Soft delete a chat session."""
+    session = await get_session_by_id(db, session_id, user_id)
+    if not session:
+        return False
+
+    session.is_active = False
+    await db.commit()
+    return True
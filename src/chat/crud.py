@@ -1,26 +1,40 @@
 import time
+from datetime import datetime
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.memory.v2 import Memory
+from sqlalchemy import desc, func
 
 from .models import ChatSession, ChatMessage
 from .schemas import ChatSessionCreate, ChatMessageCreate
+from .llm import track_llm_call
+from .routing import route
+from .usage import usage_upsert
 from ..config import settings
 
 # Initialize the AI agent
-def get_agent():
-    """Get configured AI agent instance."""
-    if not settings.gemini_api_key:
-        raise ValueError("GEMINI_API_KEY is not configured")
-    
+def get_agent(additional_context: Optional[str] = None, model_id: Optional[str] = None):
+    """Get configured AI agent instance; ``additional_context`` is appended
+    to the system prompt. ``model_id`` defaults to the standard tier's model."""
+    model_id = model_id or settings.llm_tier_models["standard"]
+    # agno and google-genai take over a second to import; load them on first use
+    from agno.agent import Agent
+    from agno.memory.v2 import Memory
+
+    if settings.llm_provider == "fake":
+        from .fake_model import FakeModel
+        model = FakeModel.from_settings(model_id)
+    else:
+        if not settings.gemini_api_key:
+            raise ValueError("GEMINI_API_KEY is not configured")
+
+        from agno.models.google import Gemini
+        model = Gemini(id=model_id, api_key=settings.gemini_api_key)
+
     return Agent(
-        model=Gemini(id="gemini-1.5-flash", api_key=settings.gemini_api_key),
+        model=model,
         memory=Memory(),  # Multi-user support requires Memory.v2
         add_history_to_messages=True,
+        additional_context=additional_context,
         instructions="""
 You are an AI doctor who helps detect and prevent diseases. 
 Based on the patient's symptoms and other diseases, tell him what's wrong with him. 
@@ -74,14 +88,17 @@ def get_session_messages(db: Session, session_id: int, user_id: int) -> List[Cha
 
 
 def create_message(db: Session, session_id: int, content: str, is_user_message: bool, 
-                  ai_model: Optional[str] = None, processing_time: Optional[int] = None) -> ChatMessage:
+                  ai_model: Optional[str] = None, processing_time: Optional[int] = None,
+                  prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> ChatMessage:
     """Create a new message in a session."""
     db_message = ChatMessage(
         session_id=session_id,
         content=content,
         is_user_message=is_user_message,
         ai_model=ai_model,
-        processing_time=processing_time
+        processing_time=processing_time,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
     )
     db.add(db_message)
     db.commit()
@@ -108,6 +125,9 @@ def send_message_to_ai(db: Session, user_id: int, message: str, session_id: Opti
         title = message[:50] + "..." if len(message) > 50 else message
         session = create_chat_session(db, user_id, ChatSessionCreate(title=title))
     
+    # Pick the model before this message joins the session's history
+    model_route = route(message, follow_up=session_id is not None)
+
     # Create user message
     user_message = create_message(db, session.id, message, True)
     
@@ -115,20 +135,23 @@ def send_message_to_ai(db: Session, user_id: int, message: str, session_id: Opti
     start_time = time.time()
     try:
         # Get agent instance
-        agent = get_agent()
+        agent = get_agent(model_id=model_route.model)
         
-        response = agent.run(
-            message=message.strip(),
-            user_id=str(user_id),
-            session_id=f"session_{session.id}",
-        )
+        with track_llm_call(agent.model.id) as call:
+            response = agent.run(
+                message=message.strip(),
+                user_id=str(user_id),
+                session_id=f"session_{session.id}",
+            )
+            usage = call.record(response)
         ai_response_text = response.content if hasattr(response, 'content') else str(response)
         processing_time = int((time.time() - start_time) * 1000)  # milliseconds
         
         # Create AI message
+        db.execute(usage_upsert(db.get_bind().dialect.name, user_id, usage))
         ai_message = create_message(
             db, session.id, ai_response_text, False, 
-            ai_model="gemini-1.5-flash", processing_time=processing_time
+            ai_model=agent.model.id, processing_time=processing_time, **usage
         )
         
         # Update session timestamp
@@ -162,3 +185,28 @@ def delete_session(db: Session, session_id: int, user_id: int) -> bool:
     session.is_active = False
     db.commit()
     return True
+
+
+def get_messages_to_embed(db: Session, message_ids: List[int]) -> List[tuple]:
+    """(id, user_id, content) of the given messages long enough to be worth
+    retrieving later."""
+    return db.query(ChatMessage.id, ChatSession.user_id, ChatMessage.content).join(
+        ChatSession, ChatMessage.session_id == ChatSession.id
+    ).filter(
+        ChatMessage.id.in_(message_ids),
+        func.length(ChatMessage.content) >= settings.embedding_min_chars
+    ).all()
+
+
+def get_messages_to_backfill(db: Session, after_id: int, before: datetime, limit: int) -> List[tuple]:
+    """(id, user_id, content, settled) of up to ``limit`` messages worth
+    retrieving, by id past ``after_id``; ``settled`` is whether the message
+    was created before ``before``."""
+    return db.query(
+        ChatMessage.id, ChatSession.user_id, ChatMessage.content, (ChatMessage.created_at < before).label("settled")
+    ).join(
+        ChatSession, ChatMessage.session_id == ChatSession.id
+    ).filter(
+        ChatMessage.id > after_id,
+        func.length(ChatMessage.content) >= settings.embedding_min_chars
+    ).order_by(ChatMessage.id).limit(limit).all()
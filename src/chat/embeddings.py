@@ -0,0 +1,193 @@
+"""Retrieval over a user's past chat messages.
+
+Messages are embedded by ``embed_messages_task`` after they are stored and
+appended to the user's index: one file per user under EMBEDDING_INDEX_DIR
+holding fixed-size records of (message id, float32 vector), unit-normalized.
+Appends take an exclusive ``flock`` so workers embedding the same user never
+interleave records.
+
+Messages the task never got (publishing paused, a failed task) or that
+predate retrieval are picked up by ``backfill_embeddings_task``, which walks
+``chat_messages`` by id past a watermark kept beside the indexes and adds
+whatever an index is missing.
+
+Searching memory-maps the file and scores every vector with one matrix
+product (brute force: a user has thousands of messages, not millions, and a
+search over 10k 256-dimensional vectors takes about a millisecond); the top
+k come from ``argpartition``. A record cut short by a crash mid-append is
+ignored, and a message embedded twice (a retried task) is returned once.
+
+Embedders:
+
+* ``local``: feature hashing of words and word pairs. Deterministic and
+  offline, for tests, benchmarks and development; it matches wording, not
+  meaning.
+* ``gemini``: the EMBEDDING_MODEL embeddings API.
+"""
+import fcntl
+import functools
+import os
+import re
+import zlib
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be been but by can could did do does for from had has have how i i'm if in is it its
+    me my of on or so that the their them then there this to was we were what when which who will with
+    would you your
+""".split())
+
+
+def record_dtype(dim: int) -> np.dtype:
+    return np.dtype([("id", "<i8"), ("vector", "<f4", (dim,))])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams into ``dim`` buckets."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = [w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.array([zlib.crc32(f.encode()) for f in self._features(text)], dtype=np.uint32)
+            if not len(hashes):
+                continue
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        return _normalize(vectors)
+
+
+class GeminiEmbedder:
+    def __init__(self, dim: int):
+        from google import genai
+        from google.genai import types
+
+        self.dim = dim
+        self._client = genai.Client(api_key=settings.gemini_api_key)
+        self._config = types.EmbedContentConfig(output_dimensionality=dim)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        result = self._client.models.embed_content(
+            model=settings.embedding_model, contents=list(texts), config=self._config
+        )
+        return _normalize(np.array([e.values for e in result.embeddings], dtype=np.float32))
+
+
+@functools.lru_cache
+def get_embedder():
+    if settings.embedding_provider == "gemini":
+        return GeminiEmbedder(settings.embedding_dim)
+    return HashingEmbedder(settings.embedding_dim)
+
+
+def index_path(user_id: int) -> str:
+    # Spread over subdirectories; the dimension in the name keeps indexes
+    # built with another EMBEDDING_DIM from being read
+    return os.path.join(settings.embedding_index_dir, f"{user_id % 256:02x}",
+                        f"{user_id}.{settings.embedding_dim}.idx")
+
+
+def append(user_id: int, message_ids: Sequence[int], vectors: np.ndarray) -> None:
+    """Add embedded messages to the user's index."""
+    records = np.empty(len(message_ids), dtype=record_dtype(settings.embedding_dim))
+    records["id"] = message_ids
+    records["vector"] = vectors
+    path = index_path(user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Drop a record left half-written by a crash, or every later one
+            # would be misaligned
+            size = f.seek(0, os.SEEK_END)
+            if size % records.dtype.itemsize:
+                f.truncate(size - size % records.dtype.itemsize)
+            f.write(records.tobytes())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load(user_id: int) -> np.ndarray:
+    """The user's index as a read-only memory map (empty if there is none)."""
+    dtype = record_dtype(settings.embedding_dim)
+    path = index_path(user_id)
+    try:
+        count = os.path.getsize(path) // dtype.itemsize
+    except FileNotFoundError:
+        count = 0
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class Watermark:
+    """Id through which every message has been offered to the indexes.
+
+    Kept in EMBEDDING_INDEX_DIR, so indexes built from scratch (a new
+    directory or EMBEDDING_DIM) are backfilled from the start. Entering takes
+    an exclusive lock and raises BlockingIOError if another run holds it.
+    """
+
+    def __init__(self):
+        self.path = os.path.join(settings.embedding_index_dir, f"backfill.{settings.embedding_dim}")
+        self.message_id = 0
+
+    def __enter__(self) -> "Watermark":
+        os.makedirs(settings.embedding_index_dir, exist_ok=True)
+        self._file = open(self.path, "a+")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            raise
+        self._file.seek(0)
+        self.message_id = int(self._file.read().strip() or 0)
+        return self
+
+    def advance(self, message_id: int) -> None:
+        self.message_id = message_id
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(message_id))
+        self._file.flush()
+
+    def __exit__(self, *exc_info) -> None:
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def search(user_id: int, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """(message id, cosine similarity) of the ``k`` nearest messages, best first."""
+    index = load(user_id)
+    if not len(index) or k <= 0:
+        return []
+    scores = index["vector"] @ query
+    # Extra candidates cover messages indexed twice
+    top = min(len(scores), 2 * k)
+    candidates = np.argpartition(-scores, top - 1)[:top]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    results, seen = [], set()
+    for i in candidates:
+        message_id = int(index["id"][i])
+        if message_id not in seen:
+            seen.add(message_id)
+            results.append((message_id, float(scores[i])))
+            if len(results) == k:
+                break
+    return results
@@ -0,0 +1,123 @@
+"""Offline stand-in for Gemini, used for load tests and benchmarks.
+
+Selected with LLM_PROVIDER=fake. Latency is drawn from a log-normal
+distribution around FAKE_LLM_LATENCY_MS, a FAKE_LLM_FAILURE_RATE fraction of
+calls raise, and streamed responses arrive in FAKE_LLM_STREAM_CHUNKS pieces.
+Token counts are synthetic (about one token per word) so usage accounting
+can be exercised without a provider.
+"""
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from ..config import settings
+
+DEFAULT_REPLY = (
+    "Based on what you describe, this could have several causes. I recommend a "
+    "complete blood count and a visit to a general practitioner. I am providing "
+    "general information only; please consult a healthcare professional."
+)
+
+
+class FakeModelError(Exception):
+    """Injected failure, standing in for a provider error."""
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count: one per whitespace-separated word."""
+    return len(text.split())
+
+
+@dataclass
+class FakeModel(Model):
+    id: str = "fake"
+    name: str = "FakeModel"
+    provider: str = "Fake"
+
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.3
+    failure_rate: float = 0.0
+    stream_chunks: int = 8
+    reply: str = DEFAULT_REPLY
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    @classmethod
+    def from_settings(cls, model_id: str = "fake") -> "FakeModel":
+        return cls(
+            id=model_id,
+            latency_ms=settings.fake_llm_latency_ms,
+            latency_sigma=settings.fake_llm_latency_sigma,
+            failure_rate=settings.fake_llm_failure_rate,
+            stream_chunks=settings.fake_llm_stream_chunks,
+        )
+
+    # Simulation
+
+    def _latency(self) -> float:
+        """Seconds for one call; the median is ``latency_ms``."""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def _maybe_fail(self) -> None:
+        if self._random.random() < self.failure_rate:
+            raise FakeModelError("Injected fake model failure")
+
+    def _response(self, messages: List[Message]) -> Dict[str, Any]:
+        prompt = " ".join(m.get_content_string() for m in messages if m.content)
+        return {
+            "content": self.reply,
+            "usage": {"input_tokens": count_tokens(prompt), "output_tokens": count_tokens(self.reply)},
+        }
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        size = max(1, math.ceil(len(words) / max(1, self.stream_chunks)))
+        return [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+                for i in range(0, len(words), size)]
+
+    # agno Model interface
+
+    def invoke(self, messages: List[Message], **kwargs) -> Dict[str, Any]:
+        self._maybe_fail()
+        time.sleep(self._latency())
+        return self._response(messages)
+
+    async def ainvoke(self, messages: List[Message], **kwargs) -> Dict[str, Any]:
+        self._maybe_fail()
+        await asyncio.sleep(self._latency())
+        return self._response(messages)
+
+    def invoke_stream(self, messages: List[Message], **kwargs) -> Iterator[Dict[str, Any]]:
+        self._maybe_fail()
+        response = self._response(messages)
+        chunks = self._chunks(response["content"])
+        delay = self._latency() / len(chunks)
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay)
+            yield {"content": chunk, "usage": response["usage"] if i == len(chunks) - 1 else None}
+
+    async def ainvoke_stream(self, messages: List[Message], **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        self._maybe_fail()
+        response = self._response(messages)
+        chunks = self._chunks(response["content"])
+        delay = self._latency() / len(chunks)
+        for i, chunk in enumerate(chunks):
+            await asyncio.sleep(delay)
+            yield {"content": chunk, "usage": response["usage"] if i == len(chunks) - 1 else None}
+
+    def parse_provider_response(self, response: Dict[str, Any], **kwargs) -> ModelResponse:
+        return ModelResponse(role="assistant", content=response["content"], response_usage=response["usage"])
+
+    def parse_provider_response_delta(self, response: Dict[str, Any]) -> ModelResponse:
+        return ModelResponse(role="assistant", content=response["content"], response_usage=response["usage"])
@@ -0,0 +1,71 @@
+"""Instrumentation around model calls made through the agent."""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from opentelemetry.trace import SpanKind
+
+from ..metrics import (
+    llm_request_duration_seconds, llm_time_to_first_token_seconds, llm_errors_total,
+    llm_tokens, request_stats
+)
+from ..tracing import tracer
+
+
+def response_usage(response: Any) -> Dict[str, int]:
+    """Prompt/completion token counts from an agent RunResponse.
+
+    agno reports metrics as lists with one entry per model call in the run.
+    """
+    metrics = getattr(response, "metrics", None) or {}
+    return {
+        "prompt_tokens": sum(metrics.get("input_tokens") or []),
+        "completion_tokens": sum(metrics.get("output_tokens") or []),
+    }
+
+
+class LLMCall:
+    """Handle yielded by ``track_llm_call``; pass it the response when it arrives."""
+
+    def __init__(self, model: str, span):
+        self.model = model
+        self.span = span
+        self.start = time.perf_counter()
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def record(self, response: Any) -> Dict[str, int]:
+        elapsed = time.perf_counter() - self.start
+        metrics = getattr(response, "metrics", None) or {}
+        # Streaming runs report their own TTFT; a whole response arrives at once
+        first_token = (metrics.get("time_to_first_token") or [elapsed])[0]
+        llm_time_to_first_token_seconds.labels(model=self.model).observe(first_token)
+
+        self.usage = response_usage(response)
+        llm_tokens.labels(model=self.model, kind="prompt").observe(self.usage["prompt_tokens"])
+        llm_tokens.labels(model=self.model, kind="completion").observe(self.usage["completion_tokens"])
+        self.span.set_attribute("llm.usage.prompt_tokens", self.usage["prompt_tokens"])
+        self.span.set_attribute("llm.usage.completion_tokens", self.usage["completion_tokens"])
+        self.span.set_attribute("llm.time_to_first_token_s", first_token)
+        return self.usage
+
+
+@contextmanager
+def track_llm_call(model: str) -> Iterator[LLMCall]:
+    """Time and trace one model call; count it as an error if the block raises."""
+    with tracer.start_as_current_span(
+        "llm.call", kind=SpanKind.CLIENT, attributes={"llm.model": model}
+    ) as span:
+        call = LLMCall(model, span)
+        outcome = "ok"
+        try:
+            yield call
+        except Exception as e:
+            outcome = "error"
+            llm_errors_total.labels(model=model, error=type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - call.start
+            llm_request_duration_seconds.labels(model=model, outcome=outcome).observe(elapsed)
+            stats = request_stats.get()
+            if stats is not None:
+                stats.llm_seconds += elapsed
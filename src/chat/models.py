@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -22,6 +22,9 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
@@ -32,6 +35,23 @@ class ChatMessage(Base):
     # Optional: Store AI model response metadata
     ai_model = Column(String(100), nullable=True)  # e.g., "gemini-1.5-flash"
     processing_time = Column(Integer, nullable=True)  # milliseconds
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
 
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+
+
+class LLMUsage(Base):
+    """A user's model usage over one UTC day, for quotas (see chat.usage)."""
+
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "day"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,77 @@
+"""Pick the model tier for a chat message with a cheap local classifier.
+
+Three tiers, mapped to model ids by LLM_TIER_MODELS:
+
+* ``strong`` for messages describing red-flag symptoms (chest pain, trouble
+  breathing, ...) or several symptoms, measurements and doses at once;
+* ``light`` for short follow-ups in an existing session that mention no
+  symptom ("thanks", "which doctor was that?");
+* ``standard`` for everything else.
+
+The classifier is a handful of set lookups and regexes, a few microseconds
+per message. Users past LLM_QUOTA_LIGHT_FRACTION of their daily token quota
+are moved to the light tier, except for red flags.
+"""
+import re
+from dataclasses import dataclass
+
+from ..config import settings
+from ..metrics import llm_routed_total
+
+TIERS = ("light", "standard", "strong")
+
+WORD = re.compile(r"[a-z]+")
+# A number with a unit: '38.5 c', '120/80', '500mg', '3 days', '95%'
+MEASUREMENT = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:/\s*\d+|%|°|mg|mcg|ml|mmol|bpm|kg|lbs?|c\b|f\b|days?|weeks?|months?|hours?|years?)",
+    re.IGNORECASE,
+)
+
+SYMPTOMS = frozenset("""
+    ache aches aching pain pains painful sore soreness cramp cramps headache migraine fever fevers chills
+    sweats sweating cough coughing sneezing congestion nausea nauseous vomiting vomit diarrhea diarrhoea
+    constipation bloating heartburn dizzy dizziness vertigo faint fainted fatigue tired tiredness weakness
+    exhausted rash itch itching itchy swelling swollen bruise bruising bleeding numb numbness tingling
+    insomnia anxiety palpitations wheezing breathless lump lumps discharge burning stiffness spasm spasms
+    tremor shaking blurred thirst urination appetite weight
+""".split())
+
+RED_FLAGS = (
+    "chest pain", "chest tightness", "can't breathe", "cannot breathe", "shortness of breath",
+    "trouble breathing", "difficulty breathing", "fainted", "passed out", "unconscious", "seizure",
+    "stroke", "slurred", "paralysis", "coughing blood", "coughing up blood", "vomiting blood",
+    "blood in", "suicid", "overdose", "severe pain", "worst headache", "pregnan",
+)
+
+
+@dataclass
+class Route:
+    tier: str
+    model: str
+    reason: str  # 'red_flag', 'complex', 'follow_up', 'default' or 'quota'
+
+
+def classify(message: str, follow_up: bool) -> tuple[str, str]:
+    """(tier, reason) for ``message``; ``follow_up`` if the session has history."""
+    text = message.lower()
+    if any(flag in text for flag in RED_FLAGS):
+        return "strong", "red_flag"
+    words = WORD.findall(text)
+    symptoms = len(SYMPTOMS.intersection(words))
+    measurements = len(MEASUREMENT.findall(text))
+    if symptoms >= 3 or measurements >= 2 or (symptoms >= 2 and len(words) >= 40):
+        return "strong", "complex"
+    if follow_up and not symptoms and not measurements and len(words) <= settings.llm_light_max_words:
+        return "light", "follow_up"
+    return "standard", "default"
+
+
+def route(message: str, follow_up: bool, tokens_used: int = 0) -> Route:
+    """The tier and model for ``message`` from a user who has used
+    ``tokens_used`` of their daily quota."""
+    tier, reason = classify(message, follow_up)
+    quota = settings.llm_daily_token_quota
+    if quota and reason != "red_flag" and tokens_used >= quota * settings.llm_quota_light_fraction:
+        tier, reason = "light", "quota"
+    llm_routed_total.labels(tier=tier, reason=reason).inc()
+    return Route(tier, settings.llm_tier_models[tier], reason)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 from pydantic import BaseModel
 
@@ -40,6 +40,8 @@ class ChatMessageResponse(ChatMessageBase):
     created_at: datetime
     ai_model: Optional[str] = None
     processing_time: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -65,3 +67,21 @@ class SessionListResponse(BaseModel):
 class SessionHistoryResponse(BaseModel):
     session: ChatSessionResponse
     messages: List[ChatMessageResponse]
+
+
+# Usage Schemas
+class UsageDay(BaseModel):
+    day: date
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+
+    class Config:
+        from_attributes = True
+
+
+class UsageResponse(BaseModel):
+    tokens_today: int
+    daily_quota: Optional[int] = None  # None when unlimited
+    remaining_today: Optional[int] = None
+    days: List[UsageDay]  # newest first
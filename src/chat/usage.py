@@ -0,0 +1,82 @@
+"""Per-user model token usage, aggregated by UTC day, and the daily quota.
+
+Each model call adds its prompt and completion tokens to the user's row for
+the day in ``llm_usage`` with a single upsert, so checking the quota is a
+primary-key lookup rather than a sum over ``chat_messages``.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from .models import LLMUsage
+
+
+class QuotaExceeded(Exception):
+    """The user has used up their daily token quota."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Daily model usage quota exceeded")
+        self.retry_after = retry_after  # seconds until the quota resets
+
+
+def today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def seconds_until_reset() -> int:
+    tomorrow = datetime.combine(today() + timedelta(days=1), time(), timezone.utc)
+    return int((tomorrow - datetime.now(timezone.utc)).total_seconds()) + 1
+
+
+def usage_upsert(dialect_name: str, user_id: int, usage: Dict[str, int]):
+    """Statement adding one call's ``usage`` to the user's total for today."""
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    table = LLMUsage.__table__
+    stmt = dialect_insert(table).values(
+        user_id=user_id, day=today(), requests=1,
+        prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"],
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day"],
+        set_={
+            "requests": table.c.requests + 1,
+            "prompt_tokens": table.c.prompt_tokens + stmt.excluded.prompt_tokens,
+            "completion_tokens": table.c.completion_tokens + stmt.excluded.completion_tokens,
+        },
+    )
+
+
+async def record_usage(db: AsyncSession, user_id: int, usage: Dict[str, int]) -> None:
+    """Add ``usage`` to today's total; committed with the caller's transaction."""
+    conn = await db.connection()
+    await db.execute(usage_upsert(conn.dialect.name, user_id, usage))
+
+
+async def tokens_used_today(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(
+        select(LLMUsage.prompt_tokens + LLMUsage.completion_tokens)
+        .where(LLMUsage.user_id == user_id, LLMUsage.day == today())
+    )
+    return result.scalar() or 0
+
+
+async def check_quota(db: AsyncSession, user_id: int) -> int:
+    """Tokens the user has used today; raises QuotaExceeded past the quota."""
+    used = await tokens_used_today(db, user_id)
+    if settings.llm_daily_token_quota and used >= settings.llm_daily_token_quota:
+        raise QuotaExceeded(seconds_until_reset())
+    return used
+
+
+async def get_usage_history(db: AsyncSession, user_id: int, days: int) -> List[LLMUsage]:
+    """The user's daily totals over the last ``days`` days, newest first."""
+    result = await db.execute(
+        select(LLMUsage)
+        .where(LLMUsage.user_id == user_id, LLMUsage.day > today() - timedelta(days=days))
+        .order_by(LLMUsage.day.desc())
+    )
+    return list(result.scalars().all())
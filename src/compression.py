@@ -0,0 +1,197 @@
+"""Response compression negotiated through Accept-Encoding.
+
+Supports gzip and, when their optional packages are installed, brotli
+(``brotli``) and zstd (``zstandard``). Bodies below COMPRESSION_MIN_SIZE,
+responses that already carry a Content-Encoding and content types that don't
+compress (images, archives, ...) pass through untouched. Streamed responses
+are compressed chunk by chunk and flushed after each one, so clients keep
+receiving data as it is produced.
+
+The time spent compressing and the bytes before and after are recorded per
+route, so the CPU cost can be weighed against the bandwidth saved.
+"""
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .config import settings
+from .metrics import http_compression_bytes_total, http_compression_seconds, route_label
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/xml", "application/javascript",
+                      "application/x-ndjson", "application/problem+json", "image/svg+xml")
+
+
+class GzipCompressor:
+    def __init__(self):
+        # wbits 31: gzip container rather than raw zlib
+        self._compressor = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush)
+
+
+class BrotliCompressor:
+    def __init__(self):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=settings.brotli_quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class ZstdCompressor:
+    def __init__(self):
+        import zstandard
+
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._flush_finish = zstandard.COMPRESSOBJ_FLUSH_FINISH
+        self._compressor = zstandard.ZstdCompressor(level=settings.zstd_level).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(self._flush_finish if final else self._flush_block)
+
+
+COMPRESSORS = {"br": BrotliCompressor, "zstd": ZstdCompressor, "gzip": GzipCompressor}
+OPTIONAL_PACKAGES = {"br": "brotli", "zstd": "zstandard"}
+
+
+def available_encodings(preferred: List[str]) -> List[str]:
+    """``preferred`` without encodings whose package is not installed."""
+    available = []
+    for encoding in preferred:
+        if encoding not in COMPRESSORS:
+            continue
+        package = OPTIONAL_PACKAGES.get(encoding)
+        if package:
+            try:
+                __import__(package)
+            except ImportError:
+                continue
+        available.append(encoding)
+    return available
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """``gzip, br;q=0.8`` -> {"gzip": 1.0, "br": 0.8}"""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(header: str, encodings: List[str]) -> Optional[str]:
+    """Encoding with the client's highest q-value; ties go to server order."""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies.
+
+    Install it outside everything that adds headers or rewrites the body.
+    """
+
+    def __init__(self, app, minimum_size: int = None, encodings: List[str] = None):
+        self.app = app
+        self.minimum_size = settings.compression_min_size if minimum_size is None else minimum_size
+        self.encodings = available_encodings(encodings or settings.compression_encodings)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None  # decided on the first body chunk; False passes through
+        original = compressed = 0
+        seconds = 0.0
+
+        def compress(data: bytes, final: bool) -> bytes:
+            nonlocal original, compressed, seconds
+            start = time.perf_counter()
+            out = compressor.compress(data, final)
+            seconds += time.perf_counter() - start
+            original += len(data)
+            compressed += len(out)
+            if final:
+                route = route_label(scope)
+                http_compression_seconds.labels(route=route, encoding=encoding).observe(seconds)
+                http_compression_bytes_total.labels(route=route, encoding=encoding, kind="original").inc(original)
+                http_compression_bytes_total.labels(route=route, encoding=encoding, kind="compressed").inc(compressed)
+            return out
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if compressor is False:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start_message)
+                if (not is_compressible(start_message["status"], headers)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    compressor = False
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = COMPRESSORS[encoding]()
+                body = compress(body, final=not more_body)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                # The encoded bytes differ from the identity representation
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                await send(start_message)
+            else:
+                body = compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,24 +1,393 @@
-from sqlalchemy import create_engine
+import hashlib
+import hmac
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
 from .config import settings
+from .metrics import (
+    db_pool_checkout_wait_seconds, db_pool_timeouts_total,
+    db_pool_connections_in_use, db_pool_overflow, db_query_duration_seconds, request_stats
+)
+
+logger = logging.getLogger(__name__)
+
+# asyncio drivers used in place of each backend's default sync driver
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+class CheckoutTimingMixin:
+    """Pool mixin that records how long each checkout waits for a connection."""
+
+    metrics_name = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            db_pool_timeouts_total.labels(pool=self.metrics_name).inc()
+            raise
+        finally:
+            db_pool_checkout_wait_seconds.labels(pool=self.metrics_name).observe(
+                time.perf_counter() - start
+            )
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class InstrumentedQueuePool(CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver in ``url`` for its asyncio counterpart."""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Connection pool arguments for ``create_engine`` built from Settings."""
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite picks its own pool class per database type
+        return {"pool_pre_ping": settings.db_pool_pre_ping}
+    if settings.db_pgbouncer_mode:
+        # PgBouncer owns pooling and can't keep prepared statements across
+        # transactions; psycopg2 never prepares, asyncpg has to be told not to
+        options = {"poolclass": NullPool}
+        if is_async:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+            }
+        return options
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Export pool gauges and statement timings for ``engine``.
+
+    Statement counts and time are also added to the current request's stats.
+    """
+    if isinstance(engine.pool, CheckoutTimingMixin):
+        engine.pool.metrics_name = name
+    in_use = db_pool_connections_in_use.labels(pool=name)
+    overflow = db_pool_overflow.labels(pool=name)
+
+    def update_overflow():
+        if isinstance(engine.pool, QueuePool):
+            overflow.set(max(0, engine.pool.overflow()))
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        in_use.inc()
+        update_overflow()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        in_use.dec()
+        update_overflow()
+
+    query_duration = db_query_duration_seconds.labels(pool=name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        query_duration.observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+            if stats.statements is not None:
+                stats.statements.append((statement, elapsed))
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(exception_context):
+        started = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+class ReplicaRouter:
+    """Chooses between the primary and an optional read replica.
+
+    Principals that wrote recently stay on the primary so they read their own
+    writes, and a replica that fails to connect is skipped for a while. Writes
+    are remembered per process and, through ``ReadYourWritesMiddleware``, by
+    the client, so a read served by another worker process honours them too.
+    """
+
+    def __init__(self, primary: Engine, replica: Optional[Engine] = None):
+        self.primary = primary
+        self.replica = replica
+        self._last_write: Dict[str, float] = {}
+        self._replica_down_until = 0.0
+
+    def mark_write(self, principal: Optional[str]) -> None:
+        if not principal:
+            return
+        now = time.monotonic()
+        if len(self._last_write) > 10000:
+            self._last_write = {
+                key: wrote_at for key, wrote_at in self._last_write.items()
+                if now - wrote_at < settings.replica_sticky_seconds
+            }
+        self._last_write[principal] = now
+
+    def is_sticky(self, principal: Optional[str], client_wrote_at: Optional[float] = None) -> bool:
+        """Whether reads must stay on the primary: ``principal`` wrote through
+        this process, or the client wrote (``client_wrote_at``, wall clock),
+        within the read-your-writes window."""
+        if client_wrote_at is not None and time.time() - client_wrote_at < settings.replica_sticky_seconds:
+            return True
+        last_write = self._last_write.get(principal) if principal else None
+        if last_write is None:
+            return False
+        if time.monotonic() - last_write < settings.replica_sticky_seconds:
+            return True
+        self._last_write.pop(principal, None)
+        return False
+
+    def read_bind(self, principal: Optional[str], client_wrote_at: Optional[float] = None) -> Engine:
+        """Engine for a read-only session acting for ``principal``."""
+        if self.replica is None or self.is_sticky(principal, client_wrote_at):
+            return self.primary
+        if time.monotonic() < self._replica_down_until:
+            return self.primary
+        return self.replica
+
+    def replica_failed(self) -> None:
+        """Skip the replica for a while after a checkout from it failed."""
+        logger.warning("Read replica unavailable, reading from primary", exc_info=True)
+        self._replica_down_until = time.monotonic() + settings.replica_retry_seconds
+
+
+# Failures to check out a connection: driver errors (including pre-ping),
+# raw socket and DNS errors from asyncpg's connect, and pool exhaustion
+CHECKOUT_ERRORS = (DBAPIError, OSError, PoolTimeoutError)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica when ``info["read_only"]`` is set.
+
+    ``info["request_state"]`` is the request's ``state``; its ``principal``
+    (set by authentication) keys the read-your-writes window, and its
+    ``last_write`` is when the client last wrote, if it told us.
+    """
+
+    router: ReplicaRouter
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("read_only") and not self._flushing:
+            if "read_bind" not in self.info:
+                state = self.info.get("request_state")
+                self.info["read_bind"] = self.router.read_bind(
+                    request_principal(self), getattr(state, "last_write", None)
+                )
+            return self.info["read_bind"]
+        return self.router.primary
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        try:
+            return super()._connection_for_bind(engine, execution_options, **kw)
+        except CHECKOUT_ERRORS:
+            if engine is not self.router.replica:
+                raise
+            # The pool pre-pings at checkout, so a dead replica fails here,
+            # before any statement ran; the transaction carries on against
+            # the primary
+            self.router.replica_failed()
+        self.info["read_bind"] = self.router.primary
+        return super()._connection_for_bind(self.router.primary, execution_options, **kw)
+
+
+class AsyncRoutingSession(RoutingSession):
+    """Sync half of an AsyncSession; routes between the async engines."""
+
+
+def request_principal(session: Session) -> Optional[str]:
+    return getattr(session.info.get("request_state"), "principal", None)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def remember_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def remember_bulk_write(orm_execute_state):
+    # INSERT/UPDATE/DELETE statements run through the session skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def start_sticky_window(session):
+    if session.info.pop("wrote", False):
+        session.router.mark_write(request_principal(session))
+        state = session.info.get("request_state")
+        if state is not None:
+            state.last_write = state.wrote_at = time.time()
+
+
+# Cookie carrying the time of the client's last write, signed so it can only
+# have been set by us
+WRITE_COOKIE = "last_write"
+
+
+def _write_signature(wrote_at: str) -> str:
+    return hmac.new(settings.secret_key.encode(), f"{WRITE_COOKIE}:{wrote_at}".encode(), hashlib.sha256).hexdigest()
+
+
+def sign_write_marker(wrote_at: float) -> str:
+    value = f"{wrote_at:.3f}"
+    return f"{value}.{_write_signature(value)}"
+
+
+def read_write_marker(cookie: Optional[str]) -> Optional[float]:
+    """The write time in a cookie from ``sign_write_marker``, or None if it is
+    missing or was not signed by us."""
+    value, _, signature = (cookie or "").rpartition(".")
+    if not value or not hmac.compare_digest(signature.encode(), _write_signature(value).encode()):
+        return None
+    return float(value)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware keeping a client's reads on the primary after it wrote,
+    whichever worker process serves them.
+
+    A response to a request that committed a write sets WRITE_COOKIE, lasting
+    the read-your-writes window; requests carrying it have its time as
+    ``request.state.last_write``, which read-only sessions route by.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.database_replica_url:
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+        wrote_at = read_write_marker(HTTPConnection(scope).cookies.get(WRITE_COOKIE))
+        if wrote_at is not None:
+            state["last_write"] = wrote_at
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and "wrote_at" in state:
+                MutableHeaders(scope=message).append("set-cookie", (
+                    f"{WRITE_COOKIE}={sign_write_marker(state['wrote_at'])}; "
+                    f"Max-Age={math.ceil(settings.replica_sticky_seconds)}; Path=/; HttpOnly; SameSite=lax"
+                ))
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
+
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
+instrument_engine(engine, "primary")
+replica_engine = None
+if settings.database_replica_url:
+    replica_engine = create_engine(
+        settings.database_replica_url, **engine_options(settings.database_replica_url)
+    )
+    instrument_engine(replica_engine, "replica")
+RoutingSession.router = ReplicaRouter(engine, replica_engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+# Parallel asyncio stack; routers move over to it one endpoint at a time
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    **engine_options(settings.database_url, is_async=True)
+)
+instrument_engine(async_engine.sync_engine, "primary_async")
+async_replica_engine = None
+if settings.database_replica_url:
+    async_replica_engine = create_async_engine(
+        async_database_url(settings.database_replica_url),
+        **engine_options(settings.database_replica_url, is_async=True)
+    )
+    instrument_engine(async_replica_engine.sync_engine, "replica_async")
+AsyncRoutingSession.router = ReplicaRouter(
+    async_engine.sync_engine,
+    async_replica_engine.sync_engine if async_replica_engine else None
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, sync_session_class=AsyncRoutingSession,
+    autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
 
 # Import models so they are registered with Base.metadata
 from .auth.models import User, PasswordResetToken  # noqa
-from .chat.models import ChatSession, ChatMessage  # noqa
+from .chat.models import ChatSession, ChatMessage, LLMUsage  # noqa
+from .health.models import ReminderRun, HealthReading, HealthRollup, HealthAnomaly, HealthImport  # noqa
+from .tasks.models import Task  # noqa
+from .idempotency import IdempotencyKey  # noqa
 
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = SessionLocal(info={"request_state": request.state})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency to get a DB session for read-only endpoints (may use the replica)
+def get_read_db(request: Request):
+    db = SessionLocal(info={"request_state": request.state, "read_only": True})
     try:
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async DB session
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal(info={"request_state": request.state}) as db:
+        yield db
+
+
+# Dependency to get an async DB session for read-only endpoints
+async def get_async_read_db(request: Request):
+    async with AsyncSessionLocal(info={"request_state": request.state, "read_only": True}) as db:
+        yield db
@@ -0,0 +1,257 @@
+"""Anomaly detection over users' recent readings, many users at a time.
+
+Readings are binned onto a per-minute grid (the mean of each minute) and the
+users of a batch are stacked into one (users x minutes) matrix, so every
+detector is a handful of NumPy passes over the whole batch:
+
+* ``zscore``: distance from the mean of the trailing window, in standard
+  deviations of that window (cumulative sums, O(1) per point).
+* ``ewma``: distance from an exponentially weighted mean, in exponentially
+  weighted standard deviations. The recursion is evaluated in blocks with a
+  closed form, so the Python loop runs once per block, not per minute.
+* ``changepoint``: shift between the means of the windows before and after
+  each minute, in pooled standard deviations (an effect size, so slow
+  drifts such as the daily heart-rate cycle stay below the threshold).
+
+Flags closer together than a merge gap are reported once, at the strongest
+point. A scan loads the minutes from ``since`` plus the context the
+detectors look back over (``context_minutes``), only flags at or after
+``since`` are stored, and (user, metric, ts, detector) is unique, so
+overlapping scans do not duplicate anomalies.
+"""
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from .ingest import METRICS
+from .models import HealthAnomaly, HealthReading
+
+STEP = 60  # grid resolution in seconds
+EWMA_BLOCK = 128  # r ** -EWMA_BLOCK must stay well inside float64 range
+MERGE_GAP = 30  # minutes; closer outliers are reported as one anomaly
+
+
+@dataclass
+class Flags:
+    """Anomalies found in a (users x minutes) matrix."""
+
+    row: np.ndarray
+    col: np.ndarray
+    detector: List[str]
+    value: np.ndarray
+    score: np.ndarray
+
+
+def _cumsum(x: np.ndarray) -> np.ndarray:
+    """Row-wise cumulative sums with a leading zero column: c[:, t] = sum(x[:, :t])."""
+    out = np.zeros((x.shape[0], x.shape[1] + 1))
+    np.cumsum(x, axis=1, out=out[:, 1:])
+    return out
+
+
+def _trailing(cum: np.ndarray, window: int) -> np.ndarray:
+    """Sums over the ``window`` columns before each column (fewer at the start)."""
+    out = cum[:, :-1].copy()
+    out[:, window:] -= cum[:, :-window - 1]
+    return out
+
+
+def rolling_zscore(x: np.ndarray, window: int, min_count: int) -> np.ndarray:
+    """Z-score of each minute against its trailing window (the minute itself
+    excluded); NaN where undefined."""
+    valid = ~np.isnan(x)
+    filled = np.where(valid, x, 0.0)
+    n = _trailing(_cumsum(valid), window)
+    mean = _trailing(_cumsum(filled), window)
+    square = _trailing(_cumsum(filled * filled), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean /= n
+        square /= n
+        square -= mean * mean
+        std = np.sqrt(np.maximum(square, 0.0, out=square), out=square)
+        z = (x - mean) / std
+    z[(n < min_count) | (std < 1e-6)] = np.nan
+    return z
+
+
+def fill_forward(x: np.ndarray) -> np.ndarray:
+    """Carry the last reading over missing minutes; leading gaps take the first reading."""
+    valid = ~np.isnan(x)
+    index = np.where(valid, np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = x[np.arange(x.shape[0])[:, None], index]
+    first = np.argmax(valid, axis=1)
+    leading = np.arange(x.shape[1]) < first[:, None]
+    filled[leading] = np.broadcast_to(x[np.arange(x.shape[0]), first][:, None], x.shape)[leading]
+    return filled
+
+
+def ewma(x: np.ndarray, alpha: float) -> np.ndarray:
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], with y[-1] = x[0], along rows."""
+    r = 1.0 - alpha
+    powers = r ** np.arange(EWMA_BLOCK)
+    out = np.empty_like(x)
+    previous = x[:, 0].copy()
+    for start in range(0, x.shape[1], EWMA_BLOCK):
+        block = x[:, start:start + EWMA_BLOCK]
+        p = powers[:block.shape[1]]
+        # y[b + j] = r^(j+1) y[b-1] + alpha r^j sum_{i<=j} r^-i x[b+i]
+        out[:, start:start + block.shape[1]] = (
+            alpha * p * np.cumsum(block / p, axis=1) + r * p * previous[:, None]
+        )
+        previous = out[:, start + block.shape[1] - 1]
+    return out
+
+
+def ewma_score(filled: np.ndarray, alpha: float, warmup: int) -> np.ndarray:
+    """Deviation of each minute from the EWMA up to the minute before, in EW
+    standard deviations."""
+    mean = ewma(filled, alpha)
+    variance = np.maximum(ewma(filled * filled, alpha) - mean * mean, 0.0)
+    score = np.full(filled.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score[:, 1:] = (filled[:, 1:] - mean[:, :-1]) / np.sqrt(variance[:, :-1])
+    score[:, :warmup] = np.nan
+    score[~np.isfinite(score)] = np.nan
+    return score
+
+
+def changepoint_score(filled: np.ndarray, window: int) -> np.ndarray:
+    """Shift between the means of the ``window`` minutes before and from each
+    minute, in pooled standard deviations; NaN within ``window`` of either end."""
+    score = np.full(filled.shape, np.nan)
+    width = filled.shape[1] - 2 * window + 1
+    if width <= 0:
+        return score
+    cum_s, cum_q = _cumsum(filled), _cumsum(filled * filled)
+    # Sums over [t - window, t) and [t, t + window) for t = window .. T - window
+    before_s = cum_s[:, window:window + width] - cum_s[:, :width]
+    after_s = cum_s[:, 2 * window:] - cum_s[:, window:window + width]
+    before_q = cum_q[:, window:window + width] - cum_q[:, :width]
+    after_q = cum_q[:, 2 * window:] - cum_q[:, window:window + width]
+    pooled = (before_q + after_q - (before_s * before_s + after_s * after_s) / window) / (2 * window - 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score[:, window:window + width] = (after_s - before_s) / window / np.sqrt(np.maximum(pooled, 1e-12))
+    return score
+
+
+def run_peaks(score: np.ndarray, threshold: float, gap: int):
+    """(row, col) of the strongest minute in each run of |score| > threshold;
+    flagged minutes less than ``gap`` apart belong to the same run."""
+    flat = np.flatnonzero(np.abs(np.nan_to_num(score)) > threshold)
+    if not len(flat):
+        return flat, flat
+    row, col = np.divmod(flat, score.shape[1])
+    new_run = np.r_[True, (row[1:] != row[:-1]) | (col[1:] - col[:-1] >= gap)]
+    run = np.cumsum(new_run)
+    order = np.lexsort((-np.abs(score.ravel()[flat]), run))
+    first = np.r_[True, run[order][1:] != run[order][:-1]]
+    return row[order[first]], col[order[first]]
+
+
+def detect(x: np.ndarray) -> Flags:
+    """Run every detector over a (users x minutes) matrix with NaN gaps."""
+    filled = fill_forward(x)
+    zscore = rolling_zscore(x, settings.anomaly_zscore_window, settings.anomaly_zscore_min_count)
+    ewma_scores = ewma_score(filled, settings.anomaly_ewma_alpha, settings.anomaly_ewma_warmup)
+    # Gap minutes only carry a filled-in value; never flag them as outliers
+    ewma_scores[np.isnan(x)] = np.nan
+    detectors = {
+        "zscore": (zscore, settings.anomaly_zscore_threshold, MERGE_GAP),
+        "ewma": (ewma_scores, settings.anomaly_ewma_threshold, MERGE_GAP),
+        "changepoint": (changepoint_score(filled, settings.anomaly_changepoint_window),
+                        settings.anomaly_changepoint_threshold, settings.anomaly_changepoint_window),
+    }
+    rows, cols, names, scores = [], [], [], []
+    for name, (score, threshold, gap) in detectors.items():
+        row, col = run_peaks(score, threshold, gap)
+        rows.append(row)
+        cols.append(col)
+        names += [name] * len(row)
+        scores.append(score[row, col])
+    row, col = np.concatenate(rows), np.concatenate(cols)
+    return Flags(row=row, col=col, detector=names, value=filled[row, col], score=np.concatenate(scores))
+
+
+def load_grid(db: Session, user_ids: List[int], code: int, start: float, minutes: int) -> np.ndarray:
+    """Per-minute means of one metric for ``user_ids`` from ``start``, NaN
+    where a minute has no readings. Rows are streamed so only the grid is
+    held in memory."""
+    position = {user_id: i for i, user_id in enumerate(user_ids)}
+    sums = np.zeros(len(user_ids) * minutes)
+    counts = np.zeros(len(user_ids) * minutes)
+    result = db.execute(
+        select(HealthReading.user_id, HealthReading.ts, HealthReading.value)
+        .where(
+            HealthReading.user_id.in_(user_ids),
+            HealthReading.metric == code,
+            HealthReading.ts >= datetime.fromtimestamp(start, timezone.utc),
+            HealthReading.ts < datetime.fromtimestamp(start + minutes * STEP, timezone.utc),
+        )
+        .execution_options(yield_per=50_000)
+    )
+    for chunk in result.partitions():
+        users, ts, values = zip(*chunk)
+        # SQLite hands back naive datetimes, which are UTC here
+        epochs = np.array([
+            (d if d.tzinfo else d.replace(tzinfo=timezone.utc)).timestamp() for d in ts
+        ])
+        cells = (np.array([position[u] for u in users]) * minutes
+                 + ((epochs - start) // STEP).astype(np.int64))
+        np.add.at(sums, cells, values)
+        np.add.at(counts, cells, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).reshape(len(user_ids), minutes)
+
+
+def store_flags(db: Session, user_ids: List[int], code: int, start: float, flags: Flags,
+                since: float) -> int:
+    """Insert flags at or after ``since``; returns how many were new."""
+    rows = [
+        {
+            "user_id": user_ids[row], "metric": code,
+            "ts": datetime.fromtimestamp(start + col * STEP, timezone.utc),
+            "detector": detector, "value": value, "score": score,
+        }
+        for row, col, detector, value, score in zip(
+            flags.row.tolist(), flags.col.tolist(), flags.detector, flags.value.tolist(), flags.score.tolist()
+        )
+        if start + col * STEP >= since
+    ]
+    if not rows:
+        return 0
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(HealthAnomaly).on_conflict_do_nothing().returning(HealthAnomaly.id)
+    return len(db.execute(stmt, rows).all())
+
+
+def context_minutes() -> int:
+    """Minutes of readings the detectors need before a minute to score it:
+    the longest trailing window or warmup, plus a merge gap so a run that
+    starts earlier is still reported at its strongest point."""
+    return max(settings.anomaly_zscore_window, settings.anomaly_ewma_warmup,
+               settings.anomaly_changepoint_window) + MERGE_GAP
+
+
+def scan_users(db: Session, user_ids: List[int], end: float, since: float) -> Dict[str, int]:
+    """Detect anomalies between ``since`` and ``end`` for a batch of users;
+    returns new anomalies stored per metric.
+
+    Only the readings the detectors need for that span are loaded, so the
+    cost of an hourly scan does not grow with a user's history."""
+    start = (since // STEP) * STEP - context_minutes() * STEP
+    minutes = int(math.ceil((end - start) / STEP))
+    stored = {}
+    for name in settings.anomaly_metrics:
+        code = METRICS[name].code
+        grid = load_grid(db, user_ids, code, start, minutes)
+        stored[name] = store_flags(db, user_ids, code, start, detect(grid), since)
+    db.commit()
+    return stored
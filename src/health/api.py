@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database import get_async_db
+from ..profiling import ProfiledRoute
+from ..auth.dependencies import get_current_active_user
+from ..auth.models import User
+from .async_crud import get_recent_anomalies, create_health_import, get_health_import
+from .crud import describe_anomaly
+from .models import HealthImport
+from .schemas import (
+    ReadingsBatch, IngestResponse, MetricInfo, SeriesResponse, AnomalyResponse, HealthImportResponse
+)
+
+router = APIRouter(prefix="/health", tags=["health"], route_class=ProfiledRoute)
+
+
+@router.post("/readings", response_model=IngestResponse)
+async def ingest_health_readings(
+    batch: ReadingsBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Store a batch of readings. Readings already stored are ignored, so a
+    batch can safely be re-sent."""
+    # NumPy is only loaded once the first batch arrives
+    from .ingest import ingest_readings
+
+    try:
+        result, window = await ingest_readings(db, current_user.id, batch, now=time.time())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+
+    if window:
+        from ..jobs import process_health_data_task
+
+        # Publishing to the broker is blocking I/O
+        await run_in_threadpool(process_health_data_task.delay, current_user.id, window)
+    return result
+
+
+@router.get("/metrics", response_model=List[MetricInfo])
+def list_metrics():
+    """Metrics the ingestion API accepts, with units and valid ranges."""
+    from .ingest import METRICS
+
+    return [
+        MetricInfo(name=name, unit=metric.unit, min_value=metric.min_value, max_value=metric.max_value)
+        for name, metric in METRICS.items()
+    ]
+
+
+@router.get("/series", response_model=SeriesResponse)
+async def get_health_series(
+    metric: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    step: Optional[int] = Query(None, ge=60),
+    points: int = Query(500, ge=1, le=settings.health_series_max_points),
+    percentiles: List[float] = Query([50, 90]),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Summaries of a metric per ``step`` seconds between two Unix times
+    (default: the last 7 days). Without ``step``, one is picked that gives at
+    most ``points`` points. Served from daily or hourly rollups when the step
+    is a whole number of days or hours, else from the raw readings."""
+    from .ingest import METRICS
+    from .rollups import default_step, pick_resolution, series_query, summarize_series
+
+    if metric not in METRICS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown metric"
+        )
+    end = time.time() if end is None else end
+    start = end - 7 * 86400 if start is None else start
+    if start >= end or any(not 0 <= q <= 100 for q in percentiles):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="start must be before end and percentiles within 0-100"
+        )
+    step = step or default_step(start, end, points)
+    if (end - start) / step > settings.health_series_max_points:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.health_series_max_points} points per request; use a longer step"
+        )
+    if not pick_resolution(step) and end - start > settings.health_series_max_raw_span:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Ranges this long need a step of whole hours"
+        )
+
+    rows = (await db.execute(series_query(current_user.id, metric, start, end, step))).all()
+    # Percentiles and sketch merges are CPU work; keep them off the event loop
+    return await run_in_threadpool(summarize_series, rows, metric, start, end, step, percentiles)
+
+
+@router.get("/anomalies", response_model=List[AnomalyResponse])
+async def list_health_anomalies(
+    since: Optional[float] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Readings flagged as unusual since a Unix time (default: the last 7
+    days), newest first."""
+    from .ingest import METRIC_NAMES
+
+    since = time.time() - 7 * 86400 if since is None else since
+    anomalies = await get_recent_anomalies(
+        db, current_user.id, datetime.fromtimestamp(since, timezone.utc), limit
+    )
+    return [
+        AnomalyResponse(
+            metric=METRIC_NAMES[a.metric],
+            ts=(a.ts if a.ts.tzinfo else a.ts.replace(tzinfo=timezone.utc)).timestamp(),
+            detector=a.detector,
+            value=a.value,
+            score=a.score,
+            description=describe_anomaly(a),
+        )
+        for a in anomalies
+    ]
+
+
+def _import_response(health_import: HealthImport) -> HealthImportResponse:
+    progress = 0.0
+    if health_import.total_bytes:
+        progress = min(1.0, health_import.bytes_read / health_import.total_bytes)
+    if health_import.status == "completed":
+        progress = 1.0
+    return HealthImportResponse(
+        id=health_import.id,
+        filename=health_import.filename,
+        size=health_import.size,
+        format=health_import.format,
+        status=health_import.status,
+        progress=round(progress, 4),
+        records=health_import.records,
+        accepted=health_import.accepted,
+        duplicates=health_import.duplicates,
+        rejected=health_import.rejected,
+        skipped=health_import.skipped,
+        error=health_import.error,
+        created_at=health_import.created_at,
+        completed_at=health_import.completed_at,
+    )
+
+
+async def _save_upload(request: Request, path: str) -> int:
+    """Write the request body to ``path`` chunk by chunk; returns its size."""
+    size = 0
+    async with await anyio.open_file(path, "wb") as f:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.health_import_max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Files are limited to {settings.health_import_max_bytes} bytes"
+                )
+            await f.write(chunk)
+    return size
+
+
+@router.post("/imports", response_model=HealthImportResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_health_import(
+    request: Request,
+    filename: str = Query("export", max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Upload an export file (CSV, Apple Health export.xml, or a .zip holding
+    either) as the raw request body. The file is imported in the background;
+    poll GET /health/imports/{id} for progress."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.health_import_max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Files are limited to {settings.health_import_max_bytes} bytes"
+        )
+
+    os.makedirs(settings.health_import_dir, exist_ok=True)
+    path = os.path.join(settings.health_import_dir, f"{uuid.uuid4().hex}.upload")
+    try:
+        size = await _save_upload(request, path)
+        if not size:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="The request body is empty"
+            )
+    except BaseException:
+        os.remove(path)
+        raise
+
+    health_import = await create_health_import(db, current_user.id, filename, path, size)
+    from ..jobs import import_health_file_task
+
+    await run_in_threadpool(import_health_file_task.delay, health_import.id)
+    return _import_response(health_import)
+
+
+@router.get("/imports/{import_id}", response_model=HealthImportResponse)
+async def get_health_import_status(
+    import_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Status and progress of an import."""
+    health_import = await get_health_import(db, import_id, current_user.id)
+    if not health_import:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import not found"
+        )
+    return _import_response(health_import)
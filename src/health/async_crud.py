@@ -0,0 +1,36 @@
+"""AsyncSession counterparts of the functions in ``crud.py``."""
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import HealthAnomaly, HealthImport
+
+
+async def get_recent_anomalies(db: AsyncSession, user_id: int, since: datetime,
+                               limit: int = 50) -> List[HealthAnomaly]:
+    """A user's anomalies since ``since``, newest first."""
+    result = await db.execute(
+        select(HealthAnomaly)
+        .where(HealthAnomaly.user_id == user_id, HealthAnomaly.ts >= since)
+        .order_by(HealthAnomaly.ts.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def create_health_import(db: AsyncSession, user_id: int, filename: str, path: str,
+                               size: int) -> HealthImport:
+    health_import = HealthImport(user_id=user_id, filename=filename, path=path, size=size, status="pending",
+                                 records=0, bytes_read=0, accepted=0, duplicates=0, rejected=0, skipped=0)
+    db.add(health_import)
+    await db.commit()
+    await db.refresh(health_import)
+    return health_import
+
+
+async def get_health_import(db: AsyncSession, import_id: int, user_id: int) -> Optional[HealthImport]:
+    result = await db.execute(
+        select(HealthImport).where(HealthImport.id == import_id, HealthImport.user_id == user_id)
+    )
+    return result.scalars().first()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import HealthAnomaly, HealthRollup
+
+DETECTOR_LABELS = {
+    "zscore": "unusual reading",
+    "ewma": "departure from recent trend",
+    "changepoint": "sustained shift",
+}
+
+
+def describe_anomaly(anomaly: HealthAnomaly) -> str:
+    """One line for a person (or the chat agent) to read."""
+    from .ingest import METRIC_NAMES, METRICS
+
+    name = METRIC_NAMES[anomaly.metric]
+    direction = "high" if anomaly.score > 0 else "low"
+    return (
+        f"{name.replace('_', ' ')} {anomaly.value:g} {METRICS[name].unit} ({direction}, "
+        f"{DETECTOR_LABELS[anomaly.detector]}) at {anomaly.ts:%Y-%m-%d %H:%M} UTC"
+    )
+
+
+def get_recent_anomalies_by_user(db: Session, user_ids: List[int], since: datetime,
+                                 limit: int = 3) -> Dict[int, List[HealthAnomaly]]:
+    """The latest ``limit`` anomalies since ``since`` for each of ``user_ids``."""
+    anomalies = db.execute(
+        select(HealthAnomaly)
+        .where(HealthAnomaly.user_id.in_(user_ids), HealthAnomaly.ts >= since)
+        .order_by(HealthAnomaly.user_id, HealthAnomaly.ts.desc())
+    ).scalars().all()
+    by_user: Dict[int, List[HealthAnomaly]] = {}
+    for anomaly in anomalies:
+        found = by_user.setdefault(anomaly.user_id, [])
+        if len(found) < limit:
+            found.append(anomaly)
+    return by_user
+
+
+def get_active_user_ids(db: Session, since: datetime) -> List[int]:
+    """Users with readings in any hour from ``since`` on, per the hourly rollups."""
+    return db.execute(
+        select(HealthRollup.user_id)
+        .where(HealthRollup.resolution == 3600, HealthRollup.bucket >= since)  # hourly rollups
+        .distinct()
+        .order_by(HealthRollup.user_id)
+    ).scalars().all()
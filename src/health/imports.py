@@ -0,0 +1,237 @@
+"""Streaming import of export files from other apps.
+
+Supported files, optionally inside a .zip (as Apple Health exports come):
+
+* CSV with a header row naming ``metric``, ``ts`` and ``value`` columns;
+  ``ts`` is Unix seconds or ISO 8601 (UTC unless an offset is given).
+* Apple Health ``export.xml``: quantity ``Record`` elements of the types in
+  APPLE_HEALTH_TYPES, converted to this app's units.
+
+The file is read as a stream (``csv.reader`` / ``iterparse``, clearing every
+element once handled) and readings are inserted HEALTH_IMPORT_BATCH_SIZE at a
+time, so memory does not grow with the file. Each batch commits together with
+the import's checkpoint (records consumed so far) and its rollups; a run that
+dies is resumed by skipping the checkpointed records, and inserts ignore
+readings already stored, so nothing is lost or counted twice.
+"""
+import csv
+import io
+import itertools
+import os
+import re
+import zipfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from xml.etree import ElementTree
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from .ingest import insert_readings_sync, touched_hours, validate_readings
+from .models import HealthImport
+from .rollups import update_rollups
+
+# Apple Health record type -> (metric, unit -> factor to this app's unit)
+APPLE_HEALTH_TYPES: Dict[str, Tuple[str, Dict[str, float]]] = {
+    "HKQuantityTypeIdentifierHeartRate": ("heart_rate", {"count/min": 1.0}),
+    "HKQuantityTypeIdentifierStepCount": ("steps", {"count": 1.0}),
+    "HKQuantityTypeIdentifierBloodGlucose": ("glucose", {"mmol/L": 1.0, "mg/dL": 1 / 18.0156}),
+    "HKQuantityTypeIdentifierOxygenSaturation": ("spo2", {"%": 100.0}),  # stored as a fraction
+    "HKQuantityTypeIdentifierBloodPressureSystolic": ("systolic_bp", {"mmHg": 1.0}),
+    "HKQuantityTypeIdentifierBloodPressureDiastolic": ("diastolic_bp", {"mmHg": 1.0}),
+    "HKQuantityTypeIdentifierBodyMass": ("weight", {"kg": 1.0, "lb": 0.45359237}),
+}
+# Apple writes molar units with the molar mass, e.g. 'mmol<180.15588000005408>/L'
+MOLAR_MASS = re.compile(r"<[^>]*>")
+
+# A reading, or None for a record of a type that is not imported
+Record = Optional[Tuple[str, float, float]]
+
+INVALID = ("", float("nan"), float("nan"))  # rejected by validate_readings
+
+
+class UnsupportedFile(ValueError):
+    """The file cannot be imported at all."""
+
+
+class CountingReader(io.RawIOBase):
+    """Wraps a binary stream and counts the bytes read through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.count += len(data)
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_source(path: str) -> Tuple[io.BufferedReader, int, str]:
+    """The file to parse (the export inside a zip, else the upload itself)
+    as a counted stream, its uncompressed size and its format."""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        members = [m for m in archive.infolist() if m.filename.lower().endswith((".xml", ".csv"))]
+        # Apple Health exports also hold export_cda.xml, which is not what we want
+        members.sort(key=lambda m: (not m.filename.endswith("/export.xml") and m.filename != "export.xml",
+                                    m.filename))
+        if not members:
+            raise UnsupportedFile("The zip archive contains no .xml or .csv file")
+        raw, size = archive.open(members[0]), members[0].file_size
+    else:
+        raw, size = open(path, "rb"), os.path.getsize(path)
+    stream = io.BufferedReader(CountingReader(raw), buffer_size=1 << 16)
+    head = stream.peek(64)[:64].lstrip(b"\xef\xbb\xbf \t\r\n")
+    return stream, size, "apple_health" if head.startswith(b"<") else "csv"
+
+
+def _timestamp(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        parsed = datetime.fromisoformat(text.strip())
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def parse_csv(stream) -> Iterator[Record]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = [name.strip().lower() for name in next(reader, [])]
+    try:
+        columns = [header.index(name) for name in ("metric", "ts", "value")]
+    except ValueError:
+        raise UnsupportedFile("CSV header must name metric, ts and value columns")
+    for row in reader:
+        try:
+            yield row[columns[0]].strip(), _timestamp(row[columns[1]]), float(row[columns[2]])
+        except (IndexError, ValueError):
+            yield INVALID
+
+
+def parse_apple_health(stream) -> Iterator[Record]:
+    events = ElementTree.iterparse(stream, events=("start", "end"))
+    _, root = next(events)
+    depth = 0
+    for event, element in events:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth:
+            continue
+        # A direct child of the root is complete: handle it, then drop it
+        if element.tag == "Record":
+            yield _apple_record(element.attrib)
+        root.clear()
+
+
+def _apple_timestamp(text: str) -> float:
+    # '2024-03-01 08:00:00 +0100'; dropping the space lets fromisoformat
+    # parse it, about ten times faster than strptime
+    return datetime.fromisoformat(text[:19] + text[20:]).timestamp()
+
+
+def _apple_record(attrib: dict) -> Record:
+    known = APPLE_HEALTH_TYPES.get(attrib.get("type"))
+    if known is None:
+        return None
+    metric, units = known
+    factor = units.get(MOLAR_MASS.sub("", attrib.get("unit", "")))
+    if factor is None:
+        return INVALID
+    try:
+        return metric, _apple_timestamp(attrib["startDate"]), float(attrib["value"]) * factor
+    except (KeyError, ValueError):
+        return INVALID
+
+
+PARSERS: Dict[str, Callable[[io.BufferedReader], Iterator[Record]]] = {
+    "csv": parse_csv,
+    "apple_health": parse_apple_health,
+}
+
+
+def _store_batch(db: Session, health_import: HealthImport, batch: list, now: float) -> None:
+    """Insert one batch and advance the checkpoint in the same transaction."""
+    readings = [record for record in batch if record is not None]
+    valid = validate_readings(
+        [r[0] for r in readings], [r[1] for r in readings], [r[2] for r in readings], now
+    )
+    inserted = insert_readings_sync(db, health_import.user_id, valid)
+    health_import.records += len(batch)
+    health_import.accepted += inserted
+    health_import.duplicates += valid.duplicates + len(valid.ts) - inserted
+    health_import.rejected += len(valid.rejected)
+    health_import.skipped += len(batch) - len(readings)
+    if inserted:
+        # Commits the readings, the checkpoint and the rollups together
+        update_rollups(db, health_import.user_id, touched_hours(valid))
+    else:
+        db.commit()
+
+
+def run_import(db: Session, import_id: int, now: float) -> HealthImport:
+    """Import (or resume importing) a file up to the end."""
+    health_import = db.get(HealthImport, import_id)
+    if health_import is None or health_import.status in ("completed", "failed"):
+        return health_import
+
+    try:
+        stream, total_bytes, file_format = open_source(health_import.path)
+    except (OSError, zipfile.BadZipFile, UnsupportedFile) as e:
+        return _finish(db, health_import, "failed", str(e))
+    health_import.status = "processing"
+    health_import.format = file_format
+    health_import.total_bytes = total_bytes
+    db.commit()
+
+    counter = stream.raw
+    try:
+        with stream:
+            records = PARSERS[file_format](stream)
+            # Resume: everything before the checkpoint is already stored
+            for _ in itertools.islice(records, health_import.records):
+                pass
+            while True:
+                batch = list(itertools.islice(records, settings.health_import_batch_size))
+                if not batch:
+                    break
+                health_import.bytes_read = counter.count
+                _store_batch(db, health_import, batch, now)
+    except (UnsupportedFile, ElementTree.ParseError, csv.Error, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        db.rollback()
+        return _finish(db, health_import, "failed", f"{e} (after {health_import.records} records)")
+    health_import.bytes_read = total_bytes
+    return _finish(db, health_import, "completed")
+
+
+def fail_import(db: Session, import_id: int, error: str) -> Optional[HealthImport]:
+    """Mark an import failed after an error ``run_import`` did not handle;
+    the session must have been rolled back."""
+    health_import = db.get(HealthImport, import_id)
+    if health_import is None or health_import.status in ("completed", "failed"):
+        return health_import
+    return _finish(db, health_import, "failed", f"{error} (after {health_import.records} records)")
+
+
+def _finish(db: Session, health_import: HealthImport, status: str, error: Optional[str] = None) -> HealthImport:
+    health_import.status = status
+    health_import.error = error
+    health_import.completed_at = datetime.now(timezone.utc)
+    db.commit()
+    try:
+        os.remove(health_import.path)
+    except FileNotFoundError:
+        pass
+    return health_import
@@ -0,0 +1,212 @@
+"""Vectorized validation and bulk insertion of health readings.
+
+A batch arrives as three parallel columns. Every check runs over NumPy arrays
+rather than row by row, readings repeated within the batch are dropped, and
+the rest are inserted sorted by (metric, ts) with ON CONFLICT DO NOTHING, so
+re-sent readings are ignored. On PostgreSQL, large batches are loaded with
+COPY into a temporary staging table and moved over with one
+``INSERT ... SELECT``.
+"""
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..metrics import health_readings_ingested_total
+from .models import HealthReading
+from .schemas import ReadingsBatch
+
+
+@dataclass(frozen=True)
+class Metric:
+    code: int
+    unit: str
+    min_value: float
+    max_value: float
+
+
+# Codes are what health_readings.metric stores: never renumber or reuse one
+METRICS: Dict[str, Metric] = {
+    "heart_rate": Metric(1, "bpm", 20, 250),
+    "steps": Metric(2, "count", 0, 100_000),
+    "glucose": Metric(3, "mmol/L", 1, 40),
+    "spo2": Metric(4, "%", 50, 100),
+    "systolic_bp": Metric(5, "mmHg", 50, 260),
+    "diastolic_bp": Metric(6, "mmHg", 30, 160),
+    "weight": Metric(7, "kg", 2, 400),
+}
+METRIC_NAMES: Dict[int, str] = {metric.code: name for name, metric in METRICS.items()}
+
+# Anything earlier is a device clock error
+EARLIEST_TS = 946684800.0  # 2000-01-01
+
+REASONS = {1: "unknown metric", 2: "timestamp out of range", 3: "value out of range"}
+MAX_REPORTED_REJECTIONS = 100
+
+COLUMNS = ["user_id", "metric", "ts", "value"]
+
+
+@dataclass
+class ValidReadings:
+    """Accepted readings sorted by (metric, ts), plus what was dropped."""
+
+    metric: np.ndarray  # int16 codes
+    ts: np.ndarray  # float64 Unix seconds, microsecond resolution
+    value: np.ndarray  # float64
+    rejected: List[Tuple[int, str]]  # (index in the batch, reason)
+    duplicates: int  # repeated within the batch
+
+
+def validate_readings(metric: List[str], ts: List[float], value: List[float], now: float) -> ValidReadings:
+    """Check a batch column-wise; raises ValueError if it is malformed as a whole."""
+    n = len(metric)
+    if len(ts) != n or len(value) != n:
+        raise ValueError("metric, ts and value must have the same length")
+    if n > settings.health_max_batch:
+        raise ValueError(f"At most {settings.health_max_batch} readings per batch")
+
+    names, inverse = np.unique(np.asarray(metric, dtype=str), return_inverse=True)
+    known = [METRICS.get(name) for name in names]
+    codes = np.array([m.code if m else 0 for m in known], dtype=np.int16)[inverse]
+    low = np.array([m.min_value if m else np.nan for m in known])[inverse]
+    high = np.array([m.max_value if m else np.nan for m in known])[inverse]
+    ts_arr = np.round(np.asarray(ts, dtype=np.float64), 6)
+    values = np.asarray(value, dtype=np.float64)
+
+    # First failing check wins; 0 means valid
+    reasons = np.zeros(n, dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        checks = (
+            (1, codes == 0),
+            (2, ~np.isfinite(ts_arr) | (ts_arr < EARLIEST_TS) | (ts_arr > now + settings.health_max_clock_skew)),
+            (3, ~np.isfinite(values) | (values < low) | (values > high)),
+        )
+    for reason, failed in checks:
+        reasons[(reasons == 0) & failed] = reason
+
+    valid = np.flatnonzero(reasons == 0)
+    rejected = [(int(i), REASONS[int(reasons[i])]) for i in np.flatnonzero(reasons)]
+
+    # Sort by (metric, ts, position) and keep the first of each (metric, ts);
+    # the sorted order also suits the primary key index on insert
+    order = valid[np.lexsort((valid, ts_arr[valid], codes[valid]))]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (codes[order][1:] != codes[order][:-1]) | (ts_arr[order][1:] != ts_arr[order][:-1])
+    kept = order[first]
+
+    return ValidReadings(
+        metric=codes[kept], ts=ts_arr[kept], value=values[kept],
+        rejected=rejected, duplicates=len(order) - len(kept),
+    )
+
+
+def to_datetimes(ts: np.ndarray) -> list:
+    """Aware UTC datetimes from Unix seconds, converted in one NumPy pass."""
+    naive = np.round(ts * 1e6).astype(np.int64).astype("datetime64[us]").tolist()
+    return [d.replace(tzinfo=timezone.utc) for d in naive]
+
+
+def _records(user_id: int, readings: ValidReadings) -> list:
+    return list(zip(
+        [user_id] * len(readings.ts), readings.metric.tolist(), to_datetimes(readings.ts), readings.value.tolist()
+    ))
+
+
+def _insert_ignoring_conflicts(dialect_name: str):
+    # On the table rather than the mapped class, to skip ORM bulk-insert bookkeeping
+    table = HealthReading.__table__
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return dialect_insert(table).on_conflict_do_nothing().returning(table.c.metric)
+
+
+async def insert_readings(db: AsyncSession, user_id: int, readings: ValidReadings) -> int:
+    """Insert readings not stored yet; returns how many were new."""
+    if not len(readings.ts):
+        return 0
+    conn = await db.connection()
+    records = _records(user_id, readings)
+
+    if conn.dialect.name == "postgresql" and len(records) >= settings.health_copy_min_rows:
+        # Executing through SQLAlchemy first opens the transaction the COPY
+        # joins; the staging rows vanish on commit
+        await conn.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS health_readings_staging "
+            "(LIKE health_readings) ON COMMIT DELETE ROWS"
+        ))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "health_readings_staging", records=records, columns=COLUMNS
+        )
+        result = await conn.execute(text(
+            "INSERT INTO health_readings (user_id, metric, ts, value) "
+            "SELECT user_id, metric, ts, value FROM health_readings_staging "
+            "ON CONFLICT DO NOTHING"
+        ))
+        return result.rowcount
+
+    stmt = _insert_ignoring_conflicts(conn.dialect.name)
+    result = await db.execute(stmt, [dict(zip(COLUMNS, record)) for record in records])
+    return len(result.all())
+
+
+def insert_readings_sync(db: Session, user_id: int, readings: ValidReadings) -> int:
+    """``insert_readings`` for Celery tasks, without the COPY path."""
+    if not len(readings.ts):
+        return 0
+    stmt = _insert_ignoring_conflicts(db.get_bind().dialect.name)
+    result = db.execute(stmt, [dict(zip(COLUMNS, record)) for record in _records(user_id, readings)])
+    return len(result.all())
+
+
+def touched_hours(readings: ValidReadings) -> Dict[str, List[int]]:
+    """UTC hours (Unix time // 3600) that received readings, per metric name."""
+    # Readings are sorted by metric, so each metric is one slice
+    codes, starts = np.unique(readings.metric, return_index=True)
+    hours = np.split(np.floor_divide(readings.ts, 3600).astype(np.int64), starts[1:])
+    return {
+        METRIC_NAMES[code]: np.unique(metric_hours).tolist()
+        for code, metric_hours in zip(codes.tolist(), hours)
+    }
+
+
+async def ingest_readings(db: AsyncSession, user_id: int, batch: ReadingsBatch,
+                          now: float) -> Tuple[dict, Optional[dict]]:
+    """Validate and store a batch.
+
+    Returns the IngestResponse body and, if anything new was stored, the
+    window to hand to ``process_health_data_task``.
+    """
+    readings = validate_readings(batch.metric, batch.ts, batch.value, now)
+    inserted = await insert_readings(db, user_id, readings)
+    await db.commit()
+
+    duplicates = readings.duplicates + len(readings.ts) - inserted
+    health_readings_ingested_total.labels(outcome="accepted").inc(inserted)
+    health_readings_ingested_total.labels(outcome="duplicate").inc(duplicates)
+    health_readings_ingested_total.labels(outcome="rejected").inc(len(readings.rejected))
+
+    window = None
+    if inserted:
+        hours = touched_hours(readings)
+        window = {
+            "metrics": sorted(hours),
+            "start": float(readings.ts.min()),
+            "end": float(readings.ts.max()),
+            "hours": hours,
+        }
+    response = {
+        "accepted": inserted,
+        "duplicates": duplicates,
+        "rejected_count": len(readings.rejected),
+        "rejected": [
+            {"index": index, "reason": reason}
+            for index, reason in readings.rejected[:MAX_REPORTED_REJECTIONS]
+        ],
+    }
+    return response, window
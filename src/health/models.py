@@ -0,0 +1,102 @@
+from sqlalchemy import (
+    BigInteger, Column, Integer, SmallInteger, String, Text, DateTime, Float, ForeignKey, Index, LargeBinary,
+    PrimaryKeyConstraint, UniqueConstraint
+)
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+
+class ReminderRun(Base):
+    __tablename__ = "reminder_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_key = Column(String(16), unique=True, nullable=False)  # UTC hour, e.g. '2025-06-11T09'
+    # Checkpoint: every active user up to this id has been dispatched
+    last_user_id = Column(Integer, nullable=False, default=0)
+    batches = Column(Integer, nullable=False, default=0)
+    users = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class HealthReading(Base):
+    """One sensor reading. Kept narrow (no surrogate key) since it grows by
+    millions of rows; the primary key doubles as the (user, metric, time)
+    index and makes re-sent readings no-ops."""
+
+    __tablename__ = "health_readings"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "metric", "ts"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    metric = Column(SmallInteger, nullable=False)  # code from ingest.METRICS
+    ts = Column(DateTime(timezone=True), nullable=False)
+    value = Column(Float(precision=24), nullable=False)  # single precision
+
+
+class HealthRollup(Base):
+    """Summary of one user's metric over one UTC hour or day, kept up to date
+    by ``rollups.update_rollups`` as readings arrive."""
+
+    __tablename__ = "health_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "metric", "resolution", "bucket"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    metric = Column(SmallInteger, nullable=False)
+    resolution = Column(Integer, nullable=False)  # bucket length in seconds: 3600 or 86400
+    bucket = Column(DateTime(timezone=True), nullable=False)  # bucket start
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sketch = Column(LargeBinary, nullable=False)  # see health.sketch
+
+
+class HealthAnomaly(Base):
+    """A reading flagged by one of the detectors in ``health.anomalies``."""
+
+    __tablename__ = "health_anomalies"
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", "ts", "detector"),
+        Index("ix_health_anomalies_user_id_ts", "user_id", "ts"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    metric = Column(SmallInteger, nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)  # start of the flagged minute
+    detector = Column(String(16), nullable=False)  # 'zscore', 'ewma' or 'changepoint'
+    value = Column(Float, nullable=False)  # mean reading of that minute
+    score = Column(Float, nullable=False)  # signed, in the detector's units
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class HealthImport(Base):
+    """An uploaded export file and the checkpoint of its import."""
+
+    __tablename__ = "health_imports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)  # as uploaded
+    path = Column(String(512), nullable=False)  # under HEALTH_IMPORT_DIR
+    size = Column(BigInteger, nullable=False)  # bytes uploaded
+    format = Column(String(16), nullable=True)  # 'csv' or 'apple_health', once detected
+    status = Column(String(16), nullable=False, default="pending")  # pending, processing, completed, failed
+    # Checkpoint, committed with each batch: records before it are stored
+    records = Column(Integer, nullable=False, default=0)
+    bytes_read = Column(BigInteger, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=True)  # uncompressed size of the parsed file
+    accepted = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)  # records of types we do not track
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,178 @@
+"""Daily health reminders, fanned out in batches by time zone.
+
+An hourly beat tick picks the time zones where it is now REMINDER_LOCAL_HOUR,
+so the day's reminders are spread over 24 runs instead of one midnight spike.
+Each run walks the active users of those zones by id (keyset pagination, one
+batch of ids in memory at a time) and hands REMINDER_GROUP_SIZE batches at a
+time to ``dispatch``, which queues them as a Celery group. The cursor is
+checkpointed in ``reminder_runs`` after every group, so a crashed run resumes
+where it stopped.
+
+Batches may be dispatched twice after a crash; ``claim_reminders`` makes
+that harmless by stamping ``last_reminded_at`` with a conditional UPDATE and
+only reminding the users it actually stamped. If sending then fails,
+``release_reminders`` clears the stamps again so the retried batch still
+reminds those users.
+"""
+import functools
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, List, Optional
+from zoneinfo import ZoneInfo, available_timezones
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..auth.models import User
+from ..config import settings
+from ..mailer import Email
+from .models import ReminderRun
+
+RUN_KEY_FORMAT = "%Y-%m-%dT%H"
+
+
+@functools.lru_cache
+def _zones() -> dict:
+    return {name: ZoneInfo(name) for name in available_timezones()}
+
+
+def due_timezones(at: datetime) -> List[str]:
+    """Time zones where the local hour at ``at`` is REMINDER_LOCAL_HOUR."""
+    return sorted(
+        name for name, zone in _zones().items()
+        if at.astimezone(zone).hour == settings.reminder_local_hour
+    )
+
+
+def run_key(at: datetime) -> str:
+    return at.astimezone(timezone.utc).strftime(RUN_KEY_FORMAT)
+
+
+def run_hour(key: str) -> datetime:
+    return datetime.strptime(key, RUN_KEY_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def iter_user_batches(db: Session, timezones: List[str], after_id: int, batch_size: int) -> Iterator[List[int]]:
+    """Ids of active users in ``timezones`` above ``after_id``, in batches."""
+    in_zones = User.timezone.in_(timezones)
+    if "UTC" in timezones:
+        in_zones = or_(in_zones, User.timezone.is_(None))
+    last_id = after_id
+    while True:
+        ids = db.execute(
+            select(User.id)
+            .where(User.is_active == True, in_zones, User.id > last_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def get_or_create_run(db: Session, key: str) -> ReminderRun:
+    run = db.execute(select(ReminderRun).where(ReminderRun.run_key == key)).scalars().first()
+    if run is not None:
+        return run
+    run = ReminderRun(run_key=key, last_user_id=0, batches=0, users=0)
+    db.add(run)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another dispatcher created it first
+        db.rollback()
+        return db.execute(select(ReminderRun).where(ReminderRun.run_key == key)).scalars().one()
+    return run
+
+
+def fan_out(db: Session, key: str, dispatch: Callable[[List[List[int]]], None]) -> ReminderRun:
+    """Dispatch every due user of run ``key`` from its checkpoint onwards."""
+    run = get_or_create_run(db, key)
+    if run.completed_at is not None:
+        return run
+
+    timezones = due_timezones(run_hour(key))
+    group: List[List[int]] = []
+
+    def flush():
+        dispatch(group)
+        run.last_user_id = group[-1][-1]
+        run.batches += len(group)
+        run.users += sum(len(ids) for ids in group)
+        db.commit()
+
+    for ids in iter_user_batches(db, timezones, run.last_user_id, settings.reminder_batch_size):
+        group.append(ids)
+        if len(group) >= settings.reminder_group_size:
+            flush()
+            group = []
+    if group:
+        flush()
+
+    run.completed_at = datetime.now(timezone.utc)
+    db.commit()
+    return run
+
+
+def run_due_reminders(db: Session, now: datetime, dispatch: Callable[[List[List[int]]], None]) -> List[ReminderRun]:
+    """Resume unfinished runs from the last day, then run the current hour."""
+    current = run_key(now)
+    oldest = run_key(now - timedelta(days=1))
+    unfinished = db.execute(
+        select(ReminderRun.run_key).where(
+            ReminderRun.completed_at.is_(None),
+            ReminderRun.run_key >= oldest,
+            ReminderRun.run_key < current,
+        ).order_by(ReminderRun.run_key)
+    ).scalars().all()
+    return [fan_out(db, key, dispatch) for key in [*unfinished, current]]
+
+
+def claim_reminders(db: Session, user_ids: List[int]) -> list:
+    """Mark the users in ``user_ids`` as reminded and return the (id, email,
+    full_name, username) of those stamped, skipping any already reminded
+    within REMINDER_MIN_INTERVAL_HOURS."""
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=settings.reminder_min_interval_hours)
+    users = db.execute(
+        update(User)
+        .where(
+            User.id.in_(user_ids),
+            or_(User.last_reminded_at.is_(None), User.last_reminded_at < cutoff),
+        )
+        .values(last_reminded_at=now)
+        .returning(User.id, User.email, User.full_name, User.username)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return users
+
+
+def release_reminders(db: Session, user_ids: List[int]) -> None:
+    """Undo ``claim_reminders`` for users whose reminder was not sent, so a
+    redelivered batch reminds them."""
+    if not user_ids:
+        return
+    db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(last_reminded_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def reminder_email(user, anomalies: Optional[List[str]] = None) -> Email:
+    """``user`` is a User or a row with its email and names; ``anomalies``
+    are recent flagged readings, described for the user."""
+    return Email(
+        to=user.email,
+        subject="Your daily health check-in",
+        template="daily_reminder.html",
+        context={
+            "name": user.full_name or user.username,
+            "app_name": settings.name,
+            "anomalies": anomalies or [],
+        },
+    )
@@ -0,0 +1,275 @@
+"""Hourly and daily rollups of health readings, and series queries over them.
+
+Each (user, metric, UTC hour) and (user, metric, UTC day) with readings has a
+``health_rollups`` row holding count, sum, min, max and a percentile sketch.
+After an ingest, only the hours that received readings are recomputed from
+the raw rows, and their days are then re-merged from the hourly rollups.
+Recomputing whole buckets rather than adding the new readings in keeps this
+idempotent: a retried task or a late reading for last week rewrites the same
+few rows with the same result.
+
+``series`` serves a time range at a requested step from the coarsest stored
+resolution that divides it, falling back to the raw readings for steps
+shorter than an hour.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import sketch
+from .ingest import METRICS, METRIC_NAMES
+from .models import HealthReading, HealthRollup
+
+HOUR = 3600
+DAY = 86400
+RESOLUTION_NAMES = {0: "raw", HOUR: "hour", DAY: "day"}
+
+# Default steps for a requested number of points, smallest first
+STEPS = [60, 300, 900, HOUR, 3 * HOUR, 6 * HOUR, 12 * HOUR, DAY, 7 * DAY, 30 * DAY]
+
+# Longest stretch of hours recomputed from one query, to bound memory on imports
+MAX_HOURS_PER_QUERY = 24
+
+
+def _at(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def _epochs(datetimes: Iterable[datetime]) -> np.ndarray:
+    # SQLite hands back naive datetimes, which are UTC here
+    return np.array([
+        (d if d.tzinfo else d.replace(tzinfo=timezone.utc)).timestamp() for d in datetimes
+    ], dtype=np.float64)
+
+
+def _runs(indexes: List[int], max_length: int) -> Iterator[Tuple[int, int]]:
+    """Split sorted indexes into contiguous (first, last) runs."""
+    first = previous = None
+    for index in indexes:
+        if first is not None and (index != previous + 1 or index - first >= max_length):
+            yield first, previous
+            first = None
+        if first is None:
+            first = index
+        previous = index
+    if first is not None:
+        yield first, previous
+
+
+def _groups(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start offsets and keys of each run of equal values in sorted ``keys``."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, keys[starts]
+
+
+def _summaries(keys: np.ndarray, values: np.ndarray, low: float, high: float) -> Iterator[tuple]:
+    """(key, count, sum, min, max, sketch counts) per key of readings sorted by key."""
+    if not len(keys):
+        return
+    starts, group_keys = _groups(keys)
+    ends = np.r_[starts[1:], len(keys)]
+    sums = np.add.reduceat(values, starts)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    for i, key in enumerate(group_keys.tolist()):
+        yield (key, int(ends[i] - starts[i]), float(sums[i]), float(mins[i]), float(maxs[i]),
+               sketch.from_values(values[starts[i]:ends[i]], low, high))
+
+
+def _upsert(db: Session, rows: List[dict]) -> None:
+    if not rows:
+        return
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(HealthRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "metric", "resolution", "bucket"],
+        set_={column: stmt.excluded[column] for column in ("count", "sum", "min", "max", "sketch")},
+    )
+    db.execute(stmt, rows)
+
+
+def _row(user_id: int, code: int, resolution: int, bucket: int, count: int, total: float,
+         low: float, high: float, counts: np.ndarray) -> dict:
+    return {
+        "user_id": user_id, "metric": code, "resolution": resolution, "bucket": _at(bucket * resolution),
+        "count": count, "sum": total, "min": low, "max": high, "sketch": sketch.encode(counts),
+    }
+
+
+def recompute_hours(db: Session, user_id: int, code: int, hours: List[int]) -> int:
+    """Rebuild the hourly rollups of ``hours`` from the raw readings."""
+    metric = METRICS[METRIC_NAMES[code]]
+    rows = []
+    for first, last in _runs(hours, MAX_HOURS_PER_QUERY):
+        result = db.execute(
+            select(HealthReading.ts, HealthReading.value)
+            .where(
+                HealthReading.user_id == user_id,
+                HealthReading.metric == code,
+                HealthReading.ts >= _at(first * HOUR),
+                HealthReading.ts < _at((last + 1) * HOUR),
+            )
+            .order_by(HealthReading.ts)
+        ).all()
+        if not result:
+            continue
+        ts, values = zip(*result)
+        keys = np.floor_divide(_epochs(ts), HOUR).astype(np.int64)
+        for hour, count, total, low, high, counts in _summaries(
+            keys, np.asarray(values, dtype=np.float64), metric.min_value, metric.max_value
+        ):
+            rows.append(_row(user_id, code, HOUR, hour, count, total, low, high, counts))
+    _upsert(db, rows)
+    return len(rows)
+
+
+def recompute_days(db: Session, user_id: int, code: int, days: List[int]) -> int:
+    """Rebuild the daily rollups of ``days`` by merging their hourly rollups."""
+    rows = []
+    for first, last in _runs(days, 31):
+        hourly = db.execute(
+            select(HealthRollup.bucket, HealthRollup.count, HealthRollup.sum,
+                   HealthRollup.min, HealthRollup.max, HealthRollup.sketch)
+            .where(
+                HealthRollup.user_id == user_id,
+                HealthRollup.metric == code,
+                HealthRollup.resolution == HOUR,
+                HealthRollup.bucket >= _at(first * DAY),
+                HealthRollup.bucket < _at((last + 1) * DAY),
+            )
+            .order_by(HealthRollup.bucket)
+        ).all()
+        if not hourly:
+            continue
+        buckets, counts, sums, mins, maxs, sketches = zip(*hourly)
+        keys = np.floor_divide(_epochs(buckets), DAY).astype(np.int64)
+        starts, group_keys = _groups(keys)
+        ends = np.r_[starts[1:], len(keys)]
+        for day, start, end in zip(group_keys.tolist(), starts.tolist(), ends.tolist()):
+            rows.append(_row(
+                user_id, code, DAY, day, sum(counts[start:end]), math.fsum(sums[start:end]),
+                min(mins[start:end]), max(maxs[start:end]),
+                sketch.merge(sketch.decode(blob) for blob in sketches[start:end]),
+            ))
+    _upsert(db, rows)
+    return len(rows)
+
+
+def update_rollups(db: Session, user_id: int, hours: Dict[str, List[int]]) -> Dict[str, int]:
+    """Recompute the rollups touched by an ingest; ``hours`` maps each metric
+    to the hour indexes that received readings. Returns buckets rewritten."""
+    updated = {}
+    for name, metric_hours in hours.items():
+        code = METRICS[name].code
+        metric_hours = sorted(metric_hours)
+        days = sorted({hour * HOUR // DAY for hour in metric_hours})
+        updated[name] = recompute_hours(db, user_id, code, metric_hours)
+        db.flush()
+        updated[name] += recompute_days(db, user_id, code, days)
+    db.commit()
+    return updated
+
+
+def default_step(start: float, end: float, points: int) -> int:
+    """Smallest standard step that covers ``start``-``end`` in at most ``points``."""
+    wanted = (end - start) / points
+    return next((step for step in STEPS if step >= wanted), STEPS[-1])
+
+
+def pick_resolution(step: int) -> int:
+    """Coarsest stored resolution whose buckets tile ``step``; 0 for raw."""
+    return next((resolution for resolution in (DAY, HOUR) if step % resolution == 0), 0)
+
+
+def series_query(user_id: int, name: str, start: float, end: float, step: int):
+    """Rows ``summarize_series`` needs: rollups when ``step`` is a whole number
+    of hours or days, else the raw readings."""
+    metric = METRICS[name]
+    resolution = pick_resolution(step)
+    origin = math.floor(start / step) * step
+    if resolution:
+        return (
+            select(HealthRollup.bucket, HealthRollup.count, HealthRollup.sum,
+                   HealthRollup.min, HealthRollup.max, HealthRollup.sketch)
+            .where(
+                HealthRollup.user_id == user_id,
+                HealthRollup.metric == metric.code,
+                HealthRollup.resolution == resolution,
+                HealthRollup.bucket >= _at(origin),
+                HealthRollup.bucket < _at(end),
+            )
+            .order_by(HealthRollup.bucket)
+        )
+    return (
+        select(HealthReading.ts, HealthReading.value)
+        .where(
+            HealthReading.user_id == user_id,
+            HealthReading.metric == metric.code,
+            HealthReading.ts >= _at(origin),
+            HealthReading.ts < _at(end),
+        )
+        .order_by(HealthReading.ts)
+    )
+
+
+def summarize_series(rows: list, name: str, start: float, end: float, step: int,
+                     percentiles: List[float]) -> dict:
+    """Summaries of one metric per ``step`` seconds (aligned to the Unix
+    epoch) from the rows of ``series_query``; empty steps are left out.
+
+    CPU-bound; async callers run it on the threadpool."""
+    metric = METRICS[name]
+    resolution = pick_resolution(step)
+    origin = math.floor(start / step) * step
+    points = []
+
+    def point(index: int, count: int, total: float, low: float, high: float, estimates: List[float]) -> dict:
+        return {
+            "ts": float(origin + index * step), "count": count, "mean": total / count, "min": low, "max": high,
+            "percentiles": {f"p{q:g}": value for q, value in zip(percentiles, estimates)},
+        }
+
+    if resolution and rows:
+        buckets, counts, sums, mins, maxs, sketches = zip(*rows)
+        keys = ((_epochs(buckets) - origin) // step).astype(np.int64)
+        starts, group_keys = _groups(keys)
+        ends = np.r_[starts[1:], len(keys)]
+        for index, first, last in zip(group_keys.tolist(), starts.tolist(), ends.tolist()):
+            low, high = min(mins[first:last]), max(maxs[first:last])
+            merged = sketch.merge(sketch.decode(blob) for blob in sketches[first:last])
+            points.append(point(
+                index, sum(counts[first:last]), math.fsum(sums[first:last]), low, high,
+                sketch.quantiles(merged, percentiles, metric.min_value, metric.max_value, low, high),
+            ))
+    elif rows:
+        ts, values = zip(*rows)
+        values = np.asarray(values, dtype=np.float64)
+        keys = ((_epochs(ts) - origin) // step).astype(np.int64)
+        starts, group_keys = _groups(keys)
+        ends = np.r_[starts[1:], len(keys)]
+        for index, first, last in zip(group_keys.tolist(), starts.tolist(), ends.tolist()):
+            chunk = values[first:last]
+            points.append(point(
+                index, len(chunk), float(chunk.sum()), float(chunk.min()), float(chunk.max()),
+                np.percentile(chunk, percentiles).tolist(),
+            ))
+
+    return {
+        "metric": name,
+        "unit": metric.unit,
+        "resolution": RESOLUTION_NAMES[resolution],
+        "step": step,
+        "points": points,
+    }
+
+
+def series(db: Session, user_id: int, name: str, start: float, end: float, step: int,
+           percentiles: List[float]) -> dict:
+    """``summarize_series`` over rows loaded with a sync session."""
+    rows = db.execute(series_query(user_id, name, start, end, step)).all()
+    return summarize_series(rows, name, start, end, step, percentiles)
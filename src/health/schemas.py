@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+
+# Ingestion Schemas
+class ReadingsBatch(BaseModel):
+    """Readings as parallel columns; row i is (metric[i], ts[i], value[i])."""
+
+    metric: List[str]  # e.g. 'heart_rate', see GET /health/metrics
+    ts: List[float]  # Unix time in seconds
+    value: List[float]
+
+
+class RejectedReading(BaseModel):
+    index: int
+    reason: str
+
+
+class IngestResponse(BaseModel):
+    accepted: int
+    duplicates: int
+    rejected_count: int
+    rejected: List[RejectedReading]  # the first few, with reasons
+
+
+class MetricInfo(BaseModel):
+    name: str
+    unit: str
+    min_value: float
+    max_value: float
+
+
+# Series Schemas
+class SeriesPoint(BaseModel):
+    ts: float  # start of the step, Unix time in seconds
+    count: int
+    mean: float
+    min: float
+    max: float
+    percentiles: Dict[str, float]  # e.g. {"p50": 72.0}; estimated from sketches above raw resolution
+
+
+class SeriesResponse(BaseModel):
+    metric: str
+    unit: str
+    resolution: str  # 'raw', 'hour' or 'day': what the points were computed from
+    step: int  # seconds per point
+    points: List[SeriesPoint]  # steps without readings are left out
+
+
+# Anomaly Schemas
+class AnomalyResponse(BaseModel):
+    metric: str
+    ts: float  # start of the flagged minute, Unix time in seconds
+    detector: str  # 'zscore', 'ewma' or 'changepoint'
+    value: float
+    score: float
+    description: str
+
+
+# Import Schemas
+class HealthImportResponse(BaseModel):
+    id: int
+    filename: str
+    size: int
+    format: Optional[str] = None  # 'csv' or 'apple_health', once processing starts
+    status: str  # pending, processing, completed or failed
+    progress: float  # share of the file parsed, 0-1
+    records: int
+    accepted: int
+    duplicates: int
+    rejected: int
+    skipped: int
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
@@ -0,0 +1,61 @@
+"""Mergeable percentile sketch for rollup buckets.
+
+A sketch is a 256-bin histogram over a metric's valid range, with bins spaced
+evenly in ``log1p(value - min_value)`` so low values get finer bins. Sketches
+of adjacent buckets merge by adding counts, which is how daily rollups are
+built from hourly ones. Only non-empty bins are stored: one byte of bin
+index and four bytes of count each, so a quiet hour costs a few bytes.
+"""
+from typing import Iterable, List
+
+import numpy as np
+
+BINS = 256
+
+
+def _scale(low: float, high: float) -> float:
+    return BINS / np.log1p(high - low)
+
+
+def bin_index(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Bin of each value; values are clipped to [low, high]."""
+    clipped = np.clip(values, low, high)
+    return np.minimum((np.log1p(clipped - low) * _scale(low, high)).astype(np.int64), BINS - 1)
+
+
+def from_values(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Dense bin counts for a set of values."""
+    return np.bincount(bin_index(values, low, high), minlength=BINS).astype(np.uint32)
+
+
+def merge(sketches: Iterable[np.ndarray]) -> np.ndarray:
+    total = np.zeros(BINS, dtype=np.uint32)
+    for counts in sketches:
+        total += counts
+    return total
+
+
+def encode(counts: np.ndarray) -> bytes:
+    nonzero = np.flatnonzero(counts)
+    return nonzero.astype(np.uint8).tobytes() + counts[nonzero].astype("<u4").tobytes()
+
+
+def decode(blob: bytes) -> np.ndarray:
+    n = len(blob) // 5
+    counts = np.zeros(BINS, dtype=np.uint32)
+    counts[np.frombuffer(blob[:n], dtype=np.uint8)] = np.frombuffer(blob[n:], dtype="<u4")
+    return counts
+
+
+def quantiles(counts: np.ndarray, qs: List[float], low: float, high: float,
+              observed_min: float, observed_max: float) -> List[float]:
+    """Estimated values at percentiles ``qs`` (0-100), from bin midpoints
+    clamped to the observed range."""
+    total = int(counts.sum())
+    if total == 0:
+        return [float("nan")] * len(qs)
+    cumulative = np.cumsum(counts)
+    ranks = np.ceil(np.asarray(qs, dtype=np.float64) / 100 * total).clip(1, total)
+    bins = np.searchsorted(cumulative, ranks)
+    midpoints = np.expm1((bins + 0.5) / _scale(low, high)) + low
+    return np.clip(midpoints, observed_min, observed_max).tolist()
@@ -0,0 +1,313 @@
+"""``Idempotency-Key`` support for POST endpoints that clients retry.
+
+Mobile clients resend a request when the network drops the response; for
+routes in IDEMPOTENCY_ROUTES a client that sends an ``Idempotency-Key``
+header gets the first response replayed instead of the request running
+again (a second model call, a duplicate message or account).
+
+The key is scoped to the route and the caller's Authorization header, and
+remembered with a fingerprint of the request body:
+
+* a new key is claimed (``in_flight``) and the request runs; its response is
+  stored for IDEMPOTENCY_TTL seconds unless it is a 5xx, an error that can
+  clear up on its own (401 expired token, 409, 429 quota) or the endpoint
+  called ``do_not_replay``, in which case the key is released so the retry
+  runs again;
+* a completed key with the same body replays the stored response, marked
+  with ``Idempotent-Replayed: true``; with a different body it is a 422;
+* a key still in flight makes the duplicate wait, polling, for up to
+  IDEMPOTENCY_WAIT_SECONDS and then replay the original's response (409
+  with Retry-After if it is still running). A claim older than
+  IDEMPOTENCY_LOCK_TIMEOUT belongs to a worker that died and is taken over.
+
+Keys live in the ``idempotency_keys`` table, or in Redis when
+IDEMPOTENCY_REDIS_URL is set.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, JSON, LargeBinary, String, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from starlette.datastructures import Headers
+
+from .config import settings
+from .database import AsyncSessionLocal, Base
+from .metrics import idempotency_requests_total
+from .responses import FastJSONResponse
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# Responses that may differ on a later retry (after a token refresh, a
+# conflict resolving or a quota reset); like 5xx they are not remembered
+RETRYABLE_STATUSES = frozenset({401, 408, 409, 425, 429})
+# request.state flag an endpoint sets when its response, whatever the status,
+# should not be replayed (see ``do_not_replay``)
+NOT_REPLAYABLE = "idempotency_not_replayable"
+
+# Outcomes of a claim
+CLAIMED, IN_FLIGHT, COMPLETED, MISMATCH = "claimed", "in_flight", "completed", "mismatch"
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)  # sha256 of route, caller and client key
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body
+    status = Column(String(16), nullable=False)  # 'in_flight' or 'completed'
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # in flight: presumed dead after this
+    response_status = Column(Integer, nullable=True)
+    response_headers = Column(JSON, nullable=True)  # [[name, value], ...]
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[List[str]]
+    body: bytes
+
+
+class DatabaseStore:
+    async def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        now = datetime.now(timezone.utc)
+        claimed = {
+            "fingerprint": fingerprint,
+            "status": IN_FLIGHT,
+            "locked_until": now + timedelta(seconds=settings.idempotency_lock_timeout),
+            "expires_at": now + timedelta(seconds=settings.idempotency_ttl),
+        }
+        async with AsyncSessionLocal() as db:
+            conn = await db.connection()
+            dialect_insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+            inserted = await db.execute(
+                dialect_insert(IdempotencyKey.__table__).values(key=key, **claimed)
+                .on_conflict_do_nothing()
+                .returning(IdempotencyKey.key)
+            )
+            if inserted.first() is None:
+                # Taken; take it over if it expired or its request's worker died
+                taken_over = await db.execute(
+                    update(IdempotencyKey)
+                    .where(
+                        IdempotencyKey.key == key,
+                        or_(
+                            IdempotencyKey.expires_at < now,
+                            (IdempotencyKey.status == IN_FLIGHT) & (IdempotencyKey.locked_until < now),
+                        ),
+                    )
+                    .values(response_status=None, response_headers=None, response_body=None, **claimed)
+                    .execution_options(synchronize_session=False)
+                )
+                if not taken_over.rowcount:
+                    row = (await db.execute(
+                        select(IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.response_status,
+                               IdempotencyKey.response_headers, IdempotencyKey.response_body)
+                        .where(IdempotencyKey.key == key)
+                    )).first()
+                    await db.rollback()
+                    if row is None:
+                        # Released since the insert
+                        return await self.claim(key, fingerprint)
+                    if row.fingerprint != fingerprint:
+                        return MISMATCH, None
+                    if row.status == IN_FLIGHT:
+                        return IN_FLIGHT, None
+                    return COMPLETED, StoredResponse(row.response_status, row.response_headers, row.response_body)
+            await db.commit()
+        return CLAIMED, None
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(status=COMPLETED, locked_until=None, response_status=response.status,
+                        response_headers=response.headers, response_body=response.body)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def release(self, key: str) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            await db.commit()
+
+
+class RedisStore:
+    """Same protocol on Redis: a claim is SET NX expiring after the lock
+    timeout, a completed key is overwritten with the response and the TTL."""
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.from_url(url)
+
+    async def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        name = f"idempotency:{key}"
+        value = json.dumps({"fingerprint": fingerprint, "status": IN_FLIGHT})
+        if await self._redis.set(name, value, nx=True, px=int(settings.idempotency_lock_timeout * 1000)):
+            return CLAIMED, None
+        raw = await self._redis.get(name)
+        if raw is None:
+            # Expired between the two calls
+            return await self.claim(key, fingerprint)
+        record = json.loads(raw)
+        if record["fingerprint"] != fingerprint:
+            return MISMATCH, None
+        if record["status"] == IN_FLIGHT:
+            return IN_FLIGHT, None
+        return COMPLETED, StoredResponse(record["response_status"], record["response_headers"],
+                                         base64.b64decode(record["response_body"]))
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        await self._redis.set(f"idempotency:{key}", json.dumps({
+            "fingerprint": fingerprint,
+            "status": COMPLETED,
+            "response_status": response.status,
+            "response_headers": response.headers,
+            "response_body": base64.b64encode(response.body).decode(),
+        }), px=int(settings.idempotency_ttl * 1000))
+
+    async def release(self, key: str) -> None:
+        await self._redis.delete(f"idempotency:{key}")
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RedisStore(settings.idempotency_redis_url) if settings.idempotency_redis_url else DatabaseStore()
+    return _store
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired keys from the database store; returns how many."""
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.now(timezone.utc)))
+    db.commit()
+    return result.rowcount
+
+
+def do_not_replay(request) -> None:
+    """Release the request's Idempotency-Key once the response is sent, so a
+    retry runs again; for responses that only report a passing failure."""
+    setattr(request.state, NOT_REPLAYABLE, True)
+
+
+def _error(status_code: int, detail: str, headers: Optional[dict] = None) -> FastJSONResponse:
+    return FastJSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying responses of POSTs retried with the same
+    ``Idempotency-Key`` (see the module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = set(settings.idempotency_routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        client_key = headers.get(HEADER)
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            await _error(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")(scope, receive, send)
+            return
+
+        # The body is read up front to fingerprint it, then handed to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = hashlib.sha256(
+            "\n".join((scope["path"], headers.get("authorization", ""), client_key)).encode()
+        ).hexdigest()
+
+        store = get_store()
+        outcome, stored = await store.claim(key, fingerprint)
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        delay = 0.05
+        waited = False
+        while outcome == IN_FLIGHT and time.monotonic() < deadline:
+            waited = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+            outcome, stored = await store.claim(key, fingerprint)
+
+        if outcome == MISMATCH:
+            idempotency_requests_total.labels(outcome="mismatch").inc()
+            await _error(422, "Idempotency-Key was already used with a different request body")(
+                scope, receive, send
+            )
+            return
+        if outcome == IN_FLIGHT:
+            idempotency_requests_total.labels(outcome="conflict").inc()
+            await _error(409, "A request with this Idempotency-Key is still being processed",
+                         headers={"Retry-After": "1"})(scope, receive, send)
+            return
+        if outcome == COMPLETED:
+            idempotency_requests_total.labels(outcome="waited" if waited else "replayed").inc()
+            await send({
+                "type": "http.response.start",
+                "status": stored.status,
+                "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+                + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        idempotency_requests_total.labels(outcome="new").inc()
+        delivered = False
+
+        async def receive_body():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = StoredResponse(500, [], b"")
+        parts = []
+
+        async def send_and_capture(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = [[name.decode("latin-1"), value.decode("latin-1")]
+                                    for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                parts.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        except Exception:
+            await store.release(key)
+            raise
+        if (response.status >= 500 or response.status in RETRYABLE_STATUSES
+                or scope.get("state", {}).get(NOT_REPLAYABLE)):
+            await store.release(key)
+        else:
+            response.body = b"".join(parts)
+            await store.complete(key, fingerprint, response)
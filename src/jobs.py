@@ -0,0 +1,315 @@
+from dataclasses import asdict
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from celery import group
+from celery.exceptions import SoftTimeLimitExceeded
+from sqlalchemy.exc import OperationalError, TimeoutError as SQLAlchemyTimeoutError
+
+from .celery import celery_app
+from .config import settings
+from .database import SessionLocal
+from .chat.crud import get_messages_to_backfill, get_messages_to_embed
+from .chat.embeddings import Watermark, append as append_embeddings, get_embedder, load as load_index
+from .idempotency import purge_expired
+from .health.anomalies import scan_users
+from .health.imports import fail_import, run_import
+from .health.crud import describe_anomaly, get_active_user_ids, get_recent_anomalies_by_user
+from .health.rollups import update_rollups
+from .health.reminders import claim_reminders, release_reminders, reminder_email, run_due_reminders
+from .mailer import Email, deliver
+from .tasks.scheduler import run_scheduler, task_reminder_emails
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _retry_countdown(retries: int) -> int:
+    """Seconds before retry number ``retries + 1``: 30s, 60s, 120s, ..."""
+    return 30 * 2 ** retries
+
+@celery_app.task(bind=True, ignore_result=True, soft_time_limit=30, time_limit=60,
+                 max_retries=settings.mail_max_retries)
+def send_email_task(self, to: str, subject: str, body: str = None, template: str = None, context: dict = None):
+    """
+    Background task to send one email, either a plain body or a template
+    """
+    result = deliver([Email(to=to, subject=subject, body=body, template=template, context=context or {})])
+    if result.retry:
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Giving up on email to {to} after {self.request.retries} retries")
+            return
+        raise self.retry(countdown=_retry_countdown(self.request.retries))
+
+@celery_app.task(bind=True, ignore_result=True, soft_time_limit=120, time_limit=150,
+                 max_retries=settings.mail_max_retries)
+def send_bulk_email_task(self, emails: list):
+    """
+    Background task to send a batch of emails over pooled connections;
+    only recipients that failed temporarily are retried
+    """
+    result = deliver([Email(**email) for email in emails])
+    logger.info(f"Sent {len(result.sent)} emails, {len(result.retry)} to retry, {len(result.failed)} failed")
+    if result.retry:
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Giving up on {len(result.retry)} emails after {self.request.retries} retries")
+            return
+        raise self.retry(
+            args=([asdict(email) for email in result.retry],),
+            countdown=_retry_countdown(self.request.retries),
+        )
+
+def queue_bulk_email(emails: Iterable[Email]) -> int:
+    """Buffer ``emails`` into batches of MAIL_BATCH_SIZE and queue one task per
+    batch; returns the number of tasks queued."""
+    tasks = 0
+    batch = []
+    for email in emails:
+        batch.append(asdict(email))
+        if len(batch) >= settings.mail_batch_size:
+            send_bulk_email_task.delay(batch)
+            tasks += 1
+            batch = []
+    if batch:
+        send_bulk_email_task.delay(batch)
+        tasks += 1
+    return tasks
+
+@celery_app.task
+def process_health_data_task(user_id: int, data: dict):
+    """
+    Background task to process newly ingested health readings;
+    ``data`` is the window {"metrics": [...], "start": ts, "end": ts,
+    "hours": {metric: [hour, ...]}} from ``ingest_readings``
+    """
+    logger.info(f"Processing health data for user {user_id}")
+    db = SessionLocal()
+    try:
+        updated = update_rollups(db, user_id, data["hours"])
+    finally:
+        db.close()
+    logger.info(f"Rollup buckets rewritten: {updated}")
+    return f"Health data processed for user {user_id}"
+
+@celery_app.task(ignore_result=True, rate_limit=settings.reminder_batch_rate_limit)
+def send_reminder_batch_task(user_ids: list):
+    """
+    Background task to remind one batch of users; users already reminded
+    today (e.g. when a batch is delivered twice) are skipped
+    """
+    db = SessionLocal()
+    try:
+        users = claim_reminders(db, user_ids)
+        try:
+            anomalies = get_recent_anomalies_by_user(
+                db, [user.id for user in users], datetime.now(timezone.utc) - timedelta(days=1)
+            )
+            emails = [
+                reminder_email(user, [describe_anomaly(a) for a in anomalies.get(user.id, [])])
+                for user in users
+            ]
+            result = deliver(emails)
+        except Exception:
+            # Nothing was sent; let a redelivered batch remind these users
+            db.rollback()
+            release_reminders(db, [user.id for user in users])
+            raise
+    finally:
+        db.close()
+    if result.retry:
+        queue_bulk_email(result.retry)
+    logger.info(f"Reminded {len(result.sent)} of {len(user_ids)} users")
+
+def _dispatch_reminder_group(batches: list):
+    group(send_reminder_batch_task.s(ids) for ids in batches).apply_async()
+
+@celery_app.task(ignore_result=True, soft_time_limit=1800, time_limit=1860)
+def daily_health_reminder_task():
+    """
+    Periodic (hourly) task to send daily health reminders to the users whose
+    local time is now the reminder hour
+    """
+    db = SessionLocal()
+    try:
+        runs = run_due_reminders(db, datetime.now(timezone.utc), _dispatch_reminder_group)
+    finally:
+        db.close()
+    for run in runs:
+        logger.info(f"Reminder run {run.run_key}: {run.users} users in {run.batches} batches")
+
+@celery_app.task(ignore_result=True)
+def detect_anomalies_task(user_ids: list, end: float, since: float):
+    """
+    Background task to scan one batch of users' recent readings for
+    anomalies, storing those flagged at or after ``since``
+    """
+    db = SessionLocal()
+    try:
+        stored = scan_users(db, user_ids, end, since)
+    finally:
+        db.close()
+    logger.info(f"New anomalies for {len(user_ids)} users: {stored}")
+
+@celery_app.task(ignore_result=True)
+def scan_health_anomalies_task():
+    """
+    Periodic (hourly) task to queue anomaly detection, in batches, for the
+    users who sent readings recently
+    """
+    end = time.time()
+    since = end - settings.anomaly_lookback_hours * 3600
+    db = SessionLocal()
+    try:
+        user_ids = get_active_user_ids(db, datetime.fromtimestamp(since, timezone.utc))
+    finally:
+        db.close()
+    size = settings.anomaly_batch_size
+    group(
+        detect_anomalies_task.s(user_ids[i:i + size], end, since) for i in range(0, len(user_ids), size)
+    ).apply_async()
+    logger.info(f"Queued anomaly detection for {len(user_ids)} users")
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True,
+                 soft_time_limit=settings.health_import_time_slice,
+                 time_limit=settings.health_import_time_slice + 60,
+                 max_retries=settings.health_import_max_retries)
+def import_health_file_task(self, import_id: int):
+    """
+    Background task to import an uploaded export file. Imports resume from
+    their checkpoint, so a run cut short by a worker crash (the message is
+    only acknowledged at the end), by the time limit or by a database error
+    is simply run again; any other error fails the import
+    """
+    db = SessionLocal()
+    try:
+        health_import = run_import(db, import_id, time.time())
+    except SoftTimeLimitExceeded:
+        db.rollback()
+        import_health_file_task.delay(import_id)
+        logger.info(f"Import {import_id} continues in a new task")
+        return
+    except (OperationalError, SQLAlchemyTimeoutError) as e:
+        db.rollback()
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Import {import_id} hit a database error, retrying: {e}")
+            raise self.retry(countdown=_retry_countdown(self.request.retries))
+        logger.exception(f"Import {import_id} failed after {self.request.retries} retries")
+        health_import = fail_import(db, import_id, f"Database error: {e}")
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Import {import_id} failed")
+        health_import = fail_import(db, import_id, f"Internal error: {e}")
+    finally:
+        db.close()
+    if health_import is not None:
+        logger.info(f"Import {import_id} {health_import.status}: {health_import.records} records")
+
+@celery_app.task(ignore_result=True)
+def send_task_reminders_task(task_ids: list):
+    """
+    Background task to email the reminders of one batch of fired tasks
+    """
+    db = SessionLocal()
+    try:
+        emails = task_reminder_emails(db, task_ids)
+    finally:
+        db.close()
+    result = deliver(emails)
+    if result.retry:
+        queue_bulk_email(result.retry)
+    logger.info(f"Sent {len(result.sent)} task reminders for {len(task_ids)} tasks")
+
+def _dispatch_task_reminders(task_ids: list):
+    send_task_reminders_task.delay(task_ids)
+
+@celery_app.task(ignore_result=True, expires=settings.task_scheduler_run_seconds,
+                 soft_time_limit=settings.task_scheduler_run_seconds + 60,
+                 time_limit=settings.task_scheduler_run_seconds + 90)
+def run_task_scheduler_task():
+    """
+    Periodic task (every TASK_SCHEDULER_RUN_SECONDS) that fires the task
+    reminders coming due during its run; replicas share the work through
+    leases, so several scheduler workers may run it at once
+    """
+    db = SessionLocal()
+    try:
+        fired = run_scheduler(db, _dispatch_task_reminders)
+    finally:
+        db.close()
+    logger.info(f"Fired {fired} task reminders")
+
+@celery_app.task(ignore_result=True)
+def purge_idempotency_keys_task():
+    """
+    Periodic (hourly) task to delete expired idempotency keys
+    """
+    db = SessionLocal()
+    try:
+        purged = purge_expired(db)
+    finally:
+        db.close()
+    logger.info(f"Purged {purged} expired idempotency keys")
+
+@celery_app.task(ignore_result=True)
+def embed_messages_task(message_ids: list):
+    """
+    Background task to embed new chat messages and add them to their users'
+    retrieval indexes
+    """
+    db = SessionLocal()
+    try:
+        rows = get_messages_to_embed(db, message_ids)
+    finally:
+        db.close()
+    if not rows:
+        return
+    vectors = get_embedder().embed([content for _, _, content in rows])
+    by_user = {}
+    for i, (message_id, user_id, _) in enumerate(rows):
+        by_user.setdefault(user_id, []).append(i)
+    for user_id, positions in by_user.items():
+        append_embeddings(user_id, [rows[i][0] for i in positions], vectors[positions])
+    logger.info(f"Embedded {len(rows)} of {len(message_ids)} messages")
+
+@celery_app.task(ignore_result=True)
+def backfill_embeddings_task():
+    """
+    Periodic task to embed chat messages missing from their users' retrieval
+    indexes: ones ``embed_messages_task`` never got, and ones older than
+    retrieval itself. Walks messages by id past a watermark, for up to
+    EMBEDDING_BACKFILL_TIME_SLICE seconds a run
+    """
+    started = time.monotonic()
+    try:
+        with Watermark() as watermark:
+            before = datetime.now(timezone.utc) - timedelta(seconds=settings.embedding_backfill_delay)
+            embedded = 0
+            while time.monotonic() - started < settings.embedding_backfill_time_slice:
+                db = SessionLocal()
+                try:
+                    rows = get_messages_to_backfill(
+                        db, watermark.message_id, before, settings.embedding_backfill_batch_size
+                    )
+                finally:
+                    db.close()
+                # Stop at the first message still left to the queue, so the
+                # watermark never passes it
+                settled = next((i for i, row in enumerate(rows) if not row.settled), len(rows))
+                rows = rows[:settled]
+                if not rows:
+                    break
+                by_user = {}
+                for message_id, user_id, content, _ in rows:
+                    by_user.setdefault(user_id, []).append((message_id, content))
+                for user_id, messages in by_user.items():
+                    indexed = set(load_index(user_id)["id"].tolist())
+                    missing = [(message_id, content) for message_id, content in messages if message_id not in indexed]
+                    if missing:
+                        vectors = get_embedder().embed([content for _, content in missing])
+                        append_embeddings(user_id, [message_id for message_id, _ in missing], vectors)
+                        embedded += len(missing)
+                watermark.advance(rows[-1][0])
+    except BlockingIOError:
+        logger.info("Embedding backfill already running, skipping")
+        return
+    logger.info(f"Backfilled {embedded} message embeddings, through message {watermark.message_id}")
@@ -0,0 +1,258 @@
+"""Outgoing email over pooled SMTP connections.
+
+Messages are built with fastapi-mail from Jinja templates in
+``src/templates/email`` and sent over connections that each worker process
+keeps open between tasks, so a campaign pays for the TCP/TLS handshake and
+login once per connection rather than once per message. ``send_batch``
+renders each template once per distinct context and sorts recipients into
+sent, temporary failures (worth retrying) and permanent failures, so the
+caller can retry only the recipients that need it.
+
+Setting MAIL_SUPPRESS_SEND builds messages without connecting; they are
+still announced on fastapi-mail's ``email_dispatched`` signal, so
+``FastMail(mail_config()).record_messages()`` captures them in tests.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDER = Path(__file__).parent / "templates" / "email"
+
+
+@dataclass
+class Email:
+    to: str
+    subject: str
+    body: Optional[str] = None  # used as-is when no template is given
+    template: Optional[str] = None
+    context: Dict = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    sent: List[Email] = field(default_factory=list)
+    retry: List[Email] = field(default_factory=list)  # 4xx replies, dropped connections
+    failed: List[Email] = field(default_factory=list)  # 5xx replies, invalid addresses
+
+
+class TemporaryFailure(Exception):
+    pass
+
+
+class PermanentFailure(Exception):
+    pass
+
+
+@functools.lru_cache
+def mail_config():
+    """fastapi-mail connection settings built from Settings."""
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.mail_username,
+        MAIL_PASSWORD=settings.mail_password,
+        MAIL_FROM=settings.mail_from,
+        MAIL_FROM_NAME=settings.mail_from_name,
+        MAIL_PORT=settings.mail_port,
+        MAIL_SERVER=settings.mail_server,
+        MAIL_STARTTLS=settings.mail_starttls,
+        MAIL_SSL_TLS=settings.mail_ssl_tls,
+        USE_CREDENTIALS=bool(settings.mail_username),
+        SUPPRESS_SEND=int(settings.mail_suppress_send),
+        TEMPLATE_FOLDER=TEMPLATE_FOLDER,
+    )
+
+
+@functools.lru_cache
+def template_env():
+    """One Jinja environment per process, so each template compiles once.
+
+    Not fastapi-mail's ``template_engine()``: it builds a new Environment on
+    every call and leaves autoescaping off, while names and task titles in
+    the context are user-written.
+    """
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    return Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+
+
+def render_bodies(emails: List[Email]) -> List[str]:
+    """HTML body of each email, rendering each distinct template/context once."""
+    rendered = {}
+    bodies = []
+    for email in emails:
+        if email.template is None:
+            bodies.append(email.body or "")
+            continue
+        key = (email.template, json.dumps(email.context, sort_keys=True, default=str))
+        if key not in rendered:
+            rendered[key] = template_env().get_template(email.template).render(**email.context)
+        bodies.append(rendered[key])
+    return bodies
+
+
+async def build_message(email: Email, body: str):
+    """MIME message for one recipient."""
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.msg import MailMsg
+
+    config = mail_config()
+    schema = MessageSchema(recipients=[email.to], subject=email.subject, body=body, subtype=MessageType.html)
+    sender = f"{config.MAIL_FROM_NAME} <{config.MAIL_FROM}>" if config.MAIL_FROM_NAME else config.MAIL_FROM
+    return await MailMsg(schema)._message(sender)
+
+
+class PooledConnection:
+    """An SMTP session reopened when it drops, idles out or has sent enough."""
+
+    def __init__(self, config):
+        self.config = config
+        self.smtp = None
+        self.sent = 0
+        self.last_used = 0.0
+
+    async def _connect(self) -> None:
+        import aiosmtplib
+
+        await self.close()
+        self.smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            timeout=self.config.TIMEOUT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+        )
+        await self.smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await self.smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        self.sent = 0
+
+    async def send(self, message) -> None:
+        import aiosmtplib
+
+        stale = time.monotonic() - self.last_used > settings.mail_idle_timeout
+        if (self.smtp is None or not self.smtp.is_connected or stale
+                or self.sent >= settings.mail_max_messages_per_connection):
+            try:
+                await self._connect()
+            except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                # Unreachable server or rejected login: the message itself is
+                # fine, so it is retried rather than given up on
+                self.smtp = None
+                raise TemporaryFailure(f"Cannot connect to the mail server: {e}") from e
+        try:
+            await self.smtp.send_message(message)
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            code = min(refused.code for refused in e.recipients)
+            raise (PermanentFailure if code >= 500 else TemporaryFailure)(str(e)) from e
+        except aiosmtplib.SMTPResponseException as e:
+            raise (PermanentFailure if e.code >= 500 else TemporaryFailure)(str(e)) from e
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+            # Connection-level trouble: start over on the next message
+            self.smtp = None
+            raise TemporaryFailure(str(e)) from e
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    async def close(self) -> None:
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except Exception:
+                pass
+        self.smtp = None
+
+
+class SMTPPool:
+    """Up to ``size`` connections, shared by everything this process sends."""
+
+    def __init__(self, config, size: int):
+        self.connections = [PooledConnection(config) for _ in range(size)]
+
+    async def send_all(self, messages: list) -> List[Optional[Exception]]:
+        """Send ``messages`` across the pool; the error for each, or None."""
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        pending: Iterator[int] = iter(range(len(messages)))
+
+        async def drain(connection: PooledConnection):
+            for i in pending:
+                try:
+                    await connection.send(messages[i])
+                except (TemporaryFailure, PermanentFailure) as e:
+                    errors[i] = e
+                except Exception as e:
+                    # Never let one message abort its siblings' sends
+                    logger.exception("Unexpected error sending email")
+                    connection.smtp = None
+                    errors[i] = TemporaryFailure(str(e))
+
+        await asyncio.gather(*(drain(c) for c in self.connections[:max(1, len(messages))]))
+        return errors
+
+    async def close(self) -> None:
+        await asyncio.gather(*(c.close() for c in self.connections))
+
+
+async def send_batch(emails: List[Email], pool: Optional[SMTPPool] = None) -> BatchResult:
+    """Render, build and send ``emails``, sorting recipients by outcome."""
+    from fastapi_mail.fastmail import email_dispatched
+
+    result = BatchResult()
+    messages, ready = [], []
+    for email, body in zip(emails, render_bodies(emails)):
+        try:
+            messages.append(await build_message(email, body))
+            ready.append(email)
+        except ValueError as e:  # invalid address
+            logger.warning("Not sending email to %r: %s", email.to, e)
+            result.failed.append(email)
+
+    if mail_config().SUPPRESS_SEND:
+        errors = [None] * len(messages)
+    else:
+        errors = await (pool or process_pool()).send_all(messages)
+
+    for email, message, error in zip(ready, messages, errors):
+        if error is None:
+            result.sent.append(email)
+            email_dispatched.send(message)
+        elif isinstance(error, TemporaryFailure):
+            result.retry.append(email)
+        else:
+            logger.warning("Email to %s rejected: %s", email.to, error)
+            result.failed.append(email)
+    return result
+
+
+# Celery tasks are synchronous, so each worker process keeps one event loop
+# (and the pool bound to it) alive across tasks instead of asyncio.run()
+_loop = None
+_pool = None
+_pid = None
+
+
+def process_pool() -> SMTPPool:
+    global _pool
+    if _pool is None:
+        _pool = SMTPPool(mail_config(), settings.mail_pool_size)
+    return _pool
+
+
+def deliver(emails: List[Email]) -> BatchResult:
+    """Synchronous ``send_batch`` on this process's pooled connections."""
+    global _loop, _pool, _pid
+    if _loop is None or _pid != os.getpid():
+        # A forked child must not reuse its parent's sockets
+        _loop, _pool, _pid = asyncio.new_event_loop(), None, os.getpid()
+    return _loop.run_until_complete(send_batch(emails))
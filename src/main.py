@@ -1,16 +1,51 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
+from .compression import CompressionMiddleware
 from .config import settings
-from .database import engine, Base
+from .database import engine, async_engine, replica_engine, async_replica_engine, Base, ReadYourWritesMiddleware
+from .idempotency import IdempotencyMiddleware
 from .auth.api import router as auth_router
 from .chat.api import router as chat_router
-from .celery import celery_app
+from .health.api import router as health_router
+from .tasks.api import router as tasks_router
+from .metrics import MetricsMiddleware, render_metrics
+from .overload import LoadSheddingMiddleware, monitor
+from .profiling import QueryProfilerMiddleware
+from .responses import FastJSONResponse
+from .tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing the app never touches the database; schema changes are an
+    # explicit step (alembic) rather than something every worker does on boot
+    if settings.create_tables_on_startup:
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    if settings.tracing_enabled:
+        configure_tracing()
+    monitor.start()
+    yield
+    # /ready fails from here on, while requests in flight finish
+    await monitor.stop()
+    shutdown_tracing()
+    for sync_engine in (engine, replica_engine):
+        if sync_engine is not None:
+            sync_engine.dispose()
+    for aio_engine in (async_engine, async_replica_engine):
+        if aio_engine is not None:
+            await aio_engine.dispose()
 
-app = FastAPI(title="Anamny Health Tracker API", version="1.0.0")
+
+app = FastAPI(
+    title="Anamny Health Tracker API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,6 +55,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Inside compression, so replayed responses are negotiated afresh
+app.add_middleware(IdempotencyMiddleware)
+# Outside idempotency, so replayed responses carry no stale write marker
+app.add_middleware(ReadYourWritesMiddleware)
+if settings.query_profiler_enabled:
+    app.add_middleware(QueryProfilerMiddleware)
+if settings.tracing_enabled:
+    app.add_middleware(TracingMiddleware)
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+# Rejects before any other work is done, inside metrics so 503s are counted
+if settings.overload_shedding_enabled:
+    app.add_middleware(LoadSheddingMiddleware)
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -27,8 +77,10 @@ def read_root():
     return {"message": f"Welcome to {settings.name} API"}
 
 
+# Liveness and readiness are async so they answer without waiting for a
+# thread when the threadpool is saturated
 @app.get("/health")
-def health_check():
+async def health_check():
     return {
         "status": "healthy",
         "database": "connected",
@@ -36,14 +88,36 @@ def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    reason = monitor.readiness()
+    if reason is not None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = str(settings.overload_retry_after)
+    return {
+        "status": "ready" if reason is None else "unavailable",
+        "reason": reason,
+        "event_loop_lag": round(monitor.loop_lag(), 4),
+        "threadpool_queue": monitor.threadpool_queue(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(chat_router)
+app.include_router(health_router)
+app.include_router(tasks_router)
 
 # Add a test endpoint to trigger Celery tasks
 @app.post("/test-celery")
 def test_celery():
-    from .tasks import send_email_task
+    from .jobs import send_email_task
     
     # Trigger a background task
     task = send_email_task.delay(
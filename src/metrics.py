@@ -0,0 +1,275 @@
+"""Prometheus metrics for the API, the database, LLM calls and Celery.
+
+Labels are kept to bounded sets: route templates instead of raw paths,
+a fixed list of HTTP methods, pool names and model ids. When running several
+worker processes (``uvicorn --workers``, Celery prefork), set
+PROMETHEUS_MULTIPROC_DIR to a shared empty directory so every scrape sees the
+sum over all processes. Gauges of processes that have exited (crashed or
+restarted workers included) are dropped at the next scrape.
+"""
+import os
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+# Per-process files of livesum/livemax gauges, e.g. gauge_livesum_1234.db
+LIVE_GAUGE_FILE = re.compile(r"gauge_live\w+_(\d+)\.db$")
+
+# Password hashing
+password_logins_total = Counter(
+    "password_logins_total",
+    "Successful logins by stored hash scheme and whether the hash was rewritten.",
+    ["scheme", "status"],  # status: 'current' or 'rehashed'
+)
+
+# Database connection pool
+db_pool_checkout_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+db_pool_timeouts_total = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after db_pool_timeout.",
+    ["pool"],
+)
+db_pool_connections_in_use = Gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond db_pool_size.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+# Database queries
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds",
+    "Duration of individual SQL statements.",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while serving one request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+db_time_per_request_seconds = Histogram(
+    "db_time_per_request_seconds",
+    "Total SQL time while serving one request.",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# HTTP
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+http_requests_total = Counter(
+    "http_requests_total",
+    "Requests served, by route template and status code.",
+    ["method", "route", "status"],
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to finishing its response.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests currently being served.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+# Load shedding (see overload.py)
+event_loop_lag_seconds = Gauge(
+    "event_loop_lag_seconds",
+    "Worst event-loop lag over the recent window.",
+    multiprocess_mode="livemax",
+)
+threadpool_queue_depth = Gauge(
+    "threadpool_queue_depth",
+    "Calls waiting for a thread of the default threadpool.",
+    multiprocess_mode="livesum",
+)
+load_shed_total = Counter(
+    "load_shed_total",
+    "Requests rejected with 503 because the worker was saturated.",
+    ["reason"],  # 'loop_lag' or 'threadpool'
+)
+
+# Response compression
+http_compression_seconds = Histogram(
+    "http_compression_seconds",
+    "CPU time spent compressing one response body.",
+    ["route", "encoding"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+http_compression_bytes_total = Counter(
+    "http_compression_bytes_total",
+    "Response body bytes before and after compression.",
+    ["route", "encoding", "kind"],  # kind: 'original' or 'compressed'
+)
+
+# LLM calls
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+llm_request_duration_seconds = Histogram(
+    "llm_request_duration_seconds",
+    "Duration of model calls.",
+    ["model", "outcome"],  # outcome: 'ok' or 'error'
+    buckets=LLM_BUCKETS,
+)
+llm_time_to_first_token_seconds = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until the first token of a model response arrived.",
+    ["model"],
+    buckets=LLM_BUCKETS,
+)
+llm_errors_total = Counter(
+    "llm_errors_total",
+    "Failed model calls by exception type.",
+    ["model", "error"],
+)
+llm_routed_total = Counter(
+    "llm_routed_total",
+    "Chat messages by the model tier they were routed to, and why.",
+    ["tier", "reason"],  # reason: 'red_flag', 'complex', 'follow_up', 'default' or 'quota'
+)
+llm_tokens = Histogram(
+    "llm_tokens",
+    "Tokens per model call.",
+    ["model", "kind"],  # kind: 'prompt' or 'completion'
+    buckets=(16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
+
+# Health data
+health_readings_ingested_total = Counter(
+    "health_readings_ingested_total",
+    "Readings received by the ingestion API, by outcome.",
+    ["outcome"],  # 'accepted', 'duplicate' or 'rejected'
+)
+
+# Idempotency keys
+idempotency_requests_total = Counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome.",
+    ["outcome"],  # 'new', 'replayed', 'waited', 'conflict' or 'mismatch'
+)
+
+# Task reminders
+task_reminder_fire_lag_seconds = Histogram(
+    "task_reminder_fire_lag_seconds",
+    "Delay between a task reminder's due time and the scheduler firing it.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+# Celery
+celery_task_duration_seconds = Histogram(
+    "celery_task_duration_seconds",
+    "Runtime of Celery tasks.",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+
+
+@dataclass
+class RequestStats:
+    """Work attributed to the request currently being served."""
+
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    # (statement, seconds) pairs; only collected when a profiler sets a list
+    statements: Optional[List[Tuple[str, float]]] = None
+    # perf_counter() when the endpoint function returned
+    endpoint_done: Optional[float] = None
+
+
+# Set by MetricsMiddleware; copied into threadpool calls along with the context
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def route_label(scope: dict) -> str:
+    """Route template (``/chat/sessions/{session_id}``) the router matched."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and per-request SQL work."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method=method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            request_stats.reset(token)
+            route = route_label(scope)
+            http_requests_total.labels(method=method, route=route, status=str(status_code)).inc()
+            http_request_duration_seconds.labels(method=method, route=route).observe(elapsed)
+            db_queries_per_request.labels(route=route).observe(stats.db_queries)
+            db_time_per_request_seconds.labels(route=route).observe(stats.db_seconds)
+
+
+def _remove_dead_processes(path: str) -> None:
+    """Drop the live gauges of worker processes that are no longer running."""
+    pids = {int(match.group(1)) for match in map(LIVE_GAUGE_FILE.match, os.listdir(path)) if match}
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, path)
+        except PermissionError:
+            pass  # running, under another user
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose: merged across processes in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        _remove_dead_processes(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,123 @@
+"""Load shedding when a worker falls behind, and the readiness it reports.
+
+Two signals say a worker is saturated:
+
+* event-loop lag: a monitor task sleeps OVERLOAD_LAG_INTERVAL at a time and
+  records how late it wakes up. Sync work running on the loop (a blocking
+  call in an ``async def`` endpoint) shows up here, since nothing else runs
+  until it returns. The lag reported is the worst over the last
+  OVERLOAD_LAG_WINDOW seconds, or the current overdue tick if that is worse.
+* threadpool queue depth: ``def`` endpoints, ``run_in_threadpool`` calls and
+  the sync database sessions share anyio's default thread limiter; calls
+  waiting for one of its tokens are queued work the worker cannot start.
+
+Past OVERLOAD_MAX_LOOP_LAG or OVERLOAD_MAX_THREADPOOL_QUEUE,
+``LoadSheddingMiddleware`` answers requests with 503 and Retry-After before
+they reach the app, except for OVERLOAD_EXEMPT_PATHS (health, readiness,
+metrics, login), which stay served. ``/ready`` starts failing earlier, at
+OVERLOAD_READY_FRACTION of those thresholds, so load balancers route new
+traffic away before anything is shed.
+"""
+import asyncio
+from collections import deque
+from typing import Optional
+
+import anyio.to_thread
+
+from .config import settings
+from .metrics import event_loop_lag_seconds, load_shed_total, threadpool_queue_depth
+from .responses import FastJSONResponse
+
+
+class LoadMonitor:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._samples: deque = deque()
+        self._due: Optional[float] = None  # loop time of the next expected tick
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        window = max(1, int(settings.overload_lag_window / settings.overload_lag_interval))
+        self._samples = deque(maxlen=window)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._due = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._due = loop.time() + settings.overload_lag_interval
+            await asyncio.sleep(settings.overload_lag_interval)
+            self._samples.append(max(0.0, loop.time() - self._due))
+            event_loop_lag_seconds.set(self.loop_lag())
+            threadpool_queue_depth.set(self.threadpool_queue())
+
+    def loop_lag(self) -> float:
+        """Worst event-loop lag over the window, in seconds."""
+        lag = max(self._samples, default=0.0)
+        if self._due is not None:
+            # A tick that is overdue right now counts before it is recorded
+            lag = max(lag, asyncio.get_running_loop().time() - self._due)
+        return lag
+
+    def threadpool_queue(self) -> int:
+        """Calls waiting for a thread of the default limiter."""
+        return anyio.to_thread.current_default_thread_limiter().statistics().tasks_waiting
+
+    def overloaded(self, fraction: float = 1.0) -> Optional[str]:
+        """'loop_lag' or 'threadpool' past ``fraction`` of its threshold, else None."""
+        if self.loop_lag() >= settings.overload_max_loop_lag * fraction:
+            return "loop_lag"
+        if self.threadpool_queue() >= settings.overload_max_threadpool_queue * fraction:
+            return "threadpool"
+        return None
+
+    def readiness(self) -> Optional[str]:
+        """Why this worker should not get new traffic, or None if it should."""
+        if not self.running:
+            return "stopped"
+        return self.overloaded(settings.overload_ready_fraction)
+
+
+monitor = LoadMonitor()
+
+
+def _unavailable(detail: str) -> FastJSONResponse:
+    return FastJSONResponse(
+        {"detail": detail}, status_code=503,
+        headers={"Retry-After": str(settings.overload_retry_after)},
+    )
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware rejecting requests with 503 while the worker is
+    saturated (see the module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.exempt = set(settings.overload_exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        reason = monitor.overloaded()
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+        load_shed_total.labels(reason=reason).inc()
+        await _unavailable("Server is overloaded, retry later")(scope, receive, send)
@@ -0,0 +1,165 @@
+"""Per-request SQL profiling for development and staging.
+
+``QueryProfilerMiddleware`` records every statement a request runs, warns
+about N+1 patterns (the same statement repeated many times) and adds a
+``Server-Timing`` header splitting the request into db, llm and serialization
+time. ``assert_max_queries`` lets test suites pin a query budget per call.
+"""
+import functools
+import inspect
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from .config import settings
+from .metrics import RequestStats, request_stats, route_label
+
+logger = logging.getLogger(__name__)
+
+# Expanded IN lists vary in length; collapse them so they group together
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+
+
+def normalize_statement(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub("(...)", " ".join(statement.split()))
+
+
+def repeated_statements(statements: List[str], threshold: int) -> List[tuple[str, int]]:
+    """Statements run at least ``threshold`` times, most repeated first."""
+    counts = Counter(normalize_statement(statement) for statement in statements)
+    return [(statement, count) for statement, count in counts.most_common() if count >= threshold]
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that notes when the endpoint returns, so the time spent on
+    response validation and rendering can be reported as serialization."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed(*args, **kwargs):
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    _mark_endpoint_done()
+        else:
+            @functools.wraps(endpoint)
+            def timed(*args, **kwargs):
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    _mark_endpoint_done()
+
+        # The request handler looks the callable up per request
+        self.dependant.call = timed
+
+
+def _mark_endpoint_done() -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.endpoint_done = time.perf_counter()
+
+
+def server_timing(stats: RequestStats, total: float, now: float) -> str:
+    """``Server-Timing`` header value, durations in milliseconds."""
+    serialization = now - stats.endpoint_done if stats.endpoint_done else 0.0
+    return ", ".join([
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"',
+        f"llm;dur={stats.llm_seconds * 1000:.1f}",
+        f"ser;dur={serialization * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+class QueryProfilerMiddleware:
+    """ASGI middleware that records the SQL run by each request.
+
+    Install it inside MetricsMiddleware so both share the request's stats.
+    """
+
+    def __init__(self, app, threshold: int = None):
+        self.app = app
+        self.threshold = threshold or settings.n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        stats.statements = []
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, now - start, now).encode()))
+                headers.append((b"x-query-count", str(stats.db_queries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                request_stats.reset(token)
+            self.report(scope, stats)
+
+    def report(self, scope, stats: RequestStats) -> None:
+        route = f"{scope['method']} {route_label(scope)}"
+        for statement, seconds in stats.statements:
+            logger.debug("%s %.2fms %s", route, seconds * 1000, statement)
+        for statement, count in repeated_statements([s for s, _ in stats.statements], self.threshold):
+            logger.warning("Possible N+1 in %s: statement ran %d times: %s", route, count, statement)
+
+
+def _engines() -> list:
+    from .database import engine, replica_engine, async_engine, async_replica_engine
+
+    engines = [engine, async_engine.sync_engine]
+    if replica_engine is not None:
+        engines += [replica_engine, async_replica_engine.sync_engine]
+    return engines
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[List[str]]:
+    """Fail if the block runs more than ``n`` SQL statements.
+
+    Listens on the engines directly, so statements issued by a TestClient's
+    app thread count too. Yields the list of statements seen so far.
+
+        with assert_max_queries(3):
+            client.get("/chat/sessions", headers=auth)
+    """
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = _engines()
+    for engine in engines:
+        event.listen(engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "after_cursor_execute", record)
+
+    if len(statements) > n:
+        listing = "\n".join(f"  {i}. {normalize_statement(s)}" for i, s in enumerate(statements, 1))
+        raise AssertionError(f"{len(statements)} queries executed, expected at most {n}:\n{listing}")
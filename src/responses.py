@@ -0,0 +1,56 @@
+"""JSON responses rendered with orjson, and conditional GET helpers.
+
+``FastJSONResponse`` is the app's default response class. Endpoints on hot
+paths build plain dicts from projection queries and return the response
+directly, which skips response-model validation entirely; the output matches
+what Pydantic would produce (UTC datetimes end in ``Z``).
+
+ETags are computed from cheap version columns (``updated_at``, the latest
+message id) rather than by hashing the body, so a matching ``If-None-Match``
+is answered with 304 before the payload is loaded.
+"""
+import hashlib
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+# Per-user data: browsers and proxies may keep it but must revalidate each time
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z,
+        )
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag for a resource version given by ``parts``.
+
+    The parts are hashed so ids and timestamps don't leak into the header.
+    """
+    version = "|".join(str(part) for part in parts)
+    return '"' + hashlib.blake2b(version.encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match covers ``etag`` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE, "Vary": "Authorization"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
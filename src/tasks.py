@@ -1,35 +0,0 @@
-from celery import Celery
-from .celery import celery_app
-import logging
-
-logger = logging.getLogger(__name__)
-
-@celery_app.task
-def send_email_task(to: str, subject: str, body: str):
-    """
-    Background task to send emails
-    """
-    logger.info(f"Sending email to {to} with subject: {subject}")
-    # TODO: Implement actual email sending logic
-    # For now, just log the email
-    logger.info(f"Email body: {body}")
-    return f"Email sent to {to}"
-
-@celery_app.task
-def process_health_data_task(user_id: int, data: dict):
-    """
-    Background task to process health data
-    """
-    logger.info(f"Processing health data for user {user_id}")
-    # TODO: Implement health data processing logic
-    logger.info(f"Data: {data}")
-    return f"Health data processed for user {user_id}"
-
-@celery_app.task
-def daily_health_reminder_task():
-    """
-    Periodic task to send daily health reminders
-    """
-    logger.info("Sending daily health reminders")
-    # TODO: Implement reminder logic
-    return "Daily reminders sent"
\ No newline at end of file
@@ -1,18 +1,155 @@
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import settings
+from ..database import get_async_db, get_async_read_db
+from ..profiling import ProfiledRoute
+from ..auth.dependencies import get_current_active_user
+from ..auth.models import User
 from .crud import TaskCRUD
-from .models import Task, TaskCreate
+from .schemas import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskPage, TaskBulkCreate, TaskBulkComplete, TaskBulkCompleteResponse
+)
 
-router = APIRouter(prefix="/tasks")
+router = APIRouter(prefix="/tasks", tags=["tasks"], route_class=ProfiledRoute)
 
 
-@router.post("/create", response_model=Task)
-async def create_task(task_data: TaskCreate):
-    return TaskCRUD.create_task(task_data)
+def _check_bulk_size(count: int):
+    if count > settings.tasks_max_bulk:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.tasks_max_bulk} tasks per request"
+        )
 
 
-@router.get("/get_all", response_model=List[Task])
-async def get_tasks():
-    return TaskCRUD.get_all_tasks()
+@router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
+async def create_task(
+    task_data: TaskCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create a task."""
+    return await TaskCRUD.create_task(db, current_user.id, task_data)
+
+
+@router.post("/bulk", response_model=list[TaskResponse], status_code=status.HTTP_201_CREATED)
+async def create_tasks(
+    bulk: TaskBulkCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create many tasks at once, e.g. a whole medication schedule."""
+    _check_bulk_size(len(bulk.tasks))
+    return await TaskCRUD.create_tasks(db, current_user.id, bulk.tasks)
+
+
+@router.get("", response_model=TaskPage)
+async def list_tasks(
+    completed: Optional[bool] = False,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    limit: int = Query(settings.tasks_page_size, ge=1, le=settings.tasks_max_page_size),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """List open tasks (or completed ones with ``completed=true``) by deadline,
+    tasks without one last; pass ``next_cursor`` back as ``cursor`` for the
+    following page."""
+    try:
+        tasks, next_cursor = await TaskCRUD.list_tasks(
+            db, current_user.id, limit, completed=completed,
+            due_after=due_after, due_before=due_before, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    return TaskPage(items=tasks, next_cursor=next_cursor)
+
+
+@router.get("/due", response_model=TaskPage)
+async def list_due_tasks(
+    hours: float = Query(24, gt=0, le=24 * 366),
+    limit: int = Query(settings.tasks_page_size, ge=1, le=settings.tasks_max_page_size),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Open tasks due within the next ``hours`` hours, soonest first."""
+    now = datetime.now(timezone.utc)
+    try:
+        tasks, next_cursor = await TaskCRUD.list_tasks(
+            db, current_user.id, limit, completed=False,
+            due_after=now, due_before=now + timedelta(hours=hours), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    return TaskPage(items=tasks, next_cursor=next_cursor)
+
+
+@router.post("/complete", response_model=TaskBulkCompleteResponse)
+async def complete_tasks(
+    bulk: TaskBulkComplete,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Mark many tasks completed; ids that are unknown or already completed
+    are left out of the response."""
+    _check_bulk_size(len(bulk.ids))
+    return TaskBulkCompleteResponse(completed=await TaskCRUD.complete_tasks(db, current_user.id, bulk.ids))
+
+
+@router.get("/{task_id}", response_model=TaskResponse)
+async def get_task(
+    task_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a task."""
+    task = await TaskCRUD.get_task(db, task_id, current_user.id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return task
+
+
+@router.patch("/{task_id}", response_model=TaskResponse)
+async def update_task(
+    task_id: int,
+    task_data: TaskUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Update a task; setting ``completed`` stamps or clears ``completed_at``."""
+    task = await TaskCRUD.update_task(db, task_id, current_user.id, task_data)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return task
+
+
+@router.delete("/{task_id}")
+async def delete_task(
+    task_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Delete a task."""
+    if not await TaskCRUD.delete_task(db, task_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return {"message": "Task deleted successfully"}
@@ -1,14 +1,146 @@
-from typing import List
+"""Per-user tasks on an AsyncSession.
 
-from ..database import get_all_tasks, save_task
-from .models import Task, TaskCreate
+Lists are paginated by keyset on (deadline, id), deadlines first and tasks
+without one last, so every page is at most two range scans of
+``ix_tasks_user_id_completed_deadline`` however deep the client pages.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Task
+from .scheduler import next_fire_at
+from .schemas import TaskCreate, TaskUpdate
+
+
+def encode_cursor(task: Task) -> str:
+    key = [task.deadline.isoformat() if task.deadline else None, task.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Raises ValueError for a cursor this module did not produce."""
+    try:
+        deadline, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(deadline) if deadline else None), int(task_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
 
 
 class TaskCRUD:
     @staticmethod
-    def create_task(task_data: TaskCreate) -> Task:
-        return save_task(task_data)
+    async def create_task(db: AsyncSession, user_id: int, task_data: TaskCreate) -> Task:
+        task = Task(user_id=user_id, next_fire_at=next_fire_at(task_data.deadline, datetime.now(timezone.utc)),
+                    **task_data.model_dump())
+        db.add(task)
+        await db.commit()
+        await db.refresh(task)
+        return task
+
+    @staticmethod
+    async def create_tasks(db: AsyncSession, user_id: int, tasks: List[TaskCreate]) -> List[Task]:
+        """Insert many tasks with one multi-row statement."""
+        if not tasks:
+            return []
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            insert(Task).returning(Task),
+            [{"user_id": user_id, "completed": False, "next_fire_at": next_fire_at(task.deadline, now),
+              **task.model_dump()} for task in tasks],
+        )
+        created = list(result.scalars().all())
+        await db.commit()
+        return created
+
+    @staticmethod
+    async def get_task(db: AsyncSession, task_id: int, user_id: int) -> Optional[Task]:
+        result = await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user_id))
+        return result.scalars().first()
+
+    @staticmethod
+    async def list_tasks(
+        db: AsyncSession,
+        user_id: int,
+        limit: int,
+        completed: Optional[bool] = False,
+        due_after: Optional[datetime] = None,
+        due_before: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Task], Optional[str]]:
+        """One page of a user's tasks by deadline, and the cursor of the next
+        page (None on the last). ``completed=None`` lists open and completed."""
+        query = select(Task).where(Task.user_id == user_id)
+        if completed is not None:
+            query = query.where(Task.completed == completed)
+        if due_after is not None:
+            query = query.where(Task.deadline >= due_after)
+        if due_before is not None:
+            query = query.where(Task.deadline < due_before)
+        deadline, task_id = decode_cursor(cursor) if cursor else (None, None)
+
+        # Two range scans rather than one OR'd condition, which the index
+        # could only apply as a filter: tasks with a deadline past the
+        # cursor, then, once those run out, tasks without one
+        tasks = []
+        if deadline is not None or task_id is None:
+            dated = query.where(Task.deadline.is_not(None))
+            if deadline is not None:
+                dated = dated.where(tuple_(Task.deadline, Task.id) > (deadline, task_id))
+            result = await db.execute(dated.order_by(Task.deadline, Task.id).limit(limit + 1))
+            tasks = list(result.scalars().all())
+        if len(tasks) <= limit and due_after is None and due_before is None:
+            undated = query.where(Task.deadline.is_(None))
+            if deadline is None and task_id is not None:
+                undated = undated.where(Task.id > task_id)
+            result = await db.execute(undated.order_by(Task.id).limit(limit + 1 - len(tasks)))
+            tasks += result.scalars().all()
+        if len(tasks) > limit:
+            return tasks[:limit], encode_cursor(tasks[limit - 1])
+        return tasks, None
+
+    @staticmethod
+    async def update_task(db: AsyncSession, task_id: int, user_id: int, task_data: TaskUpdate) -> Optional[Task]:
+        task = await TaskCRUD.get_task(db, task_id, user_id)
+        if not task:
+            return None
+        now = datetime.now(timezone.utc)
+        changes = task_data.model_dump(exclude_unset=True)
+        rescheduled = "deadline" in changes and changes["deadline"] != task.deadline
+        if "completed" in changes and changes["completed"] != task.completed:
+            task.completed_at = now if changes["completed"] else None
+            rescheduled = True
+        for field, value in changes.items():
+            setattr(task, field, value)
+        if rescheduled:
+            # Also drops any scheduler's claim, so the new time is picked up
+            task.next_fire_at = None if task.completed else next_fire_at(task.deadline, now)
+            task.fire_lease_until = None
+        await db.commit()
+        await db.refresh(task)
+        return task
+
+    @staticmethod
+    async def complete_tasks(db: AsyncSession, user_id: int, task_ids: List[int]) -> List[int]:
+        """Mark open tasks among ``task_ids`` completed; returns their ids."""
+        if not task_ids:
+            return []
+        result = await db.execute(
+            update(Task)
+            .where(Task.user_id == user_id, Task.id.in_(task_ids), Task.completed == False)
+            .values(completed=True, completed_at=datetime.now(timezone.utc), next_fire_at=None, fire_lease_until=None)
+            .returning(Task.id)
+            .execution_options(synchronize_session=False)
+        )
+        completed = sorted(result.scalars().all())
+        await db.commit()
+        return completed
 
     @staticmethod
-    def get_all_tasks() -> List[Task]:
-        return get_all_tasks()
+    async def delete_task(db: AsyncSession, task_id: int, user_id: int) -> bool:
+        result = await db.execute(delete(Task).where(Task.id == task_id, Task.user_id == user_id))
+        await db.commit()
+        return result.rowcount > 0
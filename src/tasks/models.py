@@ -1,17 +1,33 @@
-from datetime import datetime
-from typing import Optional
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, text
+from sqlalchemy.sql import func
 
-from pydantic import BaseModel
+from ..database import Base
 
 
-class TaskCreate(BaseModel):
-    title: str
-    deadline: Optional[datetime] = None
-    description: str
+class Task(Base):
+    """A user's to-do item, e.g. taking a medication or booking a follow-up test."""
 
+    __tablename__ = "tasks"
+    __table_args__ = (
+        # Per-user listing in deadline order and "due in the next N hours":
+        # both are a range scan of this index, with id as the keyset tiebreak
+        Index("ix_tasks_user_id_completed_deadline", "user_id", "completed", "deadline", "id"),
+        # Reminders still to send, across all users, for the scheduler's claims
+        Index("ix_tasks_next_fire_at", "next_fire_at",
+              postgresql_where=text("next_fire_at IS NOT NULL"), sqlite_where=text("next_fire_at IS NOT NULL")),
+    )
 
-class Task(BaseModel):
-    id: int
-    title: str
-    description: str
-    completed: bool
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    category = Column(String(32), nullable=False, default="todo")  # todo, medication, follow_up_test
+    deadline = Column(DateTime(timezone=True), nullable=True)
+    completed = Column(Boolean, nullable=False, default=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    # When the deadline reminder is due; cleared once it is sent, or when the task is completed
+    next_fire_at = Column(DateTime(timezone=True), nullable=True)
+    # Claimed by a scheduler until then (see tasks.scheduler)
+    fire_lease_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,208 @@
+"""Deadline reminders for tasks, fired on time without polling the table.
+
+Every open task with a future deadline carries ``next_fire_at``, its
+deadline less TASK_REMINDER_LEAD, covered by the partial index
+``ix_tasks_next_fire_at``. A beat tick every TASK_SCHEDULER_RUN_SECONDS
+starts ``run_scheduler`` on a worker of the scheduler queue, which for that
+long:
+
+1. every TASK_SCHEDULER_POLL_SECONDS claims the reminders due within
+   TASK_SCHEDULER_HORIZON that no other scheduler holds, stamping
+   ``fire_lease_until`` (the rows are picked ``FOR UPDATE SKIP LOCKED`` on
+   PostgreSQL, so concurrent schedulers never wait on each other);
+2. keeps what it claimed in a min-heap by fire time and sleeps until the
+   earliest entry or the next poll;
+3. fires everything due with one UPDATE that clears ``next_fire_at`` of the
+   rows still due, and dispatches only the rows it cleared, in batches.
+
+The UPDATE in step 3 is what makes a reminder fire at most once: a task
+whose deadline moved or that was completed meanwhile no longer matches, and
+if a lease expired and two schedulers hold the same task only one of them
+clears it. On exit a scheduler releases the leases of reminders that did
+not come due; one that dies leaves leases that expire after
+TASK_SCHEDULER_LEASE seconds.
+"""
+import heapq
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from ..auth.models import User
+from ..config import settings
+from ..mailer import Email
+from ..metrics import task_reminder_fire_lag_seconds
+from .models import Task
+
+
+def _as_utc(at: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are UTC
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at
+
+
+def _at(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+def next_fire_at(deadline: Optional[datetime], now: datetime) -> Optional[datetime]:
+    """When to remind about a task due at ``deadline``: TASK_REMINDER_LEAD
+    before it (at once if that has passed), or never once the deadline has."""
+    if deadline is None or _as_utc(deadline) <= now:
+        return None
+    return max(_as_utc(deadline) - timedelta(seconds=settings.task_reminder_lead), now)
+
+
+def claim(db: Session, now: float, limit: int) -> List[Tuple[float, int]]:
+    """Lease unclaimed reminders due within the horizon; (fire time, task id)."""
+    claimable = (
+        select(Task.id)
+        .where(
+            Task.next_fire_at <= _at(now + settings.task_scheduler_horizon),
+            or_(Task.fire_lease_until.is_(None), Task.fire_lease_until < _at(now)),
+        )
+        .order_by(Task.next_fire_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(Task)
+        .where(Task.id.in_(claimable.scalar_subquery()))
+        .values(fire_lease_until=_at(now + settings.task_scheduler_lease))
+        .returning(Task.next_fire_at, Task.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return [(_as_utc(fire_at).timestamp(), task_id) for fire_at, task_id in rows]
+
+
+def fire(db: Session, task_ids: List[int], now: float) -> List[int]:
+    """Clear the reminders of ``task_ids`` that are still due; returns the
+    ids cleared, which are the ones to send."""
+    if not task_ids:
+        return []
+    fired = db.execute(
+        update(Task)
+        .where(Task.id.in_(task_ids), Task.next_fire_at <= _at(now))
+        .values(next_fire_at=None, fire_lease_until=None)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return fired
+
+
+def release(db: Session, task_ids: Iterable[int]) -> None:
+    """Give up the leases on reminders this scheduler will not fire."""
+    task_ids = list(task_ids)
+    if task_ids:
+        db.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids))
+            .values(fire_lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+
+class Scheduler:
+    """Claimed reminders of the near horizon in a min-heap of (fire time, id).
+
+    ``dispatch`` receives the ids of fired reminders, at most
+    TASK_REMINDER_BATCH_SIZE at a time.
+    """
+
+    def __init__(self, db: Session, dispatch: Callable[[List[int]], None],
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.db = db
+        self.dispatch = dispatch
+        self.clock = clock
+        self.sleep = sleep
+        self.heap: List[Tuple[float, int]] = []
+        self.claimed: Dict[int, float] = {}
+
+    def refill(self, now: float) -> int:
+        claimed = claim(self.db, now, settings.task_scheduler_claim_limit)
+        for fire_at, task_id in claimed:
+            # A task claimed again had its deadline edited, which dropped the
+            # lease; its older heap entry is skipped when popped
+            if self.claimed.get(task_id) != fire_at:
+                heapq.heappush(self.heap, (fire_at, task_id))
+                self.claimed[task_id] = fire_at
+        return len(claimed)
+
+    def fire_due(self, now: float) -> int:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, task_id = heapq.heappop(self.heap)
+            if self.claimed.get(task_id) == fire_at:
+                due.append(task_id)
+        if not due:
+            return 0
+        fired = fire(self.db, due, now)
+        for task_id in fired:
+            task_reminder_fire_lag_seconds.observe(max(0.0, now - self.claimed[task_id]))
+        for task_id in due:
+            del self.claimed[task_id]
+        size = settings.task_reminder_batch_size
+        for i in range(0, len(fired), size):
+            self.dispatch(fired[i:i + size])
+        return len(fired)
+
+    def run(self, seconds: float) -> int:
+        """Claim and fire reminders for ``seconds``; returns how many fired."""
+        end = self.clock() + seconds
+        next_poll = 0.0
+        fired = 0
+        try:
+            while True:
+                now = self.clock()
+                if now >= next_poll:
+                    self.refill(now)
+                    next_poll = now + settings.task_scheduler_poll_seconds
+                fired += self.fire_due(now)
+                if now >= end:
+                    return fired
+                wake = min(next_poll, end, self.heap[0][0] if self.heap else end)
+                self.sleep(max(0.0, wake - self.clock()))
+        finally:
+            self.db.rollback()
+            release(self.db, self.claimed)
+
+
+def run_scheduler(db: Session, dispatch: Callable[[List[int]], None]) -> int:
+    return Scheduler(db, dispatch).run(settings.task_scheduler_run_seconds)
+
+
+def _local(at: datetime, user: User) -> datetime:
+    try:
+        return _as_utc(at).astimezone(ZoneInfo(user.timezone or "UTC"))
+    except (ZoneInfoNotFoundError, ValueError):
+        return _as_utc(at)
+
+
+def task_reminder_emails(db: Session, task_ids: List[int]) -> List[Email]:
+    """Reminder emails for the fired tasks that are still open."""
+    rows = db.execute(
+        select(Task, User)
+        .join(User, User.id == Task.user_id)
+        .where(Task.id.in_(task_ids), Task.completed == False, User.is_active == True)
+    ).all()
+    return [
+        Email(
+            to=user.email,
+            # No CR/LF from the title may reach the header
+            subject=f"Reminder: {' '.join(task.title.split())}",
+            template="task_reminder.html",
+            context={
+                "name": user.full_name or user.username,
+                "app_name": settings.name,
+                "title": task.title,
+                "description": task.description,
+                "due": _local(task.deadline, user).strftime("%H:%M on %d %B") if task.deadline else None,
+            },
+        )
+        for task, user in rows
+    ]
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator
+
+TaskCategory = Literal["todo", "medication", "follow_up_test"]
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Deadlines without an offset are taken as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# Task Schemas
+class TaskBase(BaseModel):
+    title: str = Field(min_length=1, max_length=255)
+    description: Optional[str] = None
+    category: TaskCategory = "todo"
+    deadline: Optional[datetime] = None
+
+    @field_validator("deadline")
+    @classmethod
+    def deadline_as_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return _as_utc(value)
+
+
+class TaskCreate(TaskBase):
+    pass
+
+
+class TaskUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    description: Optional[str] = None
+    category: Optional[TaskCategory] = None
+    deadline: Optional[datetime] = None
+    completed: Optional[bool] = None
+
+    @field_validator("title", "category", "completed")
+    @classmethod
+    def not_null(cls, value):
+        # Optional only so they can be left out; the columns are NOT NULL
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+    @field_validator("deadline")
+    @classmethod
+    def deadline_as_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return _as_utc(value)
+
+
+class TaskResponse(TaskBase):
+    id: int
+    completed: bool
+    completed_at: Optional[datetime] = None
+    next_fire_at: Optional[datetime] = None  # when the deadline reminder will be sent
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TaskPage(BaseModel):
+    items: List[TaskResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+
+# Bulk Schemas
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate]
+
+
+class TaskBulkComplete(BaseModel):
+    ids: List[int]
+
+
+class TaskBulkCompleteResponse(BaseModel):
+    completed: List[int]  # ids that were open and are now completed
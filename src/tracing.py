@@ -0,0 +1,184 @@
+"""Distributed tracing for requests, SQL, model calls and Celery tasks.
+
+Spans go through the OpenTelemetry API; ``configure_tracing`` installs the SDK
+with an offline exporter (console, JSON-lines file or in-memory) and a
+parent-based ratio sampler. Until it runs, every span is a no-op.
+"""
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+
+from .config import settings
+from .metrics import route_label
+
+tracer = trace.get_tracer("anamny")
+
+# Statements are truncated so huge bulk inserts don't bloat spans
+MAX_STATEMENT_LENGTH = 2000
+
+
+def configure_tracing(exporter=None):
+    """Install the SDK tracer provider and return its exporter.
+
+    ``exporter`` overrides TRACING_EXPORTER, e.g. an InMemorySpanExporter in
+    tests; in-memory and explicit exporters are flushed synchronously.
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+    )
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    synchronous = exporter is not None
+    if exporter is None:
+        if settings.tracing_exporter == "memory":
+            exporter, synchronous = InMemorySpanExporter(), True
+        elif settings.tracing_exporter == "file":
+            exporter = ConsoleSpanExporter(
+                out=open(settings.tracing_file_path, "a", encoding="utf-8"),
+                formatter=lambda span: span.to_json(indent=None) + "\n",
+            )
+        else:
+            exporter = ConsoleSpanExporter()
+    processor = SimpleSpanProcessor(exporter) if synchronous else BatchSpanProcessor(exporter)
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+
+    from .database import engine, replica_engine, async_engine, async_replica_engine
+
+    for db_engine in (engine, replica_engine, async_engine, async_replica_engine):
+        if db_engine is not None:
+            trace_engine(getattr(db_engine, "sync_engine", db_engine))
+    return exporter
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans; a no-op when the SDK was never installed."""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def trace_engine(engine) -> None:
+    """Wrap every statement ``engine`` runs in a client span."""
+    if getattr(engine, "_traced", False):
+        return
+    engine._traced = True
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_span(conn, cursor, statement, parameters, ctx, executemany):
+        span = tracer.start_span(
+            "db.query",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": system,
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            },
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_span(conn, cursor, statement, parameters, ctx, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_span(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request.
+
+    Continues a trace from an incoming ``traceparent`` header if present.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent = propagate.extract(carrier)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            scope["method"], context=parent, kind=SpanKind.SERVER,
+            attributes={"http.request.method": scope["method"]},
+        ) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_label(scope)
+                span.update_name(f"{scope['method']} {route}")
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
+
+
+# Celery: the publishing side injects the trace context into the message
+# headers, and the worker continues it around the task run.
+_task_spans = {}
+
+
+def _inject_task_context(sender=None, headers=None, **kwargs):
+    if headers is None:
+        return
+    with tracer.start_as_current_span(f"celery.publish {sender}", kind=SpanKind.PRODUCER):
+        propagate.inject(headers)
+
+
+def _start_task_span(task_id=None, task=None, **kwargs):
+    carrier = {key: getattr(task.request, key, None) for key in propagate.get_global_textmap().fields}
+    parent = propagate.extract({k: v for k, v in carrier.items() if v})
+    span = tracer.start_span(
+        f"celery.run {task.name}", context=parent, kind=SpanKind.CONSUMER,
+        attributes={"celery.task_name": task.name, "celery.task_id": task_id},
+    )
+    token = context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token)
+
+
+def _end_task_span(task_id=None, state=None, **kwargs):
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    span.set_attribute("celery.state", state or "UNKNOWN")
+    if state == "FAILURE":
+        span.set_status(Status(StatusCode.ERROR))
+    span.end()
+    context.detach(token)
+
+
+def connect_celery_tracing() -> None:
+    """Hook trace propagation into Celery's publish and run signals."""
+    from celery.signals import before_task_publish, task_prerun, task_postrun
+
+    before_task_publish.connect(_inject_task_context, weak=False)
+    task_prerun.connect(_start_task_span, weak=False)
+    task_postrun.connect(_end_task_span, weak=False)
+
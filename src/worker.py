@@ -0,0 +1,38 @@
+"""Start a Celery worker for one queue with that queue's pool settings.
+
+    python -m src.worker interactive
+    python -m src.worker email -- --loglevel=debug
+
+Concurrency and prefetch come from CELERY_QUEUE_CONCURRENCY and
+CELERY_QUEUE_PREFETCH; anything after ``--`` goes to ``celery worker``.
+"""
+import argparse
+from typing import List
+
+from .celery import QUEUES, celery_app
+from .config import settings
+
+
+def worker_argv(queue: str, extra: List[str] = ()) -> List[str]:
+    """``celery worker`` arguments for a worker consuming only ``queue``."""
+    return [
+        "worker",
+        "--queues", queue,
+        "--hostname", f"{queue}@%h",
+        "--concurrency", str(settings.celery_queue_concurrency.get(queue, 1)),
+        "--prefetch-multiplier", str(settings.celery_queue_prefetch.get(queue, 1)),
+        *extra,
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("queue", choices=QUEUES)
+    parser.add_argument("extra", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    extra = args.extra[1:] if args.extra[:1] == ["--"] else args.extra
+    celery_app.worker_main(worker_argv(args.queue, extra))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+# Settings are read when src is first imported: point the app at a scratch
+# SQLite database and the offline model before that happens
+_scratch = tempfile.mkdtemp(prefix="anamny-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/test.db"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["CELERY_BROKER_URL"] = "memory://"
+os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+os.environ["EMBEDDING_INDEX_DIR"] = f"{_scratch}/embeddings"
+# Traces every request; spans are kept in memory rather than printed
+os.environ["TRACING_ENABLED"] = "true"
+os.environ["TRACING_EXPORTER"] = "memory"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.database import Base, SessionLocal, engine  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.auth.utils import create_access_token  # noqa: E402
+from src.chat.models import ChatMessage, ChatSession  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from src.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user():
+    db = SessionLocal()
+    try:
+        count = db.query(User).count()
+        user = User(email=f"user{count}@example.com", username=f"user{count}", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def auth(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+
+@pytest.fixture
+def chat_history(user):
+    """Three sessions of four messages each for ``user``."""
+    db = SessionLocal()
+    try:
+        for i in range(3):
+            session = ChatSession(user_id=user.id, title=f"Session {i}")
+            db.add(session)
+            db.flush()
+            db.add_all(
+                ChatMessage(session_id=session.id, content=f"Message {j}", is_user_message=j % 2 == 0)
+                for j in range(4)
+            )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,77 @@
+import pytest
+
+from src.chat.fake_model import DEFAULT_REPLY, count_tokens
+from src.chat.models import LLMUsage
+from src.config import settings
+from src.database import SessionLocal
+
+MODELS = settings.llm_tier_models
+
+
+def send(client, auth, message, session_id=None):
+    return client.post("/chat/message", json={"message": message, "session_id": session_id}, headers=auth)
+
+
+def test_replies_record_the_model_token_counts(client, auth):
+    message = "What should I eat before a morning run?"
+    reply = send(client, auth, message).json()["ai_message"]
+    assert reply["completion_tokens"] == count_tokens(DEFAULT_REPLY)
+    # The prompt holds the instructions as well as the message
+    assert reply["prompt_tokens"] > count_tokens(message)
+
+
+def test_usage_is_summed_per_user_and_day(client, auth, user):
+    replies = [send(client, auth, f"Question number {i} about my diet").json()["ai_message"] for i in range(2)]
+
+    db = SessionLocal()
+    try:
+        rows = db.query(LLMUsage).filter(LLMUsage.user_id == user.id).all()
+    finally:
+        db.close()
+    assert len(rows) == 1
+    assert rows[0].requests == 2
+    assert rows[0].prompt_tokens == sum(reply["prompt_tokens"] for reply in replies)
+    assert rows[0].completion_tokens == sum(reply["completion_tokens"] for reply in replies)
+
+    usage = client.get("/chat/usage", headers=auth).json()
+    assert usage["tokens_today"] == rows[0].prompt_tokens + rows[0].completion_tokens
+    assert usage["days"][0]["requests"] == 2
+
+
+def test_quota_exceeded_is_a_429_with_retry_after(client, auth, monkeypatch):
+    send(client, auth, "How much water should I drink a day?")
+    used = client.get("/chat/usage", headers=auth).json()["tokens_today"]
+    monkeypatch.setattr(settings, "llm_daily_token_quota", used)
+
+    response = send(client, auth, "And how much coffee is too much?")
+    assert response.status_code == 429
+    assert 0 < int(response.headers["retry-after"]) <= 86401
+    assert client.get("/chat/usage", headers=auth).json()["remaining_today"] == 0
+
+
+@pytest.mark.parametrize("message, model", [
+    ("I have had chest pain since this morning", MODELS["strong"]),
+    ("Fever of 38.5 c for 3 days with a cough and a headache", MODELS["strong"]),
+    ("What should I eat for breakfast?", MODELS["standard"]),
+])
+def test_new_conversations_are_routed_by_content(client, auth, message, model):
+    assert send(client, auth, message).json()["ai_message"]["ai_model"] == model
+
+
+def test_short_follow_ups_go_to_the_light_tier(client, auth):
+    session_id = send(client, auth, "What should I eat for breakfast?").json()["session"]["id"]
+    assert send(client, auth, "thanks, and for lunch?", session_id).json()["ai_message"]["ai_model"] == MODELS["light"]
+    # A follow-up with symptoms is not light
+    reply = send(client, auth, "my stomach ache is back", session_id).json()["ai_message"]
+    assert reply["ai_model"] == MODELS["standard"]
+
+
+def test_users_near_their_quota_get_the_light_tier_except_for_red_flags(client, auth, monkeypatch):
+    send(client, auth, "How long should I sleep each night?")
+    used = client.get("/chat/usage", headers=auth).json()["tokens_today"]
+    # Past the light fraction, with room for more calls
+    monkeypatch.setattr(settings, "llm_daily_token_quota", 10 * used)
+    monkeypatch.setattr(settings, "llm_quota_light_fraction", 0.1)
+
+    assert send(client, auth, "What should I eat for breakfast?").json()["ai_message"]["ai_model"] == MODELS["light"]
+    assert send(client, auth, "I fainted at work today").json()["ai_message"]["ai_model"] == MODELS["strong"]
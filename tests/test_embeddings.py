@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import func
+
+from src.chat import embeddings
+from src.chat.models import ChatMessage, ChatSession
+from src.database import SessionLocal
+from src.jobs import backfill_embeddings_task, embed_messages_task
+
+
+@pytest.fixture(autouse=True)
+def watermark_at_latest_message():
+    """Backfill only this test's messages, not other tests' new ones."""
+    db = SessionLocal()
+    try:
+        latest = db.query(func.max(ChatMessage.id)).scalar() or 0
+    finally:
+        db.close()
+    with embeddings.Watermark() as watermark:
+        watermark.advance(latest)
+
+
+def add_messages(user, contents, age=timedelta(hours=1)):
+    db = SessionLocal()
+    try:
+        session = ChatSession(user_id=user.id, title="History")
+        db.add(session)
+        db.flush()
+        messages = [
+            ChatMessage(session_id=session.id, content=content, is_user_message=True,
+                        created_at=datetime.now(timezone.utc) - age)
+            for content in contents
+        ]
+        db.add_all(messages)
+        db.commit()
+        return [message.id for message in messages]
+    finally:
+        db.close()
+
+
+def indexed(user):
+    return embeddings.load(user.id)["id"].tolist()
+
+
+def test_backfill_indexes_missed_and_older_messages(user):
+    old = add_messages(user, [f"My blood pressure reading number {i} was high" for i in range(5)])
+    short = add_messages(user, ["thanks!"])
+    # One of them already went through the live queue
+    embed_messages_task(old[:1])
+
+    backfill_embeddings_task()
+    assert sorted(indexed(user)) == old
+    assert short[0] not in indexed(user)
+
+    # Nothing is indexed twice on the next run
+    backfill_embeddings_task()
+    assert sorted(indexed(user)) == old
+
+
+def test_backfill_leaves_new_messages_to_the_queue(user):
+    recent = add_messages(user, ["I started a new medication this morning"], age=timedelta(seconds=0))
+    later = add_messages(user, ["An older import that got a later id"])
+    backfill_embeddings_task()
+    assert indexed(user) == []
+
+    # Still picked up once they are old enough
+    db = SessionLocal()
+    try:
+        db.query(ChatMessage).filter(ChatMessage.id.in_(recent)).update(
+            {"created_at": datetime.now(timezone.utc) - timedelta(hours=1)}
+        )
+        db.commit()
+    finally:
+        db.close()
+    # The watermark stopped short of them
+    backfill_embeddings_task()
+    assert indexed(user) == recent + later
+    assert np.isclose(np.linalg.norm(embeddings.load(user.id)["vector"][0]), 1.0)
+
+
+def test_backfill_skips_while_another_run_holds_the_watermark(user):
+    add_messages(user, ["Sleeping badly since the dose was raised"])
+    with embeddings.Watermark():
+        backfill_embeddings_task()
+    assert indexed(user) == []
@@ -0,0 +1,30 @@
+from src.config import settings
+
+
+def test_replays_a_completed_response(client, auth):
+    headers = {**auth, "Idempotency-Key": "replay"}
+    first = client.post("/chat/message", json={"message": "Hello there"}, headers=headers)
+    second = client.post("/chat/message", json={"message": "Hello there"}, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
+
+
+def test_different_body_is_rejected(client, auth):
+    headers = {**auth, "Idempotency-Key": "mismatch"}
+    client.post("/chat/message", json={"message": "Hello there"}, headers=headers)
+    response = client.post("/chat/message", json={"message": "Something else"}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_model_failure_is_not_replayed(client, auth, monkeypatch):
+    headers = {**auth, "Idempotency-Key": "model-down"}
+    monkeypatch.setattr(settings, "fake_llm_failure_rate", 1.0)
+    failed = client.post("/chat/message", json={"message": "Hello there"}, headers=headers)
+    assert failed.json()["ai_message"]["ai_model"] == "error"
+
+    monkeypatch.setattr(settings, "fake_llm_failure_rate", 0.0)
+    retried = client.post("/chat/message", json={"message": "Hello there"}, headers=headers)
+    assert "idempotent-replayed" not in retried.headers
+    assert retried.json()["ai_message"]["ai_model"] != "error"
@@ -0,0 +1,40 @@
+from src.mailer import Email, render_bodies
+
+HOSTILE = "<script>alert(1)</script>"
+
+
+def test_daily_reminder_escapes_names():
+    body, = render_bodies([Email(
+        to="a@example.com", subject="Check-in", template="daily_reminder.html",
+        context={"name": HOSTILE, "app_name": "Anamny", "anomalies": [HOSTILE]},
+    )])
+    assert HOSTILE not in body
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in body
+
+
+def test_plain_bodies_are_sent_as_given():
+    body, = render_bodies([Email(to="a@example.com", subject="Hi", body="<p>Hello</p>")])
+    assert body == "<p>Hello</p>"
+
+
+def test_task_reminder_escapes_title_and_description(user):
+    from datetime import datetime, timedelta, timezone
+
+    from src.database import SessionLocal
+    from src.tasks.models import Task
+    from src.tasks.scheduler import task_reminder_emails
+
+    db = SessionLocal()
+    try:
+        task = Task(user_id=user.id, title=f"Pills\r\nBcc: x@example.com {HOSTILE}", description=HOSTILE,
+                    deadline=datetime.now(timezone.utc) + timedelta(hours=1))
+        db.add(task)
+        db.commit()
+        email, = task_reminder_emails(db, [task.id])
+    finally:
+        db.close()
+
+    assert "\r" not in email.subject and "\n" not in email.subject
+    body, = render_bodies([email])
+    assert HOSTILE not in body
+    assert body.count("&lt;script&gt;alert(1)&lt;/script&gt;") == 3  # heading, sentence, description
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+from src.metrics import render_metrics
+
+REPORT_LAG = "from src.metrics import event_loop_lag_seconds; event_loop_lag_seconds.set({}); {}"
+
+
+def test_loop_lag_of_exited_workers_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    # A worker that saw a large lag and then exited, and one still running
+    subprocess.run([sys.executable, "-c", REPORT_LAG.format(9.0, "")], check=True, env=os.environ)
+    running = subprocess.Popen(
+        [sys.executable, "-c", REPORT_LAG.format(0.25, "print(flush=True); input()")],
+        env=os.environ, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        running.stdout.readline()
+        lines = render_metrics()[0].decode().splitlines()
+    finally:
+        running.communicate("")
+    assert "event_loop_lag_seconds 0.25" in lines
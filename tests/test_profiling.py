@@ -0,0 +1,31 @@
+import pytest
+
+from src.profiling import assert_max_queries, normalize_statement, repeated_statements
+
+
+def test_session_list_query_budget(client, auth, chat_history):
+    # User, list version, sessions, message counts: the same for any number
+    # of sessions
+    with assert_max_queries(4) as statements:
+        response = client.get("/chat/sessions", headers=auth)
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+    assert len(statements) == 4
+
+
+def test_over_budget_fails_with_statements(client, auth, chat_history):
+    with pytest.raises(AssertionError, match="4 queries executed, expected at most 2"):
+        with assert_max_queries(2):
+            client.get("/chat/sessions", headers=auth)
+
+
+def test_in_lists_group_together():
+    statements = [
+        "SELECT * FROM chat_messages WHERE session_id IN (?, ?)",
+        "SELECT * FROM chat_messages WHERE session_id IN (?, ?, ?)",
+        "SELECT * FROM users WHERE id = ?",
+    ]
+    assert normalize_statement(statements[0]) == normalize_statement(statements[1])
+    assert repeated_statements(statements, 2) == [
+        ("SELECT * FROM chat_messages WHERE session_id IN (...)", 2)
+    ]
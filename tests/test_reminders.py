@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+def fan_out(users: int) -> dict:
+    """Runs the reminder benchmark in its own process and scratch database."""
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.reminders", "--users", str(users)],
+        env=env, capture_output=True, text=True, check=False,
+    )
+    assert result.returncode in (0, 1), result.stderr
+    return json.loads(result.stdout)
+
+
+def test_resumed_and_redelivered_batches_remind_everyone_once():
+    results = fan_out(20_000)
+    assert results["resumed_runs"]
+    assert results["reminded_twice"] == 0
+    assert results["missed"] == 0
+
+
+@pytest.mark.slow
+def test_memory_stays_bounded_with_a_million_users():
+    small, large = fan_out(20_000), fan_out(1_000_000)
+    assert large["reminded_twice"] == large["missed"] == 0
+    # Fan-out holds one group of batches at a time, whatever the user count
+    assert large["heap_peak_mb"] < 2 * small["heap_peak_mb"]
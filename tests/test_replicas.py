@@ -0,0 +1,102 @@
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, MetaData, Table, Text, create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from src.config import settings
+from src.database import ReadYourWritesMiddleware, ReplicaRouter, RoutingSession
+
+notes = Table("notes", MetaData(), Column("body", Text))
+
+
+def database(path, name):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (body TEXT)"))
+        conn.execute(text("INSERT INTO notes VALUES (:name)"), {"name": name})
+    return engine
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """Builds a worker process's session factory over the same two databases."""
+    monkeypatch.setattr(settings, "database_replica_url", f"sqlite:///{tmp_path}/replica.db")
+    primary = database(tmp_path / "primary.db", "primary")
+    replica = database(tmp_path / "replica.db", "replica")
+
+    def build(replica_engine=replica):
+        session_class = type("WorkerSession", (RoutingSession,), {"router": ReplicaRouter(primary, replica_engine)})
+        return sessionmaker(class_=session_class, autoflush=False, bind=primary)
+
+    return build
+
+
+def app_for(session_factory):
+    """Endpoints of one worker process: a write, and a read of which database served it."""
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    def read_db(request: Request):
+        with session_factory(info={"request_state": request.state, "read_only": True}) as db:
+            yield db
+
+    def write_db(request: Request):
+        with session_factory(info={"request_state": request.state}) as db:
+            yield db
+
+    def authenticate(request: Request):
+        request.state.principal = request.headers["user"]
+
+    @app.post("/notes", dependencies=[Depends(authenticate)])
+    def write(db=Depends(write_db)):
+        db.execute(insert(notes).values(body="note"))
+        db.commit()
+
+    @app.get("/notes", dependencies=[Depends(authenticate)])
+    def read(db=Depends(read_db)):
+        return db.execute(text("SELECT body FROM notes LIMIT 1")).scalar()
+
+    return app
+
+
+def test_reads_go_to_the_replica(worker):
+    db = worker()(info={"read_only": True})
+    assert db.execute(text("SELECT body FROM notes LIMIT 1")).scalar() == "replica"
+    db.close()
+
+
+def test_writer_reads_from_the_primary_on_any_worker(worker):
+    first, second = TestClient(app_for(worker())), TestClient(app_for(worker()))
+    assert first.post("/notes", headers={"user": "alice"}).status_code == 200
+
+    # The write marker travels with the client to the other worker
+    second.cookies = first.cookies
+    assert second.get("/notes", headers={"user": "alice"}).json() == "primary"
+    assert first.get("/notes", headers={"user": "alice"}).json() == "primary"
+    # Nobody else is kept off the replica
+    assert TestClient(app_for(worker())).get("/notes", headers={"user": "bob"}).json() == "replica"
+
+
+def test_forged_write_marker_is_ignored(worker):
+    client = TestClient(app_for(worker()))
+    client.cookies.set("last_write", "99999999999.000.0123abcd")
+    assert client.get("/notes", headers={"user": "alice"}).json() == "replica"
+
+
+def test_write_marker_expires(worker, monkeypatch):
+    client = TestClient(app_for(worker()))
+    client.post("/notes", headers={"user": "alice"})
+    monkeypatch.setattr(settings, "replica_sticky_seconds", 0.0)
+    other = TestClient(app_for(worker()), cookies=client.cookies)
+    assert other.get("/notes", headers={"user": "alice"}).json() == "replica"
+
+
+def test_falls_back_to_the_primary_when_the_replica_is_down(worker, tmp_path):
+    down = create_engine(f"sqlite:///file:{tmp_path}/missing/replica.db?mode=ro&uri=true")
+    factory = worker(down)
+    db = factory(info={"read_only": True})
+    assert db.execute(text("SELECT body FROM notes LIMIT 1")).scalar() == "primary"
+    db.close()
+    # Later sessions skip the replica without trying it again
+    assert factory.class_.router.read_bind(None) is factory.class_.router.primary
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from src.database import async_engine, engine
+
+
+def test_pages_cover_dated_then_undated_tasks(client, auth):
+    base = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    # Repeated deadlines put the id tiebreak at page boundaries
+    tasks = [{"title": f"Dated {i}", "deadline": (base + timedelta(hours=i // 3)).isoformat()} for i in range(10)]
+    tasks += [{"title": f"Undated {i}"} for i in range(7)]
+    created = client.post("/tasks/bulk", json={"tasks": tasks[::-1]}, headers=auth).json()
+    by_title = {task["title"]: task["id"] for task in created}
+    dated = sorted((t for t in created if t["deadline"]), key=lambda t: (t["deadline"], t["id"]))
+    expected = [t["id"] for t in dated] + sorted(by_title[f"Undated {i}"] for i in range(7))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/tasks", params=params, headers=auth).json()
+        seen += [task["id"] for task in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_cursor_pages_are_index_range_scans(client, auth):
+    client.post("/tasks/bulk", json={"tasks": [
+        {"title": "Dated", "deadline": "2030-01-01T00:00:00Z"}, {"title": "Undated"}, {"title": "Undated"}
+    ]}, headers=auth)
+    first = client.get("/tasks", params={"limit": 1}, headers=auth).json()
+    second = client.get("/tasks", params={"limit": 1, "cursor": first["next_cursor"]}, headers=auth).json()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM tasks" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        for page in (first, second):
+            client.get("/tasks", params={"limit": 1, "cursor": page["next_cursor"]}, headers=auth)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    with engine.connect() as conn:
+        plans = [
+            " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements
+        ]
+    # Past a dated cursor: dated tasks after it, then undated ones from the
+    # start; past an undated cursor, only undated ones after it
+    assert len(plans) == 3
+    assert "(user_id=? AND completed=? AND deadline>?)" in plans[0]
+    assert "(user_id=? AND completed=? AND deadline=?)" in plans[1]
+    assert "(user_id=? AND completed=? AND deadline=? AND id>?)" in plans[2]
+    for plan in plans:
+        assert "USING INDEX ix_tasks_user_id_completed_deadline" in plan
+        assert "TEMP B-TREE" not in plan
@@ -0,0 +1,30 @@
+from opentelemetry import trace
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+
+
+def test_request_span_tree(client, auth, chat_history):
+    # The app's lifespan installed the SDK; collect this request's spans too
+    exporter = InMemorySpanExporter()
+    trace.get_tracer_provider().add_span_processor(SimpleSpanProcessor(exporter))
+
+    response = client.get("/chat/sessions", headers=auth)
+    assert response.status_code == 200
+
+    spans = exporter.get_finished_spans()
+    roots = [span for span in spans if span.parent is None]
+    assert len(roots) == 1
+    root = roots[0]
+    assert root.kind == SpanKind.SERVER
+    assert root.name == "GET /chat/sessions"
+    assert root.attributes["http.route"] == "/chat/sessions"
+    assert root.attributes["http.response.status_code"] == 200
+
+    # One client span per statement, including the user lookup that runs on
+    # the threadpool, all children of the request span
+    queries = [span for span in spans if span.kind == SpanKind.CLIENT]
+    assert len(queries) == 4
+    for span in queries:
+        assert span.context.trace_id == root.context.trace_id
+        assert span.parent.span_id == root.context.span_id